@@ -0,0 +1,234 @@
+'''
+This module generates synthetic MT4 back test reports which have the same layout as the reports saved from the
+Strategy Tester: the summary table scraped by `reports_processor` followed by the list of orders.
+The statistics in the summary are computed from the generated trades so that every report is self-consistent.
+'''
+
+import random
+from datetime import datetime, timedelta
+
+# The code of each period to its text in a report, which reads e.g. 'Daily (D1) 2015.01.01 00:00 - ...'
+PERIODS = {'M1': '1 Minute', 'M5': '5 Minutes', 'M15': '15 Minutes', 'M30': '30 Minutes', 'H1': '1 Hour', 'H4': '4 Hours', 'D1': 'Daily'}
+MODELS = {
+    'Every tick': 'Every tick (the most precise method based on all available least timeframes)',
+    'Control points': 'Control points (a nearest less timeframe is used to generate each tick)',
+    'Open prices': 'Open prices only (fastest method to analyze the bar just completed, only for EAs that explicitly control bar opening)',
+}
+
+HEADER = '''<html>
+<head>
+<title>Strategy Tester: {ea}</title>
+<meta name="generator" content="MetaQuotes Software Corp.">
+<link rel="help" href="http://www.metaquotes.net">
+<style type="text/css" media="screen">
+<!--
+td {{ font: 8pt Tahoma,Arial; }}
+//-->
+</style>
+<style type="text/css" media="print">
+<!--
+td {{ font: 7pt Tahoma,Arial; }}
+//-->
+</style>
+<style type="text/css">
+<!--
+.msdate {{ mso-number-format:"General Date"; }}
+.mspt   {{ mso-number-format:\\#\\,\\#\\#0\\.00;  }}
+//-->
+</style>
+</head>
+<body topmargin=1 marginheight=1>
+<div align=center>
+<div style="font: 20pt Times New Roman"><b>Strategy Tester Report</b></div>
+<div style="font: 16pt Times New Roman"><b>{ea}</b></div>
+<div style="font: 10pt Times New Roman"><b>Synthetic Broker Ltd. (Build 1420)</b></div><br>
+<table width=820 cellspacing=1 cellpadding=3 border=0>
+<tr align=left><td colspan=2>Symbol</td><td colspan=4>{symbol} ({symbol_description})</td></tr>
+<tr align=left><td colspan=2>Period</td><td colspan=4>{period_name} ({period}) {first_bar} - {last_bar} ({from_date} - {to_date})</td></tr>
+<tr align=left><td colspan=2>Model</td><td colspan=4>{model}</td></tr>
+<tr align=left><td colspan=2>Parameters</td><td colspan=4>{parameters}</td></tr>
+<tr height=8><td colspan=6></td></tr>
+<tr align=left><td>Bars in test</td><td align=right>{bars}</td><td>Ticks modelled</td><td align=right>{ticks}</td><td>Modelling quality</td><td align=right>90.00%</td></tr>
+<tr align=left><td>Mismatched charts errors</td><td align=right>0</td><td></td><td align=right></td><td></td><td align=right></td></tr>
+<tr height=8><td colspan=6></td></tr>
+<tr align=left><td>Initial deposit</td><td align=right>{deposit:.2f}</td><td></td><td align=right></td><td>Spread</td><td align=right>Current (10)</td></tr>
+<tr align=left><td>Total net profit</td><td align=right>{net:.2f}</td><td>Gross profit</td><td align=right>{gross_profit:.2f}</td><td>Gross loss</td><td align=right>{gross_loss:.2f}</td></tr>
+<tr align=left><td>Profit factor</td><td align=right>{profit_factor:.2f}</td><td>Expected payoff</td><td align=right>{expected_payoff:.2f}</td><td></td><td align=right></td></tr>
+<tr align=left><td>Absolute drawdown</td><td align=right>{absolute_dd:.2f}</td><td>Maximal drawdown</td><td align=right>{maximal_dd:.2f} ({maximal_dd_pct:.2f}%)</td><td>Relative drawdown</td><td align=right>{maximal_dd_pct:.2f}% ({maximal_dd:.2f})</td></tr>
+<tr height=8><td colspan=6></td></tr>
+<tr align=left><td>Total trades</td><td align=right>{trades}</td><td>Short positions (won %)</td><td align=right>{shorts} ({shorts_won_pct:.2f}%)</td><td>Long positions (won %)</td><td align=right>{longs} ({longs_won_pct:.2f}%)</td></tr>
+<tr align=left><td colspan=2 align=right></td><td>Profit trades (% of total)</td><td align=right>{wins} ({wins_pct:.2f}%)</td><td>Loss trades (% of total)</td><td align=right>{losses} ({losses_pct:.2f}%)</td></tr>
+<tr align=left><td colspan=2 align=right>Largest</td><td>profit trade</td><td align=right>{largest_profit:.2f}</td><td>loss trade</td><td align=right>{largest_loss:.2f}</td></tr>
+<tr align=left><td colspan=2 align=right>Average</td><td>profit trade</td><td align=right>{average_profit:.2f}</td><td>loss trade</td><td align=right>{average_loss:.2f}</td></tr>
+<tr align=left><td colspan=2 align=right>Maximum</td><td>consecutive wins (profit in money)</td><td align=right>{max_wins} ({max_wins_money:.2f})</td><td>consecutive losses (loss in money)</td><td align=right>{max_losses} ({max_losses_money:.2f})</td></tr>
+<tr align=left><td colspan=2 align=right>Maximal</td><td>consecutive profit (count of wins)</td><td align=right>{max_profit_run:.2f} ({max_profit_run_count})</td><td>consecutive loss (count of losses)</td><td align=right>{max_loss_run:.2f} ({max_loss_run_count})</td></tr>
+<tr align=left><td colspan=2 align=right>Average</td><td>consecutive wins</td><td align=right>{average_wins}</td><td>consecutive losses</td><td align=right>{average_losses}</td></tr>
+</table>
+<br>
+<img src="{ea}.gif" width=820 height=200 border=0 alt="Graph">
+<br>
+<table width=820 cellspacing=1 cellpadding=3 border=0>
+<tr bgcolor="#C0C0C0" align=right><td>#</td><td nowrap>Time</td><td>Type</td><td>Order</td><td>Size</td><td>Price</td><td>S / L</td><td>T / P</td><td>Profit</td><td>Balance</td></tr>
+'''
+
+FOOTER = '''</table>
+</div></body></html>
+'''
+
+def generate_trades(trade_count, from_date, to_date, rng):
+    """
+    Generates random trades spread evenly between `from_date` and `to_date`.
+
+    Returns:
+        list of tuple: (open time, close time, type, size, open price, close price, profit) of each trade.
+    """
+    trades = []
+    span = (to_date - from_date).total_seconds()
+    step = span / max(trade_count, 1)
+    price = 1.1
+    for i in range(trade_count):
+        open_time = from_date + timedelta(seconds=i * step)
+        close_time = open_time + timedelta(seconds=step * rng.uniform(0.1, 0.9))
+        trade_type = rng.choice(('buy', 'sell'))
+        size = rng.choice((0.01, 0.1, 0.5, 1.0))
+        profit = round(rng.gauss(5, 60) * size * 10, 2)
+        move = profit / (size * 100000)
+        close_price = price + move if trade_type == 'buy' else price - move
+        trades.append((open_time, close_time, trade_type, size, price, close_price, profit))
+        price = max(0.5, close_price + rng.gauss(0, 0.001))
+    return trades
+
+def runs(profits, winning):
+    """
+    Returns the lengths and sums of the runs of consecutive winning (or losing) trades.
+    """
+    result = []
+    count, total = 0, 0.0
+    for profit in profits:
+        if (profit > 0) == winning:
+            count += 1
+            total += profit
+        elif count:
+            result.append((count, total))
+            count, total = 0, 0.0
+    if count:
+        result.append((count, total))
+    return result
+
+def summary(trades, deposit):
+    """
+    Computes the statistics of the summary table from `trades`.
+    """
+    profits = [t[6] for t in trades]
+    wins = [p for p in profits if p > 0]
+    losses = [p for p in profits if p <= 0]
+    gross_profit, gross_loss = sum(wins), sum(losses)
+
+    balance, peak, max_dd, max_dd_pct, lowest = deposit, deposit, 0.0, 0.0, deposit
+    for profit in profits:
+        balance += profit
+        peak = max(peak, balance)
+        lowest = min(lowest, balance)
+        if peak - balance > max_dd:
+            max_dd = peak - balance
+            max_dd_pct = max_dd / peak * 100
+
+    win_runs, loss_runs = runs(profits, True), runs(profits, False)
+    longest_wins = max(win_runs, default=(0, 0.0))
+    longest_losses = max(loss_runs, default=(0, 0.0))
+    richest_wins = max(win_runs, key=lambda r: r[1], default=(0, 0.0))
+    poorest_losses = min(loss_runs, key=lambda r: r[1], default=(0, 0.0))
+    shorts = [t for t in trades if t[2] == 'sell']
+    longs = [t for t in trades if t[2] == 'buy']
+    count = max(len(trades), 1)
+
+    return {
+        'deposit': deposit,
+        'net': gross_profit + gross_loss,
+        'gross_profit': gross_profit,
+        'gross_loss': gross_loss,
+        'profit_factor': gross_profit / -gross_loss if gross_loss else 0.0,
+        'expected_payoff': (gross_profit + gross_loss) / count,
+        'absolute_dd': deposit - lowest,
+        'maximal_dd': max_dd,
+        'maximal_dd_pct': max_dd_pct,
+        'trades': len(trades),
+        'shorts': len(shorts),
+        'shorts_won_pct': sum(t[6] > 0 for t in shorts) / max(len(shorts), 1) * 100,
+        'longs': len(longs),
+        'longs_won_pct': sum(t[6] > 0 for t in longs) / max(len(longs), 1) * 100,
+        'wins': len(wins),
+        'wins_pct': len(wins) / count * 100,
+        'losses': len(losses),
+        'losses_pct': len(losses) / count * 100,
+        'largest_profit': max(wins, default=0.0),
+        'largest_loss': min(losses, default=0.0),
+        'average_profit': gross_profit / max(len(wins), 1),
+        'average_loss': gross_loss / max(len(losses), 1),
+        'max_wins': longest_wins[0],
+        'max_wins_money': longest_wins[1],
+        'max_losses': longest_losses[0],
+        'max_losses_money': longest_losses[1],
+        'max_profit_run': richest_wins[1],
+        'max_profit_run_count': richest_wins[0],
+        'max_loss_run': poorest_losses[1],
+        'max_loss_run_count': poorest_losses[0],
+        'average_wins': round(sum(r[0] for r in win_runs) / max(len(win_runs), 1)),
+        'average_losses': round(sum(r[0] for r in loss_runs) / max(len(loss_runs), 1)),
+    }
+
+def write_report(file_path, trade_count, seed=0, ea='SyntheticEA', symbol='EURUSD', period='H1', model='Every tick',
+                 from_date=datetime(2020, 1, 1), to_date=datetime(2021, 1, 1), parameters=None, deposit=10000.0):
+    """
+    Writes a synthetic MT4 back test report with `trade_count` trades to `file_path`.
+
+    Args:
+        file_path (str): The path of the HTML file to write.
+        trade_count (int): The number of trades in the report. Each trade adds an open and a close row to the order list.
+        seed (int): The seed of the random trades, so that the same arguments always produce the same report.
+        ea (str): The name of the EA.
+        symbol (str): The symbol which was tested.
+        period (str): One of the keys of `PERIODS`.
+        model (str): One of the keys of `MODELS`.
+        from_date (datetime): The start of the test.
+        to_date (datetime): The end of the test.
+        parameters (dict): The inputs of the EA.
+        deposit (float): The initial deposit.
+
+    Returns:
+        dict: The statistics written in the summary table.
+    """
+    rng = random.Random(seed)
+    trades = generate_trades(trade_count, from_date, to_date, rng)
+    stats = summary(trades, deposit)
+    parameters = parameters if parameters is not None else {'Lots': 0.1, 'TakeProfit': 50, 'StopLoss': 30}
+    bars = int((to_date - from_date).total_seconds() // 3600)
+
+    with open(file_path, 'w', encoding='utf-8', newline='\r\n') as file:
+        file.write(HEADER.format(
+            ea=ea, symbol=symbol, symbol_description='Euro vs US Dollar', period=period, period_name=PERIODS[period],
+            first_bar=from_date.strftime('%Y.%m.%d %H:%M'), last_bar=(to_date - timedelta(hours=1)).strftime('%Y.%m.%d %H:%M'),
+            from_date=from_date.strftime('%Y.%m.%d'), to_date=to_date.strftime('%Y.%m.%d'), model=MODELS[model],
+            parameters=''.join(f'{name}={value}; ' for name, value in parameters.items()), bars=bars, ticks=bars * 120, **stats))
+
+        balance = deposit
+        row = 0
+        for order, (open_time, close_time, trade_type, size, open_price, close_price, profit) in enumerate(trades, start=1):
+            sl, tp = open_price - 0.003, open_price + 0.005
+            row += 1
+            shade = ' bgcolor="#E0E0E0"' if row % 2 else ''
+            file.write(f'<tr{shade} align=right><td>{row}</td><td class=msdate>{open_time:%Y.%m.%d %H:%M}</td><td>{trade_type}</td>'
+                       f'<td>{order}</td><td class=mspt>{size:.2f}</td><td style="mso-number-format:0\\.00000;">{open_price:.5f}</td>'
+                       f'<td style="mso-number-format:0\\.00000;" align=right>{sl:.5f}</td><td style="mso-number-format:0\\.00000;" align=right>{tp:.5f}</td>'
+                       f'<td colspan=2></td></tr>\n')
+            balance += profit
+            row += 1
+            shade = ' bgcolor="#E0E0E0"' if row % 2 else ''
+            file.write(f'<tr{shade} align=right><td>{row}</td><td class=msdate>{close_time:%Y.%m.%d %H:%M}</td><td>close</td>'
+                       f'<td>{order}</td><td class=mspt>{size:.2f}</td><td style="mso-number-format:0\\.00000;">{close_price:.5f}</td>'
+                       f'<td style="mso-number-format:0\\.00000;" align=right>{sl:.5f}</td><td style="mso-number-format:0\\.00000;" align=right>{tp:.5f}</td>'
+                       f'<td class=mspt>{profit:.2f}</td><td class=mspt>{balance:.2f}</td></tr>\n')
+
+        file.write(FOOTER)
+
+    return stats
@@ -0,0 +1,185 @@
+'''
+Runs the benchmarks of the report parser, ExcelUtil and SettingsReader and writes the results of the run to
+benchmarks/results/[timestamp].json, so that runs can be compared to find regressions.
+
+Usage (from the root of the repository):
+    python -m benchmarks.run_benchmarks [--quick] [--chrome-profile PATH] [--compare RESULTS_FILE]
+
+The report parser drives Chrome, so it is only measured when a Chrome profile is given.
+'''
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime
+from os import path, makedirs
+from time import perf_counter
+from benchmarks.report_generator import write_report
+from benchmarks.workbook_generator import write_settings_workbook, write_backtest_data_workbook, result_row
+
+RESULTS_FOLDER = path.join(path.dirname(path.abspath(__file__)), 'results')
+
+FULL = {
+    'trade_counts': [10, 1000, 10000, 100000, 500000],
+    'sheet_sizes': [100, 1000, 10000, 50000],
+    'settings_rows': [100, 1000, 10000],
+}
+QUICK = {
+    'trade_counts': [10, 1000],
+    'sheet_sizes': [100, 1000],
+    'settings_rows': [100, 1000],
+}
+
+def measure(func, *args):
+    """
+    Calls `func` with `args` and measures its duration and the peak memory it allocated.
+
+    Returns:
+        tuple: The return value of `func`, the duration in seconds and the peak memory in bytes.
+    """
+    tracemalloc.start()
+    start = perf_counter()
+    result = func(*args)
+    duration = perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, duration, peak
+
+def bench_report_parsing(folder, trade_counts, chrome_profile_path):
+    """
+    Measures how long `process_html_file` takes to scrape reports with different numbers of trades.
+    """
+    from components.reports_processor import process_html_file
+    from components.browser import ChromeBrowser
+
+    browser = ChromeBrowser(keep_open=False, headless=True, chrome_profile_path=chrome_profile_path)
+    results = []
+    try:
+        for trade_count in trade_counts:
+            report_path = path.join(folder, f'SyntheticEA{trade_count}.htm')  # MT4 saves reports as .htm
+            write_report(report_path, trade_count)
+            size = path.getsize(report_path)
+            collected = []
+            _, duration, peak = measure(process_html_file, report_path, browser, collected.append)
+            results.append({
+                'trade_count': trade_count,
+                'file_bytes': size,
+                'seconds': round(duration, 4),
+                'mb_per_second': round(size / duration / 1e6, 3),
+                'peak_memory_bytes': peak,
+                'fields_found': sum(value != 'N/A' for value in collected[0].values()) if collected else 0,
+            })
+            print(f'  parse {trade_count} trades: {duration:.3f}s')
+    finally:
+        browser.driver.quit()
+    return results
+
+def bench_excel_upsert(folder, sheet_sizes):
+    """
+    Measures how long `ExcelUtil.add_data_to_excel` takes to append a new row and to update an existing row
+    in Back Test Data workbooks of different sizes.
+    """
+    import random
+    from components.excel_utils import ExcelUtil
+
+    results = []
+    for rows in sheet_sizes:
+        file_path = path.join(folder, f'backtest_data_{rows}.xlsx')
+        write_backtest_data_workbook(file_path, rows)
+        excel_util = ExcelUtil(file_path)
+        rng = random.Random(rows)
+
+        _, append_seconds, append_peak = measure(excel_util.add_data_to_excel, result_row(rows, rng))
+        existing = result_row(rows // 2, rng)  # Same 'Source File' as the row in the middle of the sheet
+        _, update_seconds, update_peak = measure(excel_util.add_data_to_excel, existing)
+        results.append({
+            'rows': rows,
+            'file_bytes': path.getsize(file_path),
+            'append_seconds': round(append_seconds, 4),
+            'update_seconds': round(update_seconds, 4),
+            'peak_memory_bytes': max(append_peak, update_peak),
+        })
+        print(f'  upsert into {rows} rows: append {append_seconds:.3f}s, update {update_seconds:.3f}s')
+    return results
+
+def bench_settings_load(folder, settings_rows):
+    """
+    Measures how long `SettingsReader.read_settings` takes to read Settings workbooks of different sizes.
+    """
+    from components.settings_reader import SettingsReader
+
+    results = []
+    for rows in settings_rows:
+        file_path = path.join(folder, f'settings_{rows}.xlsx')
+        write_settings_workbook(file_path, rows)
+        settings, duration, peak = measure(SettingsReader(file_path).read_settings)
+        results.append({
+            'rows': rows,
+            'seconds': round(duration, 4),
+            'rows_per_second': round(len(settings) / duration, 1),
+            'peak_memory_bytes': peak,
+        })
+        print(f'  load {rows} settings: {duration:.3f}s')
+    return results
+
+def compare(current, previous):
+    """
+    Prints the change of every measured duration between `previous` and `current` results.
+    """
+    print(f"Compared to {previous['timestamp']}:")
+    for name, entries in current['benchmarks'].items():
+        old_entries = previous['benchmarks'].get(name, [])
+        for entry in entries:
+            size_key = next(iter(entry))
+            old = next((e for e in old_entries if e.get(size_key) == entry[size_key]), None)
+            if old is None:
+                continue
+            for key, value in entry.items():
+                if key.endswith('seconds') and old.get(key):
+                    change = (value - old[key]) / old[key] * 100
+                    print(f'  {name} {size_key}={entry[size_key]} {key}: {old[key]} -> {value} ({change:+.1f}%)')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of the report parser, ExcelUtil and SettingsReader.')
+    parser.add_argument('--quick', action='store_true', help='Use small sizes only.')
+    parser.add_argument('--chrome-profile', help='Chrome profile used to benchmark the report parser.')
+    parser.add_argument('--compare', help='A previous results file to compare this run with.')
+    parser.add_argument('--output', help='The results file to write. Defaults to benchmarks/results/[timestamp].json.')
+    args = parser.parse_args(argv)
+    sizes = QUICK if args.quick else FULL
+
+    benchmarks = {}
+    with tempfile.TemporaryDirectory() as folder:
+        if args.chrome_profile:
+            print('Report parsing')
+            benchmarks['report_parsing'] = bench_report_parsing(folder, sizes['trade_counts'], args.chrome_profile)
+        else:
+            print('Report parsing skipped because no Chrome profile was given')
+        print('Excel upsert')
+        benchmarks['excel_upsert'] = bench_excel_upsert(folder, sizes['sheet_sizes'])
+        print('Settings load')
+        benchmarks['settings_load'] = bench_settings_load(folder, sizes['settings_rows'])
+
+    timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    results = {
+        'timestamp': timestamp,
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'quick': args.quick,
+        'benchmarks': benchmarks,
+    }
+    output = args.output or path.join(RESULTS_FOLDER, f'{timestamp}.json')
+    makedirs(path.dirname(path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f'Results written to {output}')
+
+    if args.compare:
+        with open(args.compare) as file:
+            compare(results, json.load(file))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+'''
+This module generates large Settings and Back Test Data workbooks for the benchmarks.
+'''
+
+import random
+from datetime import date, timedelta
+from openpyxl import Workbook
+from components.records import Period
+from components.reports_processor import titles_and_selectors
+from benchmarks.report_generator import PERIODS, MODELS
+
+SETTINGS_HEADERS = ['Expert', 'Symbol', 'Period', 'From', 'To', 'Model', 'Use Date', 'Visual Mode', 'Expert properties']
+SYMBOLS = ['EURUSD', 'GBPUSD', 'USDJPY', 'AUDUSD', 'USDCHF', 'NZDUSD', 'EURJPY', 'GBPJPY']
+
+def write_settings_workbook(file_path, rows, seed=0):
+    """
+    Writes a Settings workbook with `rows` rows of random settings to `file_path`.
+    """
+    rng = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(SETTINGS_HEADERS)
+    for i in range(rows):
+        start = date(2015, 1, 1) + timedelta(days=rng.randrange(0, 2000))
+        ws.append([
+            f'Synthetic\\EA{i % 20}.ex4', rng.choice(SYMBOLS), Period[rng.choice(list(PERIODS))].label,
+            start.strftime('%Y.%m.%d'), (start + timedelta(days=rng.randrange(30, 1500))).strftime('%Y.%m.%d'),
+            rng.choice(list(MODELS)), 'Yes', 'No',
+            f'Lots={rng.choice((0.01, 0.1, 1))}, Take profit={rng.randrange(10, 200)}, Stop loss={rng.randrange(10, 200)}',
+        ])
+    wb.save(file_path)
+
+def result_row(i, rng):
+    """
+    Returns a random result in the format written by `process_html_file`, for the report with the number `i`.
+    """
+    data = {'Source File': f'D:\\HTML Reports\\EA{i % 20}{i}.htm'}
+    for title in titles_and_selectors:
+        data[title] = f'{rng.uniform(-5000, 5000):.2f}'
+
+    start = date(2015, 1, 1) + timedelta(days=rng.randrange(0, 2000))
+    end = start + timedelta(days=rng.randrange(30, 1500))
+    period = rng.choice(list(PERIODS))
+    data.update({
+        'Expert': f'EA{i % 20}',
+        'Symbol': f'{rng.choice(SYMBOLS)} (Synthetic)',
+        'Period': f'{PERIODS[period]} ({period}) {start:%Y.%m.%d} 00:00 - {end:%Y.%m.%d} 00:00 ({start:%Y.%m.%d} - {end:%Y.%m.%d})',
+        'Model': MODELS[rng.choice(list(MODELS))],
+        'Parameters': f'Lots={rng.choice((0.01, 0.1, 1))}; TakeProfit={rng.randrange(10, 200)}; StopLoss={rng.randrange(10, 200)}; ',
+    })
+    return data
+
+def write_backtest_data_workbook(file_path, rows, seed=0):
+    """
+    Writes a Back Test Data workbook with `rows` rows of random results to `file_path`.
+
+    Returns:
+        list of str: The headers of the workbook.
+    """
+    rng = random.Random(seed)
+    headers = ['Source File'] + list(titles_and_selectors)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(headers)
+    for i in range(rows):
+        data = result_row(i, rng)
+        ws.append([data[header] for header in headers])
+    wb.save(file_path)
+    return headers
@@ -0,0 +1,116 @@
+'''
+This module stops hopeless back tests early. The rules of a test come from these optional columns of the Settings file:
+- Max drawdown: the largest drop of the balance or equity from its peak, in percent (e.g. 30),
+- Min trades and Min trades by: the least number of trades which have to be opened by a date of the test,
+- Balance floor: the lowest balance or equity which is allowed.
+
+The rules are checked against the lines of the tester journal while the test runs (see `tester_journal`). Each line has
+the simulated time of the test, trades are counted from the "open #" lines, and the balance and equity are read from
+lines printed by the EA like "balance=10234.50" or "Equity: 9800". A stop out breaks every rule.
+'''
+
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from components.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+TEST_TIME = re.compile(r'(\d{4}\.\d{2}\.\d{2} \d{2}:\d{2})')
+TRADE_OPEN = re.compile(r':\s*open #\d+', re.IGNORECASE)
+ACCOUNT_VALUE = re.compile(r'\b(balance|equity)\s*[:=]\s*(-?\d+(?:\.\d+)?)', re.IGNORECASE)
+STOP_OUT = re.compile(r'stop\s*out', re.IGNORECASE)
+
+def parse_date(value):
+    """
+    Returns a date of the Settings file (a datetime or a 'yyyy-mm-dd' or 'yyyy.mm.dd' string) as a datetime.
+    """
+    if value is None or value == '' or isinstance(value, datetime):
+        return value or None
+    return datetime.strptime(str(value).strip()[:10].replace('.', '-'), '%Y-%m-%d')
+
+def parse_float(value):
+    if value is None or str(value).strip() == '':
+        return None
+    return float(str(value).strip().rstrip('%'))
+
+@dataclass
+class AbortRules:
+    max_drawdown: float = None  # Percent
+    min_trades: int = None
+    min_trades_by: datetime = None
+    balance_floor: float = None
+
+    @classmethod
+    def from_settings(cls, settings):
+        """
+        Returns the rules in the columns of a row of the Settings file, or None if the row has no rules.
+        """
+        min_trades = parse_float(settings.get('Min trades'))
+        rules = cls(
+            max_drawdown=parse_float(settings.get('Max drawdown')),
+            min_trades=int(min_trades) if min_trades is not None else None,
+            min_trades_by=parse_date(settings.get('Min trades by')),
+            balance_floor=parse_float(settings.get('Balance floor')),
+        )
+        if rules.min_trades is not None and rules.min_trades_by is None:
+            logger.warning("'Min trades' is ignored because 'Min trades by' is not set.")
+        if all(value is None for value in (rules.max_drawdown, rules.balance_floor)) and rules.min_trades_by is None:
+            return None
+        return rules
+
+class TestMonitor:
+    '''Follows the journal lines of one test and finds the first rule it breaks.'''
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.trades = 0
+        self.test_time = None  # Simulated time of the latest journal line
+        self.peak = None  # Highest balance or equity seen
+        self.value = None  # Latest balance or equity seen
+        self.max_drawdown = 0.0  # Percent
+        self.violation = None  # Description of the broken rule
+
+    def feed(self, line):
+        """
+        Updates the state of the test with a journal line.
+
+        Returns:
+            str: The description of the broken rule, or None if no rule is broken.
+        """
+        if self.violation:
+            return self.violation
+
+        match = TEST_TIME.search(line)
+        if match:
+            self.test_time = datetime.strptime(match.group(1), '%Y.%m.%d %H:%M')
+        if TRADE_OPEN.search(line):
+            self.trades += 1
+        for _, value in ACCOUNT_VALUE.findall(line):
+            self.value = float(value)
+            self.peak = self.value if self.peak is None else max(self.peak, self.value)
+            if self.peak > 0:
+                self.max_drawdown = max(self.max_drawdown, (self.peak - self.value) / self.peak * 100)
+
+        self.violation = self.check(line)
+        return self.violation
+
+    def check(self, line):
+        rules = self.rules
+        if STOP_OUT.search(line):
+            return 'Stop out'
+        if rules.max_drawdown is not None and self.max_drawdown > rules.max_drawdown:
+            return f'Drawdown of {self.max_drawdown:.2f}% is above the maximum of {rules.max_drawdown}%'
+        if rules.balance_floor is not None and self.value is not None and self.value < rules.balance_floor:
+            return f'Balance or equity of {self.value} is below the floor of {rules.balance_floor}'
+        if (rules.min_trades is not None and rules.min_trades_by is not None and self.test_time is not None
+                and self.test_time >= rules.min_trades_by and self.trades < rules.min_trades):
+            return f'Only {self.trades} trades by {rules.min_trades_by:%Y.%m.%d}, fewer than {rules.min_trades}'
+        return None
+
+    def summary(self):
+        """
+        Returns the broken rule and the partial statistics of the test, e.g. to record why it was aborted.
+        """
+        reached = f'{self.test_time:%Y.%m.%d %H:%M}' if self.test_time else 'unknown'
+        return f'{self.violation} (test time reached: {reached}, trades: {self.trades}, max drawdown: {self.max_drawdown:.2f}%)'
@@ -1,24 +1,99 @@
-from os import getenv
+'''
+This module drives Chrome with Selenium. Selenium and webdriver_manager are imported when a browser is started, not when
+this module is imported, because they take long to import and are not needed by runs without reports to scrape.
+
+The path of the chromedriver is cached in CHROMEDRIVER_CACHE_FILE together with the modification time of chrome.exe, so
+the Chrome version probe and the download by webdriver_manager (which needs network) only run again after Chrome updated.
+'''
+
+import json
+from os import getenv, path
 from components.logger import setup_logger, INFO
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service as ChromeService
-from webdriver_manager.core.utils import read_version_from_cmd 
-from webdriver_manager.core.os_manager import PATTERN
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.common.exceptions import WebDriverException, TimeoutException
-from selenium.webdriver.support.wait import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 
 # Set up logger for this file
 main_logger = setup_logger(__name__, INFO)
 
 CHROME_PROFILES_PATH = getenv('CHROME_PROFILES_PATH')
 CHROMEDRIVER_EXE_PATH = getenv('CHROMEDRIVER_EXE_PATH')
+CHROME_EXE_PATH = r'C:\Program Files\Google\Chrome\Application\chrome.exe'
+CHROMEDRIVER_CACHE_FILE = 'chromedriver_cache.json'
+SCRAPE_TIMEOUT = 10  # Seconds to wait for a page to be ready to be scraped
+
+# Waits until the document is ready, then returns the text of the first node matched by each XPath (null if there is none)
+# and whether Chrome shows an error page instead of the document. It runs asynchronously, so the last argument is the callback.
+SCRAPE_SCRIPT = '''
+const selectors = arguments[0], timeout = arguments[1], done = arguments[arguments.length - 1];
+const start = Date.now();
+function scrape() {
+    if (document.readyState !== 'complete' && Date.now() - start < timeout) {
+        setTimeout(scrape, 10);
+        return;
+    }
+    const values = {};
+    for (const [title, selector] of Object.entries(selectors)) {
+        const node = document.evaluate(selector, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+        values[title] = node ? node.innerText.trim() : null;
+    }
+    done({values: values, errorPage: document.querySelector('div.error-code') !== null});
+}
+scrape();
+'''
+
+def chrome_signature():
+    """
+    Returns a string which changes when Chrome is updated, or None if chrome.exe is not found.
+    """
+    try:
+        return f'{CHROME_EXE_PATH}:{path.getmtime(CHROME_EXE_PATH)}'
+    except OSError:
+        return None
+
+def cached_driver_path():
+    """
+    Returns the chromedriver path cached for the installed version of Chrome, or None if there is none.
+    """
+    try:
+        with open(CHROMEDRIVER_CACHE_FILE) as file:
+            cache = json.load(file)
+        if cache.get('chrome') == chrome_signature() and path.exists(cache.get('driver', '')):
+            return cache['driver']
+    except (OSError, ValueError):
+        pass
+    return None
+
+def chromedriver_path():
+    """
+    Returns the path of a chromedriver which matches the installed version of Chrome. The CHROMEDRIVER_EXE_PATH environment
+    variable is used if it is set, then the cached path. Otherwise the driver is installed with webdriver_manager and cached.
+    """
+    if CHROMEDRIVER_EXE_PATH:
+        return CHROMEDRIVER_EXE_PATH
+
+    driver_path = cached_driver_path()
+    if driver_path:
+        main_logger.info(f'Using the cached chromedriver {driver_path}')
+        return driver_path
+
+    from webdriver_manager.core.utils import read_version_from_cmd
+    from webdriver_manager.core.os_manager import PATTERN
+    from webdriver_manager.chrome import ChromeDriverManager
+
+    cmd = f"powershell -command \"&{{(Get-Item '{CHROME_EXE_PATH}').VersionInfo.ProductVersion}}\""
+    version = read_version_from_cmd(cmd, PATTERN["google-chrome"])
+    driver_path = ChromeDriverManager(driver_version=version).install()
+    try:
+        with open(CHROMEDRIVER_CACHE_FILE, 'w') as file:
+            json.dump({'chrome': chrome_signature(), 'driver': driver_path}, file)
+    except OSError as e:
+        main_logger.error(f'Failed to cache the chromedriver path: {e}')
+    return driver_path
 
 class ChromeBrowser:
     def __init__(self, keep_open: bool, headless: bool, chrome_profile_path: str) -> None:
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service as ChromeService
+        from selenium.webdriver.chrome.options import Options
+
         chrome_options = Options() 
         # the application will run without opening the chrome browser and be lightwight on system resources. This also won't interfere with other selenium controlled browsers.
         if headless:
@@ -27,49 +102,39 @@ class ChromeBrowser:
         chrome_options.add_experimental_option("detach", keep_open)
         chrome_options.add_argument(f"--user-data-dir={chrome_profile_path}")
 
-        cmd = "powershell -command \"&{(Get-Item 'C:\\Program Files\\Google\\Chrome\\Application\\chrome.exe').VersionInfo.ProductVersion}\""
-        version = read_version_from_cmd(cmd, PATTERN["google-chrome"])
-        service = ChromeDriverManager(driver_version=version).install()
-        self.driver = webdriver.Chrome(service=ChromeService(service), options=chrome_options)
+        self.driver = webdriver.Chrome(service=ChromeService(chromedriver_path()), options=chrome_options)
+        self.driver.set_script_timeout(SCRAPE_TIMEOUT + 1)
 
         main_logger.info('Chrome Browser initialized')
 
-    def open_page(self, url: str):
-        '''This opens `url` and maximizes the window'''
+    def open_page(self, url: str, maximize: bool = False):
+        '''This opens `url` in the current tab and maximizes the window if `maximize` is True'''
+        from selenium.common.exceptions import WebDriverException
+
         try:
             self.driver.get(url)
-            self.driver.maximize_window()
+            if maximize:
+                self.driver.maximize_window()
             main_logger.info(f'Opened {url}')
             return True
         except WebDriverException:
             main_logger.exception(f'Cannot open this url: {url}. Error: ')
             return False 
         
-    def is_no_error(self, timeout) -> bool:
+    def scrape(self, selectors: dict, timeout: float = SCRAPE_TIMEOUT) -> dict:
         '''
-        This checks if the "ERR_FILE_NOT_LOADED" error is not present on the page.
-        
+        Evaluates all of `selectors` on the current page in a single WebDriver call, once the page is ready.
+
         Args:
-            timeout (int): Time to wait for the confirmation that the error page is not loaded.
+            selectors (dict): Titles to XPath selectors.
+            timeout (float): Seconds to wait for the page to be ready.
 
         Returns:
-            bool: True if error page is not displayed, False otherwise
+            dict: 'values' maps each title to the text of the first matching element, or None if nothing matched.
+                'errorPage' is True if Chrome shows an error page instead of the document.
         '''
-        try:
-            error_xpath = "//div[@class='error-code' and text()='ERR_FILE_NOT_FOUND']"
-            # Wait until the error message element is no longer visible
-            no_error_element = WebDriverWait(self.driver, timeout).until(
-                EC.invisibility_of_element_located((By.XPATH, error_xpath))
-            )
-            
-            if no_error_element:
-                main_logger.info('No error page is displayed.')
-                return True
-            
-        except TimeoutException:
-            main_logger.error('Timeout while checking for no error on the page. This means that there is an error.')
-            return False
-    
+        return self.driver.execute_async_script(SCRAPE_SCRIPT, selectors, timeout * 1000)
+
     def refresh_page(self) -> None:
         '''
         This refreshes the current page and waits until it loads.
@@ -80,6 +145,8 @@ class ChromeBrowser:
         Raises:
         	WebDriverException: If there is an error while refreshing the page.
         '''
+        from selenium.common.exceptions import WebDriverException
+
         try:
             self.driver.refresh()
             main_logger.info('Page refreshed. Waiting for it to load...')
@@ -88,4 +155,20 @@ class ChromeBrowser:
             return True
         except WebDriverException:
             main_logger.exception('Error occurred while trying to refresh page: ')
-            raise
\ No newline at end of file
+            raise
+
+class LazyBrowser:
+    '''
+    Stands in for a ChromeBrowser which is only started when it is used for the first time, so that runs which
+    don't scrape any report never start Chrome.
+    '''
+
+    def __init__(self, keep_open: bool, headless: bool, chrome_profile_path: str) -> None:
+        self.options = {'keep_open': keep_open, 'headless': headless, 'chrome_profile_path': chrome_profile_path}
+        self.browser = None
+
+    def __getattr__(self, name):
+        # Only called for the attributes of ChromeBrowser, e.g. `driver` or `open_page`
+        if self.browser is None:
+            self.browser = ChromeBrowser(**self.options)
+        return getattr(self.browser, name)
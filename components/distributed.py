@@ -0,0 +1,558 @@
+'''
+This module distributes the tests of a Settings file across several machines, each with its own MT4.
+
+The coordinator holds the queue of tests and the results. Workers lease tests from it over HTTP, run them on their own
+MT4 and upload the scraped statistics and the HTML report. A worker sends a heartbeat while its test runs. If the
+heartbeats stop, e.g. because the machine was restarted, the lease expires and the test is given to another worker.
+Results are written to Back Test Data by one background thread of the coordinator, so that uploads never wait for Excel.
+
+Usage:
+    python -m components.distributed coordinator --settings [Settings file] --results [Back Test Data file]
+        --reports [HTML Reports folder] [--host 0.0.0.0 --token [secret]] [--port 8765] [--resume]
+    python -m components.distributed worker --coordinator http://[host]:8765 [--token [secret]] --mt4 [terminal.exe]
+        --metaeditor [metaeditor.exe] --reports [local HTML Reports folder] --chrome-profile [Chrome profile]
+    python -m components.distributed simulate [--workers 4] [--jobs 40] [--duration 0.5]
+
+The simulate command runs a coordinator and several simulated workers on localhost to try out the protocol.
+
+The coordinator only listens on this machine by default. With --host 0.0.0.0 anyone who can reach its port could lease
+tests or post results, so give it a shared --token (or BACKTEST_COORDINATOR_TOKEN), which every request has to send in
+the X-Backtest-Token header, and only use it on a trusted network: the requests are plain HTTP.
+
+Protocol (JSON bodies):
+    POST /lease {"worker"} -> {"job_id", "settings", "lease_seconds"}, or {"job_id": null, "finished"} if there is no test
+    POST /heartbeat {"worker", "job_id"} -> 200, or 409 if the lease was lost
+    POST /complete {"worker", "job_id", "outcome", "seconds", "data", "report_name", "report", "error"} -> 200, or 409 if the lease was lost
+    GET /status -> the number of tests in each state
+'''
+
+import argparse
+import base64
+import hmac
+import json
+import random
+import socket
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os import path, makedirs, getenv
+from queue import SimpleQueue
+from threading import Lock, Thread, Event
+from time import monotonic, sleep
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+from components.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+DEFAULT_PORT = 8765
+TOKEN_HEADER = 'X-Backtest-Token'
+LEASE_SECONDS = 60  # A lease expires if no heartbeat arrives for this long
+HEARTBEAT_INTERVAL = 15
+IDLE_INTERVAL = 5  # Seconds a worker waits before asking again when no test is available
+MAX_ATTEMPTS = 3  # Times a test is leased before it is given up on
+UPLOAD_ATTEMPTS = 8  # Times a worker tries to upload a result, waiting twice as long after each failure
+MAX_RETRY_INTERVAL = 60
+
+class JobQueue:
+    '''The tests of a run and their leases. All of the methods are thread-safe.'''
+
+    def __init__(self, settings_list, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.jobs = {job_id: {'settings': settings, 'status': 'pending', 'worker': None, 'expires': 0, 'attempts': 0}
+                     for job_id, settings in enumerate(settings_list)}
+        self.pending = list(self.jobs)  # Ids of the tests waiting for a worker, in the order of the Settings file
+        self.lock = Lock()
+
+    def expire_leases(self):
+        """
+        Puts the tests whose lease expired back in the queue. The caller must hold `self.lock`.
+        """
+        now = monotonic()
+        for job_id, job in self.jobs.items():
+            if job['status'] == 'leased' and job['expires'] < now:
+                logger.warning(f"The lease of test {job_id} by {job['worker']} expired.")
+                if job['attempts'] >= self.max_attempts:
+                    job['status'] = 'failed'
+                else:
+                    job['status'], job['worker'] = 'pending', None
+                    self.pending.insert(0, job_id)
+
+    def lease(self, worker):
+        """
+        Leases the next test to `worker`.
+
+        Returns:
+            tuple: The id and the settings of the test, or (None, None) if no test is waiting.
+        """
+        with self.lock:
+            self.expire_leases()
+            if not self.pending:
+                return None, None
+            job_id = self.pending.pop(0)
+            job = self.jobs[job_id]
+            job.update(status='leased', worker=worker, expires=monotonic() + self.lease_seconds, attempts=job['attempts'] + 1)
+            return job_id, job['settings']
+
+    def heartbeat(self, worker, job_id):
+        """
+        Extends the lease of `worker` on a test.
+
+        Returns:
+            bool: False if the worker does not hold the lease anymore.
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if not job or job['status'] != 'leased' or job['worker'] != worker:
+                return False
+            job['expires'] = monotonic() + self.lease_seconds
+            return True
+
+    def complete(self, worker, job_id, outcome):
+        """
+        Records the outcome of a test. A failed test is queued again until it has been attempted `max_attempts` times.
+
+        Returns:
+            dict: The completed test, or None if the worker does not hold its lease anymore.
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if not job or job['status'] != 'leased' or job['worker'] != worker:
+                return None
+            if outcome == 'failed' and job['attempts'] < self.max_attempts:
+                job['status'], job['worker'] = 'pending', None
+                self.pending.append(job_id)
+            else:
+                job['status'] = 'failed' if outcome == 'failed' else 'done'
+            return job
+
+    def counts(self):
+        with self.lock:
+            self.expire_leases()
+            counts = {'pending': 0, 'leased': 0, 'done': 0, 'failed': 0}
+            for job in self.jobs.values():
+                counts[job['status']] += 1
+            return counts
+
+    def finished(self):
+        counts = self.counts()
+        return counts['pending'] == 0 and counts['leased'] == 0
+
+class ResultWriter:
+    '''Stores the uploaded results on a background thread: the report file in the reports folder and the data in Back Test Data.'''
+
+    def __init__(self, report_data_excel_path, html_reports_path, run_state=None, run_history=None):
+        from components.excel_utils import ExcelUtil
+        from components.reports_processor import titles_and_selectors
+
+        self.report_data_excel_path = report_data_excel_path
+        self.excel_util = ExcelUtil(report_data_excel_path)
+        self.excel_util.setup_excel_file(list(titles_and_selectors) + ['Aborted'])  # Add the columns of new stats to older workbooks
+        self.html_reports_path = html_reports_path
+        self.run_state = run_state
+        self.run_history = run_history
+        self.queue = SimpleQueue()
+        self.thread = Thread(target=self.write_results, daemon=True)
+        self.thread.start()
+
+    def put(self, job, result):
+        self.queue.put((job, result))
+
+    def write_results(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            job, result = item
+            try:
+                data = dict(result.get('data') or {})
+                if result.get('report'):
+                    report_path = path.join(self.html_reports_path, f"{result['worker']}_{result['report_name']}")
+                    with open(report_path, 'wb') as file:
+                        file.write(base64.b64decode(result['report']))
+                    data['Source File'] = report_path
+                if data.get('Source File'):
+                    self.excel_util.add_data_to_excel(data)
+                if self.run_state is not None and result['outcome'] in ('completed', 'aborted'):
+                    self.run_state.mark(job['settings'], 'done')
+                if self.run_history is not None and result['outcome'] in ('completed', 'aborted') and result.get('seconds'):
+                    self.run_history.record(job['settings'], result['seconds'], result['outcome'], result['worker'])
+            except Exception as e:
+                logger.error(f"Failed to store the result of {job['settings'].get('Expert')} from {result.get('worker')}: {e}")
+
+    def close(self):
+        """
+        Writes the queued results and stops the thread.
+        """
+        self.queue.put(None)
+        self.thread.join()
+
+class CoordinatorHandler(BaseHTTPRequestHandler):
+    def send_json(self, status, body):
+        data = json.dumps(body, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def authorized(self):
+        """
+        Checks the token of the request if the coordinator has one, and answers 401 if it is wrong.
+        """
+        token = self.server.coordinator.token
+        if token and not hmac.compare_digest(self.headers.get(TOKEN_HEADER, '').encode('utf-8'), token.encode('utf-8')):
+            logger.warning(f"Refused a request to {self.path} from {self.client_address[0]} with a wrong token")
+            self.send_error(401)
+            return False
+        return True
+
+    def do_GET(self):
+        if not self.authorized():
+            return
+        if self.path != '/status':
+            self.send_error(404)
+            return
+        self.send_json(200, self.server.coordinator.queue.counts())
+
+    def do_POST(self):
+        if not self.authorized():
+            return
+        coordinator = self.server.coordinator
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        except ValueError:
+            self.send_error(400)
+            return
+
+        if self.path == '/lease':
+            job_id, settings = coordinator.queue.lease(body['worker'])
+            if job_id is None:
+                self.send_json(200, {'job_id': None, 'finished': coordinator.queue.finished()})
+            else:
+                logger.info(f"Leased test {job_id} ({settings.get('Expert')}) to {body['worker']}")
+                self.send_json(200, {'job_id': job_id, 'settings': dict(settings.items()), 'lease_seconds': coordinator.queue.lease_seconds})
+        elif self.path == '/heartbeat':
+            ok = coordinator.queue.heartbeat(body['worker'], body['job_id'])
+            self.send_json(200 if ok else 409, {'ok': ok})
+        elif self.path == '/complete':
+            job = coordinator.queue.complete(body['worker'], body['job_id'], body['outcome'])
+            if job is None:
+                self.send_json(409, {'ok': False})
+                return
+            logger.info(f"Test {body['job_id']} finished on {body['worker']}: {body['outcome']}")
+            if body.get('error'):
+                logger.error(f"Test {body['job_id']} on {body['worker']}: {body['error']}")
+            coordinator.on_result(job, body)
+            self.send_json(200, {'ok': True})
+        else:
+            self.send_error(404)
+
+    def log_message(self, format, *args):
+        pass  # The requests are logged by the handler itself
+
+class Coordinator:
+    def __init__(self, settings_list, on_result, host='127.0.0.1', port=DEFAULT_PORT, lease_seconds=LEASE_SECONDS, token=None):
+        """
+        Args:
+            settings_list (list of TestJob or dict): The tests to distribute.
+            on_result (callable): Called with the test and the uploaded result of every finished test.
+            host (str): The address to listen on. Use '0.0.0.0' to accept workers from other machines.
+            port (int): The port to listen on. 0 picks a free port.
+            token (str): A secret which every request has to send. Requests are not checked if it is None.
+        """
+        self.queue = JobQueue(settings_list, lease_seconds)
+        self.on_result = on_result
+        self.token = token
+        if not token and host not in ('127.0.0.1', 'localhost', '::1'):
+            logger.warning(f"The coordinator listens on {host} without a token, so anyone who can reach it can lease tests and post results")
+        self.server = ThreadingHTTPServer((host, port), CoordinatorHandler)
+        self.server.coordinator = self
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{'127.0.0.1' if host == '0.0.0.0' else host}:{port}"
+
+    def start(self):
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        logger.info(f"Coordinator listening on {self.url} with {len(self.queue.jobs)} tests")
+        return self
+
+    def wait(self, poll_interval=1):
+        """
+        Blocks until every test is done or has failed.
+        """
+        while not self.queue.finished():
+            sleep(poll_interval)
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def post(url, body, timeout=30, token=None):
+    """
+    Sends `body` as JSON to `url`, with `token` if it is given.
+
+    Returns:
+        tuple: The HTTP status and the decoded JSON response.
+    """
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers[TOKEN_HEADER] = token
+    request = Request(url, json.dumps(body, default=str).encode('utf-8'), headers)
+    try:
+        with urlopen(request, timeout=timeout) as response:
+            return response.status, json.loads(response.read())
+    except HTTPError as e:
+        return e.code, {}
+
+class Worker:
+    def __init__(self, coordinator_url, runner, name=None, heartbeat_interval=HEARTBEAT_INTERVAL, idle_interval=IDLE_INTERVAL,
+                 token=None):
+        """
+        Args:
+            coordinator_url (str): e.g. 'http://192.168.1.10:8765'.
+            runner: An object whose `run(settings)` runs a test and returns its result (see `MT4Runner`).
+            name (str): The name of the worker, which must be unique. Defaults to the host name.
+            token (str): The token of the coordinator, if it has one.
+        """
+        self.coordinator_url = coordinator_url.rstrip('/')
+        self.token = token
+        self.runner = runner
+        self.name = name or socket.gethostname()
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_interval = idle_interval
+        self.stop_event = Event()
+        self.completed = 0
+
+    def heartbeat(self, job_id, done):
+        while not done.wait(self.heartbeat_interval):
+            try:
+                status, _ = post(f'{self.coordinator_url}/heartbeat', {'worker': self.name, 'job_id': job_id}, token=self.token)
+                if status == 409:
+                    logger.warning(f"{self.name} lost the lease of test {job_id}.")
+                    return
+            except Exception as e:
+                logger.error(f"{self.name} failed to send a heartbeat: {e}")
+
+    def run(self, exit_when_finished=True):
+        """
+        Leases and runs tests until `self.stop_event` is set, or until the coordinator has no tests left if
+        `exit_when_finished` is True.
+        """
+        while not self.stop_event.is_set():
+            try:
+                _, lease = post(f'{self.coordinator_url}/lease', {'worker': self.name}, token=self.token)
+            except Exception as e:
+                logger.error(f"{self.name} can't reach the coordinator: {e}")
+                self.stop_event.wait(self.idle_interval)
+                continue
+
+            job_id = lease.get('job_id')
+            if job_id is None:
+                if lease.get('finished') and exit_when_finished:
+                    logger.info(f"{self.name} is done after {self.completed} tests.")
+                    return
+                self.stop_event.wait(self.idle_interval)
+                continue
+
+            done = Event()
+            Thread(target=self.heartbeat, args=(job_id, done), daemon=True).start()
+            started = monotonic()
+            try:
+                try:
+                    result = self.runner.run(lease['settings'])
+                except Exception as e:
+                    result = {'outcome': 'failed', 'error': str(e)}
+                result.update(worker=self.name, job_id=job_id, seconds=monotonic() - started)
+                if self.upload(result):  # The heartbeats keep the lease while the upload is retried
+                    self.completed += 1
+            finally:
+                done.set()
+
+    def upload(self, result):
+        """
+        Sends the result of a test to the coordinator. If it can't be reached, e.g. while it restarts, the upload is
+        retried up to UPLOAD_ATTEMPTS times with a growing wait, so that the finished test isn't lost.
+
+        Returns:
+            bool: True if the coordinator accepted the result.
+        """
+        interval = self.idle_interval
+        for attempt in range(1, UPLOAD_ATTEMPTS + 1):
+            try:
+                status, _ = post(f'{self.coordinator_url}/complete', result, token=self.token)
+                if status == 200:
+                    return True
+                if status == 409:
+                    logger.warning(f"{self.name} lost the lease of test {result['job_id']} before its result was uploaded.")
+                    return False
+                if status < 500:
+                    logger.error(f"The coordinator refused the result of test {result['job_id']} from {self.name} ({status}).")
+                    return False
+                error = f'the coordinator answered {status}'
+            except Exception as e:
+                error = e
+            logger.error(f"{self.name} failed to upload the result of test {result['job_id']} (attempt {attempt} of {UPLOAD_ATTEMPTS}): {error}")
+            if attempt < UPLOAD_ATTEMPTS and self.stop_event.wait(interval):
+                break
+            interval = min(interval * 2, MAX_RETRY_INTERVAL)
+        logger.error(f"{self.name} gave up uploading the result of test {result['job_id']}.")
+        return False
+
+class MT4Runner:
+    '''Runs tests on the MT4 of this machine, like `main.main` does for every row of the Settings file.'''
+
+    def __init__(self, mt4_exe_path, me_exe_path, html_reports_path, chrome_profile_path):
+        from components.mt4_controller import MT4Controller, StrategyTester
+        from components.ea_compiler import EAVariantFarm
+        from components.browser import LazyBrowser
+
+        self.html_reports_path = html_reports_path
+        self.mt4 = MT4Controller(mt4_exe_path, me_exe_path, reports_folder_path=html_reports_path)
+        self.strategy_tester = StrategyTester(self.mt4)
+        self.variant_farm = EAVariantFarm(self.mt4)
+        self.browser = LazyBrowser(keep_open=True, headless=True, chrome_profile_path=chrome_profile_path)
+        self.count = self.mt4.greatest_count(html_reports_path)
+
+    def run(self, settings):
+        """
+        Runs the test of `settings`, a row of the Settings file.
+
+        Returns:
+            dict: The outcome, the scraped data, the name and the base64 content of the report, and the error if it failed.
+        """
+        from components.records import TestJob
+        from components.reports_processor import process_html_file
+
+        job = TestJob.from_row(settings)
+        if job.expert is None:
+            return {'outcome': 'skipped'}
+        self.variant_farm.prepare([job])
+        if not self.strategy_tester.configure_tester(job):
+            return {'outcome': 'failed', 'error': 'Failed to configure the strategy tester.'}
+        if not self.strategy_tester.run_test(job.rules):
+            return {'outcome': 'failed', 'error': 'Failed to run the test.'}
+        self.count += 1
+        if not self.strategy_tester.download_report(job.expert, self.count):
+            return {'outcome': 'failed', 'error': 'Failed to save the report.'}
+
+        report_path = self.mt4.report_path(job.expert, self.count)
+        report_name = path.basename(report_path)
+        result = process_html_file(report_path, self.browser, lambda data: None)  # The coordinator writes the data
+        result.aborted = self.strategy_tester.aborted or ''
+        with open(report_path, 'rb') as file:
+            report = base64.b64encode(file.read()).decode('ascii')
+        return {'outcome': 'aborted' if result.aborted else 'completed', 'data': result.to_row(),
+                'report_name': report_name, 'report': report, 'error': self.strategy_tester.journal_error_summary()}
+
+class SimulatedRunner:
+    '''Pretends to run tests, for trying out the coordinator and workers without MT4.'''
+
+    def __init__(self, duration=0.5, failure_rate=0.0, seed=None):
+        self.duration = duration
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+
+    def run(self, settings):
+        sleep(self.duration * self.rng.uniform(0.5, 1.5))
+        if self.rng.random() < self.failure_rate:
+            return {'outcome': 'failed', 'error': 'Simulated failure'}
+        return {'outcome': 'completed', 'data': {'Expert': settings.get('Expert'), 'Total net profit': f'{self.rng.gauss(0, 1000):.2f}'}}
+
+def load_jobs(settings_excel_path):
+    """
+    Reads the Settings file and expands the sweeps in Expert properties into every combination.
+    """
+    from components.settings_reader import SettingsReader
+    from components.optimizer import has_sweep, expand_grid
+
+    jobs = []
+    for settings in SettingsReader(settings_excel_path).read_jobs():
+        jobs += expand_grid(settings) if settings.expert and has_sweep(settings) else [settings]
+    return jobs
+
+def simulate(workers, jobs, duration, failure_rate=0.0):
+    """
+    Runs a coordinator and `workers` simulated workers on localhost.
+
+    Returns:
+        float: The number of tests finished per second.
+    """
+    results = []
+    coordinator = Coordinator([{'Expert': f'EA{i}'} for i in range(jobs)], lambda job, result: results.append(result), port=0).start()
+    threads = [Thread(target=Worker(coordinator.url, SimulatedRunner(duration, failure_rate, seed=i), name=f'worker{i}',
+                                    heartbeat_interval=duration, idle_interval=duration / 5).run)
+               for i in range(workers)]
+    start = monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = monotonic() - start
+    coordinator.stop()
+    print(f"{workers} workers finished {len(results)} tests in {elapsed:.2f}s ({len(results) / elapsed:.2f} tests/s): {coordinator.queue.counts()}")
+    return len(results) / elapsed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Distributes back tests across machines.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    coordinator_parser = commands.add_parser('coordinator', help='Hold the tests and the results.')
+    coordinator_parser.add_argument('--settings', required=True, help='The Settings file.')
+    coordinator_parser.add_argument('--results', required=True, help='The Back Test Data file.')
+    coordinator_parser.add_argument('--reports', required=True, help='The folder in which the uploaded reports are saved.')
+    coordinator_parser.add_argument('--host', default='127.0.0.1',
+                                    help='Use 0.0.0.0 to accept workers from other machines, together with --token.')
+    coordinator_parser.add_argument('--token', default=getenv('BACKTEST_COORDINATOR_TOKEN'), help='A secret which the workers have to send.')
+    coordinator_parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    coordinator_parser.add_argument('--resume', action='store_true', help='Skip the tests which are done in the run state file.')
+
+    worker_parser = commands.add_parser('worker', help='Run tests leased from a coordinator.')
+    worker_parser.add_argument('--coordinator', required=True, help='e.g. http://192.168.1.10:8765')
+    worker_parser.add_argument('--name', help='A unique name of this worker. Defaults to the host name.')
+    worker_parser.add_argument('--token', default=getenv('BACKTEST_COORDINATOR_TOKEN'), help='The token of the coordinator.')
+    worker_parser.add_argument('--mt4', help='The MT4 exe.')
+    worker_parser.add_argument('--metaeditor', help='The MetaEditor exe.')
+    worker_parser.add_argument('--reports', help='The local folder in which MT4 saves the reports.')
+    worker_parser.add_argument('--chrome-profile', help='The Chrome profile used to scrape the reports.')
+    worker_parser.add_argument('--simulate', type=float, help='Pretend to run each test for this many seconds instead of using MT4.')
+    worker_parser.add_argument('--forever', action='store_true', help='Keep waiting for tests when the coordinator has none left.')
+
+    simulate_parser = commands.add_parser('simulate', help='Try out a coordinator and simulated workers on localhost.')
+    simulate_parser.add_argument('--workers', type=int, default=4)
+    simulate_parser.add_argument('--jobs', type=int, default=40)
+    simulate_parser.add_argument('--duration', type=float, default=0.5, help='Seconds per simulated test.')
+    simulate_parser.add_argument('--failure-rate', type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    if args.command == 'simulate':
+        simulate(args.workers, args.jobs, args.duration, args.failure_rate)
+    elif args.command == 'coordinator':
+        from components.run_state import RunState
+        from components.planner import RunHistory, RUN_HISTORY_FILE
+
+        run_state = RunState()
+        jobs = [settings for settings in load_jobs(args.settings) if not (args.resume and run_state.is_done(settings))]
+        makedirs(args.reports, exist_ok=True)
+        writer = ResultWriter(args.results, args.reports, run_state, RunHistory(getenv('BACKTEST_RUN_HISTORY') or RUN_HISTORY_FILE))
+        coordinator = Coordinator(jobs, writer.put, args.host, args.port, token=args.token).start()
+        try:
+            coordinator.wait()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            coordinator.stop()
+            writer.close()
+        print(f'Finished: {coordinator.queue.counts()}')
+    else:
+        if args.simulate is not None:
+            runner = SimulatedRunner(args.simulate)
+        elif not all((args.mt4, args.metaeditor, args.reports, args.chrome_profile)):
+            parser.error('worker needs --mt4, --metaeditor, --reports and --chrome-profile, or --simulate')
+        else:
+            runner = MT4Runner(args.mt4, args.metaeditor, args.reports, args.chrome_profile)
+        Worker(args.coordinator, runner, args.name, token=args.token).run(exit_when_finished=not args.forever)
+
+if __name__ == '__main__':
+    main()
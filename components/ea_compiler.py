@@ -0,0 +1,280 @@
+'''
+This module prepares the Expert Advisor variants needed by the pending tests before any test runs.
+A variant is the source code of an EA with some of its inputs changed. Every variant is written to the
+MQL4\\Experts\\_variants folder, compiled with MetaEditor from the command line and cached by a hash of its source text,
+so a job only has to select its prebuilt variant in the Strategy Tester and identical variants are never compiled twice.
+The `#include "..."` paths of a variant are rewritten to point to the folder of the original EA. The compiled variants
+are kept for later runs, but only the MAX_VARIANTS which were used most recently (BACKTEST_MAX_VARIANTS), so that they
+don't pile up in the Expert list of the Strategy Tester. The variants used by the current run are always kept.
+'''
+
+import hashlib
+import re
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from os import path, cpu_count, remove, makedirs, listdir, utime, getenv
+from components.logger import setup_logger
+from util import read_text
+from components.mq4_inputs import InputIndex
+from components.records import parse_properties
+
+logger = setup_logger(__name__)
+
+VARIANT_TAG = '_v'  # Variants are named [EA name]_v[hash].mq4
+VARIANTS_FOLDER = '_variants'  # Subfolder of MQL4\Experts in which the variants are written
+HASH_LENGTH = 10
+VARIANT_FILE = re.compile(r'.+' + VARIANT_TAG + r'[0-9a-f]{' + str(HASH_LENGTH) + r'}\.(?:mq4|ex4|log)$', re.IGNORECASE)
+QUOTED_INCLUDE = re.compile(r'^([ \t]*#include[ \t]*")([^"\r\n]+)"', re.MULTILINE)
+COMPILE_TIMEOUT = 120
+MAX_VARIANTS = 500  # Variants kept in the variants folder, besides those of the current run
+
+def base_name(ea_name):
+    """
+    Returns the name of an EA without its folder and extension, e.g. 'EA' for 'Folder\\EA.ex4'.
+    """
+    return re.split(r'[\\/]', re.sub(r'\.ex4$', '', ea_name.strip()))[-1]
+
+def is_variant_of(expert, ea_name):
+    """
+    Returns True if `expert`, the name of an EA in a report, is `ea_name` or one of the variants built from it.
+    """
+    base = base_name(ea_name)
+    return expert == base or re.fullmatch(re.escape(base) + VARIANT_TAG + r'[0-9a-f]{' + str(HASH_LENGTH) + '}', expert) is not None
+
+def source_hash(source):
+    """
+    Returns the hash which identifies a variant's source code.
+
+    Args:
+        source (str): The source code of the variant.
+
+    Returns:
+        str: The first `HASH_LENGTH` characters of the SHA-256 hex digest of the source code.
+    """
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()[:HASH_LENGTH]
+
+class EAVariantFarm:
+    def __init__(self, mt4, max_workers=None, max_variants=None):
+        self.mt4 = mt4
+        self.logger = logger
+        self.experts_folder = mt4.experts_folder()
+        self.max_workers = max_workers or min(4, cpu_count() or 1)
+        self.sources = {}  # Cache of the original source code (and its encoding) of every EA, keyed by EA name
+        self.input_indexes = {}  # Cache of the input declarations of every EA, keyed by EA name
+        self.max_variants = int(max_variants if max_variants is not None else getenv('BACKTEST_MAX_VARIANTS') or MAX_VARIANTS)
+        self.used_variants = set()  # Paths of the .mq4 files of the variants used by this run
+
+    def source_path(self, ea_name):
+        """
+        Returns the path of the .mq4 file of `ea_name`, which is the path shown in the Strategy Tester (e.g. 'Folder\\EA.ex4').
+        """
+        relative_path = re.sub(r'\.ex4$', '', ea_name.strip()) + '.mq4'
+        return path.join(self.experts_folder, relative_path)
+
+    def variant_name(self, ea_name, digest):
+        """
+        Returns the name of a variant as it appears in the Strategy Tester.
+
+        Args:
+            ea_name (str): The name of the original EA (e.g. 'Folder\\EA.ex4').
+            digest (str): The hash of the variant's source code.
+
+        Returns:
+            str: The name of the variant (e.g. '_variants\\EA_v0123456789.ex4').
+        """
+        return VARIANTS_FOLDER + '\\' + base_name(ea_name) + VARIANT_TAG + digest + '.ex4'
+
+    def variants_folder(self):
+        return path.join(self.experts_folder, VARIANTS_FOLDER)
+
+    def relocate_includes(self, ea_name, source):
+        """
+        Returns `source` with its relative `#include "..."` paths pointing from the variants folder to the folder of `ea_name`.
+        """
+        prefix = path.relpath(path.dirname(self.source_path(ea_name)), self.variants_folder()).replace('/', '\\') + '\\'
+
+        def relocate(match):
+            include = match.group(2)
+            if path.isabs(include) or re.match(r'^[A-Za-z]:|^[\\/]', include):
+                return match.group(0)
+            return f'{match.group(1)}{prefix}{include}"'
+
+        return QUOTED_INCLUDE.sub(relocate, source)
+
+    def read_source(self, ea_name):
+        """
+        Reads the original source code of `ea_name` once and caches it.
+
+        Returns:
+            tuple: The source code and its encoding.
+        """
+        if ea_name not in self.sources:
+            self.sources[ea_name] = read_text(self.source_path(ea_name))
+        return self.sources[ea_name]
+
+    def input_index(self, ea_name):
+        """
+        Parses the input declarations of `ea_name` once and caches them, so that each variant is a single rewrite.
+        """
+        if ea_name not in self.input_indexes:
+            self.input_indexes[ea_name] = InputIndex(self.read_source(ea_name)[0])
+        return self.input_indexes[ea_name]
+
+    def build_variant(self, ea_name, properties_string):
+        """
+        Writes the .mq4 file of the variant of `ea_name` that has the properties in `properties_string`.
+        Nothing is written if the file of this variant already exists.
+
+        Args:
+            ea_name (str): The name of the original EA.
+            properties_string (str): The properties to be configured in the format 'name=value, name=value,...'.
+
+        Returns:
+            tuple: The name of the variant in the Strategy Tester and the path of its .mq4 file.
+        """
+        encoding = self.read_source(ea_name)[1]
+        variant_source, skipped = self.input_index(ea_name).rewrite(parse_properties(properties_string))
+        for name, reason in skipped.items():
+            self.logger.warning(f"Property '{name}' of '{ea_name}' was not changed: {reason}")
+        variant_source = self.relocate_includes(ea_name, variant_source)
+        variant = self.variant_name(ea_name, source_hash(variant_source))
+        variant_path = self.source_path(variant)
+
+        if not path.exists(variant_path):
+            makedirs(path.dirname(variant_path), exist_ok=True)
+            with open(variant_path, 'w', encoding=encoding, newline='') as file:
+                file.write(variant_source)
+            self.logger.info(f"Wrote the source code of variant {variant}")
+
+        return variant, variant_path
+
+    def is_compiled(self, mq4_path):
+        """
+        Checks if the .ex4 file of `mq4_path` exists and is not older than the source code.
+        """
+        ex4_path = mq4_path[:-len('.mq4')] + '.ex4'
+        return path.exists(ex4_path) and path.getmtime(ex4_path) >= path.getmtime(mq4_path)
+
+    def compile(self, mq4_path):
+        """
+        Compiles `mq4_path` with `metaeditor.exe /compile` unless its compiled .ex4 file is already cached.
+
+        Args:
+            mq4_path (str): The path of the .mq4 file.
+
+        Returns:
+            bool: True if the .ex4 file exists after compiling, False otherwise.
+        """
+        if self.is_compiled(mq4_path):
+            self.logger.info(f"Using the cached compilation of {mq4_path}")
+            return True
+
+        log_path = mq4_path[:-len('.mq4')] + '.log'
+        command = f'"{self.mt4.me_exe_path}" /compile:"{mq4_path}" /log:"{log_path}"'
+        try:
+            subprocess.run(command, timeout=COMPILE_TIMEOUT)
+        except Exception as e:
+            self.logger.error(f"An error occurred while compiling {mq4_path}: {e}")
+            return False
+
+        if not self.is_compiled(mq4_path):
+            log = read_text(log_path)[0] if path.exists(log_path) else ''
+            self.logger.error(f"Failed to compile {mq4_path}. Compiler log: {log.strip()}")
+            return False
+
+        if path.exists(log_path):
+            remove(log_path)
+        self.logger.info(f"Compiled {mq4_path}")
+        return True
+
+    def touch(self, mq4_path):
+        """
+        Marks a variant as used now, so that it is pruned last. Only the .ex4 file is touched, which keeps it newer than
+        its source code.
+        """
+        ex4_path = mq4_path[:-len('.mq4')] + '.ex4'
+        try:
+            utime(ex4_path)
+        except OSError as e:
+            self.logger.warning(f"Failed to mark {ex4_path} as used: {e}")
+
+    def prepare(self, settings_list):
+        """
+        Builds and compiles the variants needed by `settings_list` in parallel. The name of the prebuilt variant of every
+        row with Expert properties is stored in its `variant`. Rows whose variant could not be prepared
+        are left unchanged, so their properties are configured in MetaEditor while the tester is being configured.
+
+        Args:
+            settings_list (list of TestJob): The tests read from the Settings file.
+
+        Returns:
+            int: The number of rows which have a prebuilt variant.
+        """
+        if not self.experts_folder:
+            self.logger.warning("The Experts folder was not found. EA variants will be compiled during each test.")
+            return 0
+
+        variants = {}  # Path of each .mq4 file to the rows which use it
+        for settings in settings_list:
+            ea_name = settings.get('Expert')
+            properties_string = settings.get('Expert properties')
+            if ea_name is None or properties_string is None or properties_string.strip() == '':
+                continue
+
+            try:
+                variant, variant_path = self.build_variant(ea_name.strip(), properties_string)
+                variants.setdefault(variant_path, (variant, []))[1].append(settings)
+            except Exception as e:
+                self.logger.error(f"Failed to build the variant of '{ea_name}' with properties '{properties_string}': {e}")
+
+        self.used_variants.update(variants)
+        self.prune()
+        if not variants:
+            return 0
+
+        self.logger.info(f"Compiling {len(variants)} EA variants with {self.max_workers} workers")
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            compiled = dict(zip(variants, executor.map(self.compile, variants)))
+
+        prepared = 0
+        for variant_path, (variant, rows) in variants.items():
+            if not compiled[variant_path]:
+                continue
+            self.touch(variant_path)
+            for settings in rows:
+                settings.variant = variant
+                prepared += 1
+
+        self.logger.info(f"{prepared} of the tests will use a prebuilt EA variant")
+        return prepared
+
+    def prune(self):
+        """
+        Deletes the files of the least recently used variants in the variants folder, so that at most `self.max_variants`
+        variants are kept besides those used by this run. A variant was last used when its newest file was modified.
+        """
+        folder = self.variants_folder()
+        if not path.isdir(folder):
+            return
+        used = {path.normcase(path.splitext(variant_path)[0]) for variant_path in self.used_variants}
+        variants = {}  # The path of each unused variant without extension to its files
+        for name in listdir(folder):
+            file_path = path.join(folder, name)
+            stem = path.normcase(path.splitext(file_path)[0])
+            if VARIANT_FILE.match(name) and stem not in used:
+                variants.setdefault(stem, []).append(file_path)
+        if len(variants) <= self.max_variants:
+            return
+
+        def last_used(files):
+            return max((path.getmtime(file_path) for file_path in files if path.exists(file_path)), default=0)
+
+        removed = 0
+        for files in sorted(variants.values(), key=last_used, reverse=True)[self.max_variants:]:
+            for file_path in files:
+                try:
+                    remove(file_path)
+                except OSError as e:
+                    self.logger.error(f"Failed to delete the unused variant file {file_path}: {e}")
+            removed += 1
+        self.logger.info(f"Deleted the files of {removed} variants which weren't used recently")
@@ -1,70 +1,221 @@
 '''
 This module contains functions for working with the Backtest Report Data Excel file.
+
+Back Test Data is split into shards so that no workbook gets too large to open. The file chosen in the GUI is the first
+shard. When the shard being written has BACKTEST_SHARD_ROWS rows (100000 by default) or is larger than
+BACKTEST_SHARD_MAX_MB, new rows go to a new workbook next to it, e.g. "Backtest Data.2.xlsx". With BACKTEST_SHARD_BY
+set to columns like "Expert,Symbol", each partition gets its own shards, e.g. "Backtest Data.MyEA_EURUSD.1.xlsx".
+The shards are listed in an index workbook, e.g. "Backtest Data.index.xlsx", which `shard_paths` reads.
 '''
 
+import re
+from datetime import datetime
+from os import getenv, path
 import openpyxl
 from openpyxl import Workbook
 from components.logger import setup_logger, INFO
+from components.tracing import traced
+from components.metrics import metrics
+from time import perf_counter
 
 # Set up logger for this file
 main_logger = setup_logger(__name__, INFO)
 
+MAX_ROWS = 100000  # Rows of a shard, including the header row, after which a new shard is started
+INDEX_HEADERS = ['File', 'Partition', 'Created']
+
+def index_path(file_path):
+    """
+    Returns the path of the index workbook of the Back Test Data file `file_path`.
+    """
+    return path.splitext(file_path)[0] + '.index.xlsx'
+
+def read_index(file_path):
+    """
+    Returns the (path, partition) of the shards listed in the index workbook of `file_path`, without `file_path` itself.
+    """
+    if not path.exists(index_path(file_path)):
+        return []
+    wb = openpyxl.load_workbook(index_path(file_path), read_only=True)
+    try:
+        rows = list(wb.worksheets[0].iter_rows(min_row=2, values_only=True))
+    finally:
+        wb.close()
+    folder = path.dirname(file_path)
+    return [(path.join(folder, row[0]), row[1] or '') for row in rows if row and row[0]]
+
+def shard_paths(file_path):
+    """
+    Returns the paths of all of the shards of the Back Test Data file `file_path`, starting with `file_path`.
+    """
+    return [file_path] + [shard_path for shard_path, _ in read_index(file_path) if path.exists(shard_path)]
+
+def partition_value(value):
+    """
+    Returns the part of a file name for a cell value, e.g. 'EURUSD' for 'EURUSD (Euro vs US Dollar)'.
+    """
+    text = str(value or '').strip().split(' (')[0]
+    return re.sub(r'[^\w-]+', '_', text).strip('_') or 'none'
+
+class Shard:
+    '''A workbook of Back Test Data.'''
+
+    def __init__(self, file_path, partition):
+        self.file_path = file_path
+        self.partition = partition  # Partition of the rows of the shard, '' for the first shard
+        self.rows = 0  # Rows including the header row
+
+    def is_full(self, max_rows, max_bytes):
+        if self.rows >= max_rows:
+            return True
+        return bool(max_bytes) and path.exists(self.file_path) and path.getsize(self.file_path) >= max_bytes
+
 class ExcelUtil:
-    def __init__(self, report_data_file_path):
+    def __init__(self, report_data_file_path, max_rows=None, max_mb=None, partition_by=None):
+        """
+        Args:
+            report_data_file_path (str): The path of the Back Test Data file, which is the first shard.
+            max_rows (int): The rows of a shard after which a new shard is started. BACKTEST_SHARD_ROWS by default.
+            max_mb (float): The size of a shard in MB after which a new shard is started. BACKTEST_SHARD_MAX_MB by default.
+            partition_by (list of str): The columns whose values get shards of their own, e.g. ['Expert', 'Symbol'].
+                BACKTEST_SHARD_BY by default.
+        """
         self.file_path = report_data_file_path
+        self.max_rows = int(max_rows or getenv('BACKTEST_SHARD_ROWS') or MAX_ROWS)
+        max_mb = max_mb or getenv('BACKTEST_SHARD_MAX_MB')
+        self.max_bytes = int(float(max_mb) * 1024 * 1024) if max_mb else None
+        if partition_by is None:
+            partition_by = [column.strip() for column in (getenv('BACKTEST_SHARD_BY') or '').split(',') if column.strip()]
+        self.partition_by = list(partition_by)
+        self.shards = None  # The Shard of each file, read on the first write
+        self.locations = {}  # Source File of each row to its (Shard, row number)
 
     def setup_excel_file(self, titles):
         """
-        Ensures the `self.file_path` Excel file exists and has the required headers.
+        Ensures the `self.file_path` Excel file exists and has the required headers. The headers of the other shards
+        are updated too.
         
         Args:
-        - titles (dict): A dictionary where keys are the titles and values are the corresponding xpaths.
+        - titles (dict or list): The titles, e.g. a dictionary where keys are the titles and values are the corresponding xpaths.
 
         Returns:
         - str: The path to the Excel file.
         """
-        try:
-            # Open the Excel file
-            wb = openpyxl.load_workbook(self.file_path)
-            ws = wb.active
+        new_headers = ["Source File"] + list(titles)
+        for file_path in shard_paths(self.file_path):
+            try:
+                # Open the Excel file
+                wb = openpyxl.load_workbook(file_path)
+                ws = wb.worksheets[0] if file_path != self.file_path else wb.active
 
-            existing_headers = [cell.value for cell in ws[1]]
-            new_headers = ["Source File"] + list(titles.keys())
+                existing_headers = [cell.value for cell in ws[1]]
 
-            # Add any missing headers to the existing workbook
-            for header in new_headers:
-                if header not in existing_headers:
-                    ws.cell(row=1, column=len(existing_headers) + 1, value=header)
-                    existing_headers.append(header)
+                # Add any missing headers to the existing workbook
+                for header in new_headers:
+                    if header not in existing_headers:
+                        ws.cell(row=1, column=len(existing_headers) + 1, value=header)
+                        existing_headers.append(header)
 
-            wb.save(self.file_path)
-            main_logger.info(f"Verified and updated headers in existing Excel file: {self.file_path}")
+                wb.save(file_path)
+                main_logger.info(f"Verified and updated headers in existing Excel file: {file_path}")
+            except Exception as e:
+                main_logger.error(f"Error setting up Excel file {file_path}: {e}")
+                raise
+        return self.file_path
 
-            return self.file_path
-        except Exception as e:
-            main_logger.error(f"Error setting up Excel file {self.file_path}: {e}")
-            raise
+    def load_shards(self):
+        """
+        Reads the Source File column of every shard, so that a row can be updated without searching for it.
+        """
+        self.shards, self.locations = [], {}
+        for file_path, partition in [(self.file_path, '')] + read_index(self.file_path):
+            if not path.exists(file_path):
+                main_logger.error(f"The shard {file_path} of {self.file_path} is missing")
+                continue
+            shard = Shard(file_path, partition)
+            wb = openpyxl.load_workbook(file_path, read_only=True)
+            try:
+                for row_number, (source_file,) in enumerate(wb.worksheets[0].iter_rows(max_col=1, values_only=True), start=1):
+                    shard.rows = row_number
+                    if row_number > 1 and source_file:
+                        self.locations.setdefault(source_file, (shard, row_number))
+            finally:
+                wb.close()
+            self.shards.append(shard)
+        main_logger.info(f"Found {len(self.locations)} rows in {len(self.shards)} shards of {self.file_path}")
+
+    def partition(self, data):
+        """
+        Returns the partition of a row, e.g. 'MyEA_EURUSD', or '' if the rows are not partitioned.
+        """
+        return '_'.join(partition_value(data.get(column)) for column in self.partition_by)
+
+    def shard_for(self, data):
+        """
+        Returns the shard a new row is appended to, which is started if the shards of its partition are full.
+        """
+        partition = self.partition(data)
+        shards = [shard for shard in self.shards if shard.partition == partition]
+        if shards and not shards[-1].is_full(self.max_rows, self.max_bytes):
+            return shards[-1]
+        return self.add_shard(partition, len(shards) + 1)
+
+    def add_shard(self, partition, number):
+        """
+        Creates a shard with the headers of the first shard and lists it in the index workbook.
+        """
+        stem = path.splitext(self.file_path)[0]
+        file_path = f'{stem}.{partition}.{number}.xlsx' if partition else f'{stem}.{number}.xlsx'
+        wb = openpyxl.load_workbook(self.file_path, read_only=True)
+        try:
+            headers = next(wb.worksheets[0].iter_rows(max_row=1, values_only=True), ())
+        finally:
+            wb.close()
+        shard_wb = Workbook()
+        shard_wb.active.append(list(headers))
+        shard_wb.save(file_path)
+
+        index_file = index_path(self.file_path)
+        if path.exists(index_file):
+            index_wb = openpyxl.load_workbook(index_file)
+        else:
+            index_wb = Workbook()
+            index_wb.active.append(INDEX_HEADERS)
+        index_wb.worksheets[0].append([path.basename(file_path), partition, datetime.now()])
+        index_wb.save(index_file)
 
+        shard = Shard(file_path, partition)
+        shard.rows = 1
+        self.shards.append(shard)
+        main_logger.info(f"Started the shard {file_path} of {self.file_path}")
+        return shard
+
+    @traced
     def add_data_to_excel(self, data):
         """
-        Add data to the Excel file. If a row with the same 'Source File' value exists, update it;
-        otherwise, append a new row.
+        Add data to the Excel file. If a row with the same 'Source File' value exists in one of the shards, update it;
+        otherwise, append a new row to the last shard of its partition.
         
         Args:
         - data (dict): A dictionary where keys are column headers and values are the data to be added.
         """
         try:
-            wb = openpyxl.load_workbook(self.file_path)
-            ws = ws = wb.worksheets[0] # Open the 1st work sheet
-
+            if self.shards is None:
+                self.load_shards()
             source_file = data["Source File"]
-            existing_row_idx = None
+            shard, existing_row_idx = self.locations.get(source_file, (None, None))
+            if shard is None:
+                shard = self.shard_for(data)
 
-            # Check if the same "Source File" value already exists in the Excel file
-            for row in ws.iter_rows(min_row=2, max_col=1):
-                if row[0].value == source_file:
-                    existing_row_idx = row[0].row
-                    break
+            wb = openpyxl.load_workbook(shard.file_path)
+            ws = wb.worksheets[0] # Open the 1st work sheet
+
+            if existing_row_idx and ws.cell(row=existing_row_idx, column=1).value != source_file:
+                existing_row_idx = None  # The file was changed since it was read, so search for the row again
+                for row in ws.iter_rows(min_row=2, max_col=1):
+                    if row[0].value == source_file:
+                        existing_row_idx = row[0].row
+                        break
 
             if existing_row_idx: # If data for this file has already been written in the Excel file, just update it
                 for col_num, header in enumerate(ws[1], start=1):
@@ -75,9 +226,14 @@ class ExcelUtil:
                 for header in ws[1]:
                     new_row.append(data.get(header.value, ""))
                 ws.append(new_row)
+                existing_row_idx = ws.max_row
                 main_logger.info(f"Appended data for {source_file} to Excel file.")
+            self.locations[source_file] = (shard, existing_row_idx)
+            shard.rows = max(shard.rows, existing_row_idx)
 
-            wb.save(self.file_path)
+            start = perf_counter()
+            wb.save(shard.file_path)
+            metrics.flush_seconds.observe(perf_counter() - start)
         except Exception as e:
             main_logger.error(f"Error adding data to Excel file {self.file_path}: {e}")
-            raise
\ No newline at end of file
+            raise
@@ -0,0 +1,239 @@
+'''
+This module checks that MT4 has the history data needed by the tests before any test runs, so that missing data is not
+only found in an empty report after a full test cycle.
+
+The history files of the data folder are read memory-mapped, so only the bar times are read from disk:
+- history\\[server]\\[symbol][period].hst, the bars of a chart. The 148 byte header has the symbol and period, followed
+  by 60 byte bars (version 401) or 44 byte bars (version 400),
+- tester\\history\\[symbol][period]_[model].fxt, the ticks generated for a previous test. The 728 byte header has the
+  symbol and period, followed by 56 byte ticks.
+
+A test has adequate data if the bars of its symbol and period cover its dates without a gap longer than MAX_GAP_DAYS.
+The symbol of a history file only has to start with the Symbol of the test, e.g. EURUSDm matches EURUSD.
+
+Usage:
+    python -m components.history_preflight [MT4 data folder] [--settings [Settings file]] [--max-gap-days 4]
+'''
+
+import argparse
+import calendar
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from os import path, walk
+import numpy as np
+from components.logger import setup_logger
+from components.records import Period, tester_date
+
+logger = setup_logger(__name__)
+
+MODES = ('off', 'warn', 'skip')
+MAX_GAP_DAYS = 4  # Longer gaps between two bars are reported. Weekends and most holidays are shorter
+HST_HEADER_SIZE = 148
+FXT_HEADER_SIZE = 728
+HST_HEADER = np.dtype([('version', '<i4'), ('copyright', 'S64'), ('symbol', 'S12'), ('period', '<i4')])
+FXT_HEADER = np.dtype([('version', '<i4'), ('copyright', 'S64'), ('description', 'S128'), ('symbol', 'S12'),
+                       ('period', '<i4'), ('model', '<i4')])
+HST_400_BAR = np.dtype([('time', '<u4'), ('open', '<f8'), ('low', '<f8'), ('high', '<f8'), ('close', '<f8'), ('volume', '<f8')])
+HST_401_BAR = np.dtype([('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'), ('volume', '<i8'),
+                        ('spread', '<i4'), ('real_volume', '<i8')])
+FXT_TICK = np.dtype([('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'), ('volume', '<i8'),
+                     ('tick_time', '<i4'), ('flag', '<i4')])
+MODEL_SUFFIXES = {0: 'Every tick', 1: 'Control points', 2: 'Open prices'}
+
+def to_seconds(date):
+    return calendar.timegm(date.timetuple())
+
+def to_text(seconds):
+    return f'{datetime.fromtimestamp(int(seconds), timezone.utc):%Y.%m.%d %H:%M}'
+
+@dataclass
+class Coverage:
+    '''The bars of a symbol and period in a history file.'''
+    file_path: str
+    symbol: str
+    period: int  # Minutes
+    model: str = None  # Model of the ticks of an .fxt file, None for an .hst file
+    bars: int = 0
+    first: int = None  # Time of the first bar, in seconds since 1970
+    last: int = None
+    gaps: list = field(default_factory=list)  # (start, end) of each gap longer than the maximum, in seconds
+
+    @property
+    def name(self):
+        try:
+            return f'{self.symbol} {Period(self.period).label}'
+        except ValueError:
+            return f'{self.symbol} {self.period}'
+
+    def describe(self):
+        if not self.bars:
+            return f'{self.name}: no bars ({self.file_path})'
+        gaps = ', '.join(f'{to_text(start)} - {to_text(end)}' for start, end in self.gaps[:5])
+        more = f' and {len(self.gaps) - 5} more' if len(self.gaps) > 5 else ''
+        return (f"{self.name}{' ' + self.model if self.model else ''}: {self.bars} bars from "
+                f"{to_text(self.first)} to {to_text(self.last)}" + (f', gaps: {gaps}{more}' if gaps else ''))
+
+    def check(self, start, end, max_gap):
+        """
+        Checks that the bars cover `start` to `end` (seconds, either can be None).
+
+        Returns:
+            str: Why the coverage is not adequate, or None if it is.
+        """
+        if not self.bars:
+            return f'{self.file_path} has no bars'
+        if start is not None and self.first > start + max_gap:
+            return f'the history of {self.name} starts on {to_text(self.first)}, after {to_text(start)}'
+        if end is not None and self.last + max_gap < end:
+            return f'the history of {self.name} ends on {to_text(self.last)}, before {to_text(end)}'
+        for gap_start, gap_end in self.gaps:
+            if (start is None or gap_end > start) and (end is None or gap_start < end):
+                return f'the history of {self.name} has no bars from {to_text(gap_start)} to {to_text(gap_end)}'
+        return None
+
+def read_coverage(file_path, max_gap):
+    """
+    Reads the symbol, period and bar times of an .hst or .fxt file.
+
+    Returns:
+        Coverage: The coverage of the file, or None if it is not a valid history file.
+    """
+    size = path.getsize(file_path)
+    if file_path.lower().endswith('.fxt'):
+        header_size, header_type = FXT_HEADER_SIZE, FXT_HEADER
+    else:
+        header_size, header_type = HST_HEADER_SIZE, HST_HEADER
+    if size < header_size:
+        return None
+    header = np.fromfile(file_path, dtype=header_type, count=1)[0]
+    if header_type is FXT_HEADER:
+        bar_type, model = FXT_TICK, MODEL_SUFFIXES.get(int(header['model']))
+    else:
+        bar_type, model = (HST_401_BAR if header['version'] >= 401 else HST_400_BAR), None
+    coverage = Coverage(file_path, header['symbol'].decode('ascii', 'ignore'), int(header['period']), model)
+
+    coverage.bars = (size - header_size) // bar_type.itemsize
+    if coverage.bars:
+        times = np.memmap(file_path, dtype=bar_type, mode='r', offset=header_size, shape=(coverage.bars,))['time']
+        coverage.first, coverage.last = int(times[0]), int(times[-1])
+        gaps = np.flatnonzero(np.diff(times.astype(np.int64)) > max(max_gap, 2 * 60 * coverage.period))
+        coverage.gaps = [(int(times[i]), int(times[i + 1])) for i in gaps]
+    return coverage
+
+class HistoryIndex:
+    '''The coverage of every history file of an MT4 data folder.'''
+
+    def __init__(self, data_folder, max_gap_days=MAX_GAP_DAYS):
+        self.data_folder = data_folder
+        self.max_gap = int(max_gap_days * 24 * 60 * 60)
+        self.coverages = []
+        self.checks = {}  # Cache of the result of each (symbol, period, model, start, end)
+
+    def scan(self):
+        """
+        Reads the headers and bar times of the history files.
+
+        Returns:
+            HistoryIndex: self.
+        """
+        folders = [(path.join(self.data_folder, 'history'), '.hst'), (path.join(self.data_folder, 'tester', 'history'), '.fxt')]
+        for folder, extension in folders:
+            for root, _, files in walk(folder):
+                for name in files:
+                    if not name.lower().endswith(extension):
+                        continue
+                    try:
+                        coverage = read_coverage(path.join(root, name), self.max_gap)
+                        if coverage:
+                            self.coverages.append(coverage)
+                    except Exception as e:
+                        logger.error(f"Failed to read the history file {path.join(root, name)}: {e}")
+        logger.info(f"Found {len(self.coverages)} history files in {self.data_folder}")
+        return self
+
+    def check(self, job):
+        """
+        Checks the history data of a test.
+
+        Args:
+            job (TestJob): The test.
+
+        Returns:
+            str: Why the data of the test is not adequate, or None if it is or if the test has no symbol or period.
+        """
+        if not job.symbol or job.period is None:
+            return None
+        start = to_seconds(job.from_date) if job.from_date else None
+        end = to_seconds(job.to_date + timedelta(days=1)) if job.to_date else None
+        key = (job.symbol.upper(), job.period.value, job.model, start, end)
+        if key not in self.checks:
+            self.checks[key] = self.check_coverage(*key)
+        return self.checks[key]
+
+    def check_coverage(self, symbol, period, model, start, end):
+        matching = [coverage for coverage in self.coverages
+                    if coverage.period == period and coverage.symbol.upper().startswith(symbol)
+                    and (coverage.model is None or model is None or coverage.model == model.label)]
+        if not matching:
+            return f'there is no history of {symbol} {Period(period).label}'
+        problems = []
+        for coverage in sorted(matching, key=lambda coverage: coverage.model is not None):  # .hst files first
+            problem = coverage.check(start, end, self.max_gap)
+            if problem is None:
+                return None
+            problems.append(problem)
+        return problems[0]
+
+def preflight(jobs, data_folder, mode='warn', max_gap_days=MAX_GAP_DAYS):
+    """
+    Checks the history data of `jobs` and leaves out the tests without adequate data if `mode` is 'skip'.
+
+    Args:
+        jobs (list of TestJob): The tests to run.
+        data_folder (str): The MT4 data folder.
+        mode (str): 'off', 'warn' or 'skip'.
+
+    Returns:
+        tuple: The tests to run and a list of (test, problem) of the tests without adequate data.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown preflight mode '{mode}'. It should be one of: {', '.join(MODES)}")
+    if mode == 'off' or not data_folder:
+        return jobs, []
+
+    index = HistoryIndex(data_folder, max_gap_days).scan()
+    kept, flagged, counts = [], [], {}
+    for job in jobs:
+        problem = index.check(job)
+        if problem:
+            flagged.append((job, problem))
+            counts[problem] = counts.get(problem, 0) + 1
+        if not problem or mode == 'warn':
+            kept.append(job)
+    for problem, count in counts.items():
+        logger.warning(f"{'Skipping' if mode == 'skip' else 'Not enough history data for'} {count} tests: {problem}")
+    return kept, flagged
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Reports the history data of MT4 and checks it against the tests of a Settings file.')
+    parser.add_argument('data_folder', help='The MT4 data folder, which has the history and tester folders.')
+    parser.add_argument('--settings', help='A Settings file whose tests are checked.')
+    parser.add_argument('--max-gap-days', type=float, default=MAX_GAP_DAYS, help='Longer gaps between two bars are reported.')
+    args = parser.parse_args(argv)
+
+    index = HistoryIndex(args.data_folder, args.max_gap_days).scan()
+    for coverage in sorted(index.coverages, key=lambda coverage: (coverage.symbol, coverage.period, coverage.model or '')):
+        print(coverage.describe())
+
+    if args.settings:
+        from components.settings_reader import SettingsReader
+
+        jobs = SettingsReader(args.settings).read_jobs()
+        problems = [(job, index.check(job)) for job in jobs]
+        problems = [(job, problem) for job, problem in problems if problem]
+        print(f'\n{len(jobs) - len(problems)} of {len(jobs)} tests have adequate history data')
+        for job, problem in problems:
+            print(f'{job.label} {tester_date(job.from_date) or ""} - {tester_date(job.to_date) or ""}: {problem}')
+
+if __name__ == '__main__':
+    main()
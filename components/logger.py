@@ -1,28 +1,107 @@
 '''
 This is for setting up a logger for the application. Any file can use this to create its own logger.
 This was done to avoid repetition of code.
+
+Loggers only put their records on a queue. A background thread writes them to the log file and stdout, so logging never
+blocks the thread that runs the tests. The log file is rotated when it grows past LOG_MAX_BYTES or gets older than
+LOG_MAX_AGE, and LOG_BACKUP_COUNT old files are kept.
+
+The level of any logger can be changed with the BACKTEST_LOG_LEVELS environment variable, which is a comma separated
+list of [logger name prefix]=[level], e.g. BACKTEST_LOG_LEVELS="components.mt4_controller=DEBUG,main=WARNING".
 '''
 
+import atexit
 import logging
-from logging import getLogger, FileHandler, StreamHandler, Formatter, INFO
+from logging import getLogger, StreamHandler, Formatter, INFO
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from os import getenv
+from queue import SimpleQueue
+from time import time
 import sys
 
-def setup_logger(logger_name, logger_level=INFO, file='app_log.log'):
-    '''This sets up a logger and returns it'''
-    logger = getLogger(logger_name)
-    logger.setLevel(logger_level)
-    
-    if not logger.handlers:  # Check if handlers are already added
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_MAX_AGE = 24 * 60 * 60  # Seconds
+LOG_BACKUP_COUNT = 5
+
+listeners = {}  # Log file path to the (queue, QueueListener) which writes to it
+
+class SizeAndTimeRotatingFileHandler(RotatingFileHandler):
+    '''A RotatingFileHandler which also rotates the file once it has been written to for longer than `max_age` seconds.'''
+
+    def __init__(self, filename, max_bytes, max_age, backup_count):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+        self.max_age = max_age
+        self.rollover_at = time() + max_age
+
+    def shouldRollover(self, record):
+        if time() >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = time() + self.max_age
+
+def configured_levels():
+    """
+    Parses the BACKTEST_LOG_LEVELS environment variable.
+
+    Returns:
+        dict: Logger name prefix to level name.
+    """
+    levels = {}
+    for entry in (getenv('BACKTEST_LOG_LEVELS') or '').split(','):
+        if '=' in entry:
+            prefix, level = entry.split('=', 1)
+            levels[prefix.strip()] = level.strip().upper()
+    return levels
+
+def level_for(logger_name, default_level):
+    """
+    Returns the level configured for `logger_name` in BACKTEST_LOG_LEVELS (the longest matching prefix wins),
+    or `default_level` if there is none.
+    """
+    matches = [prefix for prefix in configured_levels() if logger_name == prefix or logger_name.startswith(prefix + '.')]
+    if not matches:
+        return default_level
+    return logging.getLevelName(configured_levels()[max(matches, key=len)])
+
+def log_queue(file):
+    """
+    Returns the queue of the background writer of `file`, starting the writer the first time.
+    """
+    if file not in listeners:
         date_format = "%m.%d.%y %H:%M:%S"
         formatter = Formatter('%(name)s.py %(funcName)s() %(levelname)s: %(message)s %(asctime)s', datefmt=date_format)
 
-        file_handler = FileHandler(file)
+        file_handler = SizeAndTimeRotatingFileHandler(file, LOG_MAX_BYTES, LOG_MAX_AGE, LOG_BACKUP_COUNT)
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
 
         # Create a StreamHandler with utf-8 encoding for sys.stdout
         stream_handler = StreamHandler(sys.stdout)
         stream_handler.setFormatter(formatter)
-        logger.addHandler(stream_handler)
+
+        queue = SimpleQueue()
+        listener = QueueListener(queue, file_handler, stream_handler, respect_handler_level=True)
+        listener.start()
+        listeners[file] = (queue, listener)
+
+    return listeners[file][0]
+
+def stop_listeners():
+    '''Writes the queued records and stops the background writers.'''
+    for _, listener in listeners.values():
+        listener.stop()
+    listeners.clear()
+
+atexit.register(stop_listeners)
+
+def setup_logger(logger_name, logger_level=INFO, file='app_log.log'):
+    '''This sets up a logger and returns it'''
+    logger = getLogger(logger_name)
+    logger.setLevel(level_for(logger_name, logger_level))
+
+    if not logger.handlers:  # Check if handlers are already added
+        logger.addHandler(QueueHandler(log_queue(file)))
 
     return logger
@@ -0,0 +1,268 @@
+'''
+This module collects throughput and health metrics of a run and exposes them in two ways:
+- a local HTTP endpoint which serves them in the Prometheus text format (http://127.0.0.1:[port]/metrics),
+- a JSON snapshot file which is rewritten periodically.
+
+Metrics are updated from `main.main` and the components. The durations of the traced stages (see `tracing`) are
+recorded in the `backtest_stage_seconds` histogram while the metrics are being served.
+'''
+
+import json
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os import replace
+from threading import Lock, Thread, Event
+from time import time
+from components.logger import setup_logger
+from components.tracing import tracer
+
+logger = setup_logger(__name__)
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+SNAPSHOT_INTERVAL = 10  # Seconds between two writes of the snapshot file
+RATE_WINDOW = 15 * 60  # Seconds over which the ingest rate is computed
+
+def label_text(labels):
+    """
+    Returns `labels` (a tuple of (name, value) pairs) in the Prometheus format, e.g. '{stage="run_test"}'.
+    """
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}'
+
+def snapshot_key(labels):
+    """
+    Returns `labels` as a key of the snapshot file, e.g. 'stage=run_test', or 'total' if there are no labels.
+    """
+    return ','.join(f'{name}={value}' for name, value in labels) or 'total'
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name, self.help_text = name, help_text
+        self.values = {}
+        self.lock = Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self.lock:
+            lines += [f'{self.name}{label_text(key)} {value}' for key, value in self.values.items()]
+        return lines
+
+    def snapshot(self):
+        with self.lock:
+            return {snapshot_key(key): value for key, value in self.values.items()}
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+class Gauge(Counter):
+    def set(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = value
+
+    def render(self):
+        lines = super().render()
+        lines[1] = f'# TYPE {self.name} gauge'
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name, self.help_text = name, help_text
+        self.buckets = tuple(buckets)
+        self.series = {}  # Labels to [bucket counts, sum, count]
+        self.lock = Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0, 0])
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            for key, (counts, total, count) in self.series.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += bucket_count
+                    lines.append(f'{self.name}_bucket{label_text(key + (("le", bound),))} {cumulative}')
+                lines.append(f'{self.name}_sum{label_text(key)} {total}')
+                lines.append(f'{self.name}_count{label_text(key)} {count}')
+        return lines
+
+    def snapshot(self):
+        with self.lock:
+            return {snapshot_key(key): {'count': count, 'sum': round(total, 4), 'mean': round(total / count, 4) if count else 0}
+                    for key, (_, total, count) in self.series.items()}
+
+    def clear(self):
+        with self.lock:
+            self.series.clear()
+
+class Metrics:
+    def __init__(self):
+        self.started_at = time()
+        self.tests = Counter('backtest_tests_total', 'Tests by outcome (completed, aborted, failed, skipped, cancelled).')
+        self.reports_ingested = Counter('backtest_reports_ingested_total', 'Reports scraped and written to Back Test Data.')
+        self.queue_depth = Gauge('backtest_queue_depth', 'Tests which have not been run yet.')
+        self.ingest_backlog = Gauge('backtest_ingest_backlog', 'Saved reports waiting to be scraped and written to Back Test Data.')
+        self.last_progress = Gauge('backtest_last_progress_timestamp_seconds', 'When the last test finished or report was ingested.')
+        self.stage_seconds = Histogram('backtest_stage_seconds', 'Duration of each stage of a test.')
+        self.flush_seconds = Histogram('backtest_workbook_flush_seconds', 'Duration of saving the Back Test Data workbook.', (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+        self.ingest_times = []  # Timestamps of recent ingests, used to compute the ingest rate
+        self.lock = Lock()
+
+    def reset(self):
+        """
+        Clears all of the metrics and restarts the uptime, so that a run started after another one in the same process
+        (e.g. from the GUI) doesn't report the tests and rates of the previous run.
+        """
+        for metric in (self.tests, self.reports_ingested, self.queue_depth, self.ingest_backlog, self.last_progress, self.stage_seconds, self.flush_seconds):
+            metric.clear()
+        with self.lock:
+            self.ingest_times = []
+            self.started_at = time()
+
+    def test_finished(self, outcome):
+        """
+        Counts a test with the `outcome` 'completed', 'aborted', 'failed', 'skipped' or 'cancelled'.
+        """
+        self.tests.inc(outcome=outcome)
+        self.last_progress.set(time())
+
+    def report_ingested(self):
+        """
+        Counts a report that was written to Back Test Data.
+        """
+        now = time()
+        self.reports_ingested.inc()
+        self.last_progress.set(now)
+        with self.lock:
+            self.ingest_times.append(now)
+            self.ingest_times = [t for t in self.ingest_times if now - t <= RATE_WINDOW]
+
+    def ingest_rate(self):
+        """
+        Returns the number of reports ingested per minute over the last `RATE_WINDOW` seconds.
+        """
+        now = time()
+        with self.lock:
+            recent = [t for t in self.ingest_times if now - t <= RATE_WINDOW]
+        window = min(RATE_WINDOW, now - self.started_at) or 1
+        return len(recent) / window * 60
+
+    def render(self):
+        """
+        Returns all of the metrics in the Prometheus text format.
+        """
+        lines = []
+        for metric in (self.tests, self.reports_ingested, self.queue_depth, self.ingest_backlog, self.last_progress, self.stage_seconds, self.flush_seconds):
+            lines += metric.render()
+        lines += ['# HELP backtest_ingest_rate_per_minute Reports ingested per minute recently.',
+                  '# TYPE backtest_ingest_rate_per_minute gauge',
+                  f'backtest_ingest_rate_per_minute {self.ingest_rate():.3f}',
+                  '# HELP backtest_uptime_seconds Seconds since the run started.',
+                  '# TYPE backtest_uptime_seconds gauge',
+                  f'backtest_uptime_seconds {time() - self.started_at:.1f}']
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """
+        Returns all of the metrics as a dictionary.
+        """
+        return {
+            'timestamp': time(),
+            'uptime_seconds': round(time() - self.started_at, 1),
+            'tests': self.tests.snapshot(),
+            'reports_ingested': self.reports_ingested.snapshot(),
+            'ingest_rate_per_minute': round(self.ingest_rate(), 3),
+            'queue_depth': self.queue_depth.snapshot(),
+            'ingest_backlog': self.ingest_backlog.snapshot(),
+            'last_progress_timestamp': self.last_progress.snapshot(),
+            'stage_seconds': self.stage_seconds.snapshot(),
+            'workbook_flush_seconds': self.flush_seconds.snapshot(),
+        }
+
+metrics = Metrics()
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes are not worth a log line each
+
+class MetricsServer:
+    def __init__(self, port=None, snapshot_path=None, snapshot_interval=SNAPSHOT_INTERVAL):
+        self.port = port
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.server = None
+        self.stopped = Event()
+
+    def start(self):
+        """
+        Starts serving the metrics on 127.0.0.1:`self.port` and writing the snapshot file, for the ones that are set.
+        """
+        tracer.add_listener(observe_stage)
+
+        if self.port is not None:
+            self.server = ThreadingHTTPServer(('127.0.0.1', self.port), MetricsHandler)
+            Thread(target=self.server.serve_forever, daemon=True).start()
+            logger.info(f"Serving metrics on http://127.0.0.1:{self.server.server_port}/metrics")
+        if self.snapshot_path:
+            Thread(target=self.write_snapshots, daemon=True).start()
+        return self
+
+    def write_snapshot(self):
+        """
+        Writes the snapshot file atomically, so that readers never see a partial file.
+        """
+        try:
+            temporary_path = self.snapshot_path + '.tmp'
+            with open(temporary_path, 'w') as file:
+                json.dump(metrics.snapshot(), file, indent=2)
+            replace(temporary_path, self.snapshot_path)
+        except Exception as e:
+            logger.error(f"Failed to write the metrics snapshot {self.snapshot_path}: {e}")
+
+    def write_snapshots(self):
+        while not self.stopped.wait(self.snapshot_interval):
+            self.write_snapshot()
+
+    def stop(self):
+        """
+        Stops the endpoint and writes a last snapshot.
+        """
+        tracer.remove_listener(observe_stage)
+
+        self.stopped.set()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+        if self.snapshot_path:
+            self.write_snapshot()
+
+def observe_stage(name, duration, args):
+    """
+    Records the duration of a traced stage in the `backtest_stage_seconds` histogram.
+    """
+    metrics.stage_seconds.observe(duration, stage=name)
@@ -0,0 +1,192 @@
+'''
+This module reads and changes the inputs declared in the source code of an EA (.mq4).
+
+The source is scanned once for every `input`, `sinput` and `extern` declaration, e.g.
+    input double Lots = 0.1; // Lot size
+and each declaration is indexed by its variable name and by its trailing comment, because the Inputs tab of the
+Strategy Tester shows the comment instead of the name when there is one. Comments and string literals are skipped, so
+commented-out declarations are ignored and defaults like "a;b" or C'255,0,0' are read whole. A statement which declares
+several inputs, e.g. `input int A = 1, B = 2;`, is split at its top-level commas into one declaration per input.
+
+All of the changes are applied in one rewrite of the source, and every new value is checked against the type of its input.
+'''
+
+import re
+from dataclasses import dataclass
+
+SCANNER = re.compile(r'''
+    (?P<skip>//[^\n]*|/\*.*?\*/|"(?:[^"\\\n]|\\.)*")
+    |^[ \t]*(?P<keyword>input|sinput|extern)[ \t]+(?:const[ \t]+)?(?P<type>[A-Za-z_]\w*)[ \t]+
+    (?P<body>(?:"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*'|[^;"'\n/]|/(?![/*]))+?)
+    [ \t]*;[ \t]*(?://[ \t]*(?P<comment>[^\r\n]*?))?[ \t]*\r?$
+''', re.MULTILINE | re.DOTALL | re.VERBOSE)
+DECLARATOR = re.compile(r'\s*(?P<name>[A-Za-z_]\w*)\s*(?:=\s*(?P<default>\S(?:.*\S)?))?\s*$', re.DOTALL)
+
+INTEGER_TYPES = {'char', 'uchar', 'short', 'ushort', 'int', 'uint', 'long', 'ulong'}
+FLOAT_TYPES = {'double', 'float'}
+INTEGER = re.compile(r'[+-]?(?:0[xX][0-9a-fA-F]+|\d+)')
+IDENTIFIER = re.compile(r'[A-Za-z_]\w*')
+LITERAL = re.compile(r"[CD]'[^'\n]*'")
+DATE = re.compile(r'\d{4}\.\d{1,2}\.\d{1,2}(?: \d{1,2}:\d{2}(?::\d{2})?)?')
+
+@dataclass(slots=True)
+class InputDeclaration:
+    keyword: str  # input, sinput or extern
+    type: str
+    name: str
+    default: str  # The default value as it is written, or None if there is none
+    comment: str  # The trailing comment, or None if there is none
+    start: int  # Span of the default value in the source. Both are the position after the name if there is no default
+    end: int
+
+def split_declarators(body):
+    """
+    Splits the declarators of a statement like `A = 1, B = "x,y"` at the commas which are not inside quotes or brackets.
+
+    Returns:
+        list of tuple: The (offset, text) of each declarator in `body`.
+    """
+    parts, start, depth, quote, escaped = [], 0, 0, None, False
+    for i, char in enumerate(body):
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == quote:
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char in '([{':
+            depth += 1
+        elif char in ')]}':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            parts.append((start, body[start:i]))
+            start = i + 1
+    parts.append((start, body[start:]))
+    return parts
+
+def format_value(input_type, value):
+    """
+    Returns `value` as a literal of the MQL4 type `input_type`, e.g. '"EURUSD"' for a string or 'true' for a bool of 1.
+
+    Raises:
+        ValueError: If `value` is not a valid value of the type.
+    """
+    text = str(value).strip()
+    if text == '' or '\n' in text:
+        raise ValueError(f"'{value}' is not a valid {input_type}")
+
+    if input_type == 'string':
+        if len(text) >= 2 and text[0] == text[-1] == '"':
+            return text
+        return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    if ';' in text:
+        raise ValueError(f"'{value}' is not a valid {input_type}")
+
+    if input_type in INTEGER_TYPES:
+        if not INTEGER.fullmatch(text):
+            try:
+                number = float(text)
+            except ValueError:
+                raise ValueError(f"'{value}' is not a valid {input_type}") from None
+            if not number.is_integer():
+                raise ValueError(f"'{value}' is not a valid {input_type}")
+            text = str(int(number))
+        if input_type.startswith('u') and text.startswith('-'):
+            raise ValueError(f"'{value}' is not a valid {input_type}")
+        return text
+    if input_type in FLOAT_TYPES:
+        try:
+            float(text)
+        except ValueError:
+            raise ValueError(f"'{value}' is not a valid {input_type}") from None
+        return text
+    if input_type == 'bool':
+        flag = {'true': 'true', 'false': 'false', '1': 'true', '0': 'false'}.get(text.lower())
+        if flag is None:
+            raise ValueError(f"'{value}' is not a valid bool")
+        return flag
+    if input_type == 'datetime':
+        if DATE.fullmatch(text):
+            return f"D'{text}'"
+        if LITERAL.fullmatch(text) or INTEGER.fullmatch(text):
+            return text
+        raise ValueError(f"'{value}' is not a valid datetime")
+    # color and enumerations: a literal, a number or a named constant like clrRed or PERIOD_H1
+    if LITERAL.fullmatch(text) or INTEGER.fullmatch(text) or IDENTIFIER.fullmatch(text):
+        return text
+    raise ValueError(f"'{value}' is not a valid {input_type}")
+
+class InputIndex:
+    '''The input declarations of the source code of an EA.'''
+
+    def __init__(self, code):
+        self.code = code
+        self.declarations = []
+        self.by_comment = {}
+        self.by_name = {}
+        for match in SCANNER.finditer(code):
+            if match.group('skip') is not None:
+                continue
+            declarators = [(offset, DECLARATOR.match(text)) for offset, text in split_declarators(match.group('body'))]
+            if not all(declarator for _, declarator in declarators):
+                continue  # Not a plain declaration, e.g. an array
+            comment = (match.group('comment') or '').strip() or None
+            if len(declarators) > 1:
+                comment = None  # The trailing comment of a statement only names its input if it declares one input
+            for offset, declarator in declarators:
+                position = match.start('body') + offset
+                default = declarator.group('default')
+                start, end = (declarator.span('default') if default is not None else (declarator.end('name'),) * 2)
+                declaration = InputDeclaration(match.group('keyword'), match.group('type'), declarator.group('name'),
+                                               default, comment, position + start, position + end)
+                self.declarations.append(declaration)
+                self.by_name.setdefault(declaration.name, declaration)
+                if declaration.comment:
+                    self.by_comment.setdefault(declaration.comment, declaration)
+
+    def find(self, name):
+        """
+        Returns the declaration of the input shown as `name` in the Strategy Tester (its comment, or else its variable
+        name), or None if there is none.
+        """
+        return self.by_comment.get(name) or self.by_name.get(name)
+
+    def rewrite(self, inputs):
+        """
+        Returns the source code with the values of `inputs`.
+
+        Args:
+            inputs (dict): Name of each input to change (as shown in the Strategy Tester) to its new value.
+
+        Returns:
+            tuple: The changed source code and a dict of the name of each input which was not changed to the reason.
+        """
+        changes, skipped = {}, {}
+        for name, value in inputs.items():
+            declaration = self.find(name)
+            if declaration is None:
+                skipped[name] = 'it is not declared as an input'
+                continue
+            try:
+                literal = format_value(declaration.type, value)
+            except ValueError as e:
+                skipped[name] = str(e)
+                continue
+            changes[declaration.start] = (declaration, literal if declaration.default is not None else f' = {literal}')
+
+        pieces, position = [], 0
+        for start in sorted(changes):
+            declaration, literal = changes[start]
+            pieces += [self.code[position:declaration.start], literal]
+            position = declaration.end
+        pieces.append(self.code[position:])
+        return ''.join(pieces), skipped
+
+def rewrite_inputs(code, inputs):
+    """
+    Changes the values of `inputs` in the source code of an EA (see `InputIndex.rewrite`).
+    """
+    return InputIndex(code).rewrite(inputs)
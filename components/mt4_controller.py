@@ -1,29 +1,49 @@
-from time import sleep
+from time import sleep, monotonic
 from datetime import datetime, timedelta
 from pywinauto import Application
 from pywinauto.keyboard import send_keys
 from pywinauto.mouse import click
 from pyperclip import copy, paste
 import re
-from psutil import process_iter, NoSuchProcess, AccessDenied, ZombieProcess
-from os import path, listdir
+from psutil import process_iter, Process, NoSuchProcess, AccessDenied, ZombieProcess
+from os import path, listdir, getenv, walk
 from components.logger import setup_logger
+from components.waits import AdaptiveWaiter
+from components.tester_journal import TesterJournal
+from components.abort_rules import TestMonitor
+from components.records import tester_date, parse_properties
+from components.mq4_inputs import rewrite_inputs
+from components.tester_controls import TesterControls
+from components.tracing import traced
+from util import read_text
 from pywinauto.timings import TimeoutError
 
 logger = setup_logger(__name__)
 
 TIMEOUT = 20
+JOURNAL_POLL_INTERVAL = 0.2  # Seconds between two reads of the tester journal while a test runs
+BUTTON_CHECK_INTERVAL = 5  # Seconds between two checks of the Stop button while the tester journal is followed
+MAX_TEST_DURATION = 6 * 60 * 60  # A test which runs longer than this is considered stuck
+REPORT_EXTENSION = '.htm'  # MT4 saves reports as .htm, whatever extension is typed in the Save As dialog
+COMPILE_FALLBACK_SECONDS = 1  # Wait for a compilation which cannot be watched, until compile latencies are recorded
 
 class MT4Controller:
-    def __init__(self, mt4_exe_path, me_exe_path, reports_folder_path):
+    def __init__(self, mt4_exe_path, me_exe_path, reports_folder_path, cancel_event=None):
         self.logger = logger
         self.mt4_exe_path = mt4_exe_path
         self.me_exe_path = me_exe_path
         self.reports_folder_path = reports_folder_path
         self.timeout = TIMEOUT
         self.app = None
+        self.applications = {}  # Cache of the normalised path of each executable to its (PID, connected Application)
         self.tradeview = None
         self.strategy_tester = None
+        self.controls = None  # Cached TesterControls of the Strategy Tester
+        self.data_folder_path = None
+        self.cancel_event = cancel_event  # threading.Event which is set to abort the current test immediately
+        self.waiter = AdaptiveWaiter(cancel_event=cancel_event)
+        self.ea_options = None  # Cache of the options of the Expert input (name to index)
+        self.ea_options_signature = None  # Signature of the Experts folder when `self.ea_options` was read
         self.SETTINGS_TAB = {'name': 'Settings', 'coords': (45, 992)}
         self.REPORT_TAB = {'name': 'Report', 'coords': (214, 992)}
 
@@ -75,6 +95,7 @@ class MT4Controller:
         
         return greatest_number
 
+    @traced
     def configure_expert_properties(self, ea_name, properties_string):
         """
         Configures the expert properties in the MetaTrader 4 Strategy Tester.
@@ -104,22 +125,13 @@ class MT4Controller:
             send_keys('^a^c')
 
             original_code = paste()
-            modified_code = original_code
-
-            for prop in properties_string.split(','):
-                name, value = prop.split('=')
-                name, value = name.strip(), value.strip()
-                changed_code = self.change_input_value(modified_code, name, value)
-                if changed_code:
-                    modified_code = changed_code
-                    self.logger.info(f"Setting property '{name}' to '{value}'")
-                else:
-                    self.logger.info(f"Value of property '{name}' failed to be modified. Skipping.")
+            modified_code = self.apply_properties(original_code, properties_string)
 
             copy(modified_code)
             send_keys('^v') # Paste the modified code back into the editor
+            compile_start = datetime.now().timestamp()
             send_keys('{F7}') # Compile
-            sleep(1)
+            self.wait_for_compilation(ea_name, compile_start)
             send_keys('^{F4}') # Close the mq4 file
             self.logger.info("Compiled file and closed it.")
             return True
@@ -127,62 +139,55 @@ class MT4Controller:
             self.logger.error(f"An error occurred while configuring expert properties: {e}")
             return False
 
-    def replace_value(self, original_text, new_value):
+    def wait_for_compilation(self, ea_name, compile_start):
         """
-        Replaces the value between '=' and ';' in `original_text` with `new_value`.
+        Waits until MetaEditor has written the .ex4 file of `ea_name` after `compile_start`.
 
         Args:
-            original_text (str): The original string containing the value to be replaced.
-            new_value (str): The new value to insert between '=' and ';'.
+            ea_name (str): The name of the expert advisor as shown in the Strategy Tester.
+            compile_start (float): The timestamp of when the compilation was started.
 
         Returns:
-            str: The modified string with the replaced value.
+            bool: True if the compiled file was written, False otherwise.
         """
-        try:
-            start_index = original_text.find('=') + 1
-            end_index = original_text.find(';')
-            
-            if start_index == 0 or end_index == -1:
-                raise ValueError("The input string does not contain '=' and/or ';'")
-            
-            modified_string = original_text[:start_index] + new_value + original_text[end_index:]
-            logger.info("Successfully replaced the value in the string.")
-            
-            return modified_string
-        except Exception as e:
-            logger.error(f"An error occurred in replace_value: {e}")
-            return None
+        experts_folder = self.experts_folder()
+        if not experts_folder:  # The compiled file can't be watched, so wait as long as compiling usually takes
+            return not self.waiter.pause(self.waiter.latency_for('compile', COMPILE_FALLBACK_SECONDS))
+
+        ex4_path = path.join(experts_folder, re.sub(r'\.ex4$', '', ea_name.strip()) + '.ex4')
+        return self.waiter.wait_until('compile', lambda: path.getmtime(ex4_path) >= compile_start, self.timeout)
 
-    def change_input_value(self, text, prop, value):
+    def apply_properties(self, code, properties):
         """
-        Finds and replaces the value of a specific property in the given text.
+        Changes the values of the inputs listed in `properties` in the source code of an EA, in one pass over the code.
 
         Args:
-            text (str): The text to look for the property.
-            prop (str): The property name to search for.
-            value (str): The new value to replace the old value.
+            code (str): The source code of the EA.
+            properties (str or dict): The properties in the format 'name=value, name=value,...', or a dict of name to value.
 
         Returns:
-            str: The modified text with the replaced value, or None if the property is not found.
+            str: The modified source code. Properties which could not be changed are skipped.
         """
-        try:
-            pattern = rf'^(input.*?;\s*//\s*{re.escape(prop)}\s*)$'
-            line = re.findall(pattern, text, re.MULTILINE)
-            
-            if not line:
-                logger.warning(f"Property '{prop}' not found in the text.")
-                return None
-            
-            repl_val = self.replace_value(line[0], value) 
-            if repl_val is None:
-                return None
-            result = re.sub(pattern, repl_val, text, flags=re.MULTILINE)
-            logger.info(f"Successfully replaced the value for property '{prop}'.")
-            
-            return result
-        except Exception as e:
-            logger.error(f"An error occurred in change_input_value: {e}")
-            return None
+        inputs = parse_properties(properties) if isinstance(properties, str) else properties
+        modified_code, skipped = rewrite_inputs(code, inputs)
+        for name, value in inputs.items():
+            if name in skipped:
+                self.logger.info(f"Value of property '{name}' failed to be modified ({skipped[name]}). Skipping.")
+            else:
+                self.logger.info(f"Setting property '{name}' to '{value}'")
+        return modified_code
+
+    def report_name(self, ea_name, count):
+        """
+        Returns the file name, without extension, under which the report of the `count`th test of `ea_name` is saved.
+        """
+        return f"{self.ea_base_name(ea_name)}{count}"
+
+    def report_path(self, ea_name, count):
+        """
+        Returns the path of the report file of the `count`th test of `ea_name` in the reports folder.
+        """
+        return path.join(self.reports_folder_path, self.report_name(ea_name, count) + REPORT_EXTENSION)
 
     def ea_base_name(self, ea_name):
         """
@@ -202,6 +207,46 @@ class MT4Controller:
             logger.error(f"Error converting string '{ea_name}': {e}")
             return None
 
+    def data_folder(self):
+        """
+        Finds the MT4 data folder. This is the installation folder when MT4 runs in portable mode, otherwise it is the
+        folder under %APPDATA%\\MetaQuotes\\Terminal whose origin.txt points to the installation folder.
+
+        Returns:
+            str: The path of the data folder, or None if it could not be found.
+        """
+        if self.data_folder_path:
+            return self.data_folder_path
+
+        try:
+            install_folder = path.dirname(self.mt4_exe_path)
+            if path.isdir(path.join(install_folder, 'MQL4')):  # Portable mode
+                self.data_folder_path = install_folder
+                return self.data_folder_path
+
+            terminals_folder = path.join(getenv('APPDATA', ''), 'MetaQuotes', 'Terminal')
+            for folder in listdir(terminals_folder):
+                origin_file = path.join(terminals_folder, folder, 'origin.txt')
+                if not path.isfile(origin_file):
+                    continue
+                origin, _ = read_text(origin_file)
+                if path.normcase(path.normpath(origin.strip())) == path.normcase(path.normpath(install_folder)):
+                    self.data_folder_path = path.join(terminals_folder, folder)
+                    self.logger.info(f"Found the MT4 data folder: {self.data_folder_path}")
+                    return self.data_folder_path
+
+            self.logger.warning(f"No MT4 data folder found for {self.mt4_exe_path}")
+        except Exception as e:
+            self.logger.error(f"An error occurred while looking for the MT4 data folder: {e}")
+        return None
+
+    def experts_folder(self):
+        """
+        Returns the path of the MQL4\\Experts folder, or None if the MT4 data folder could not be found.
+        """
+        data_folder = self.data_folder()
+        return path.join(data_folder, 'MQL4', 'Experts') if data_folder else None
+
     def is_application_running(self, exe_path):
         """
         Checks if an application is already running.
@@ -213,6 +258,10 @@ class MT4Controller:
             int: The process ID (PID) of the running application, or None if not running.
         """
         self.logger.info("Checking if the application is already running.")
+        cached = self.applications.get(self.exe_key(exe_path))
+        if cached and self.is_process_alive(cached[0], exe_path):
+            return cached[0]
+
         for proc in process_iter(['pid', 'name', 'exe']):
             try:
                 if proc.info['exe'] and path.normpath(proc.info['exe']) == path.normpath(exe_path):
@@ -224,6 +273,25 @@ class MT4Controller:
         self.logger.info("Application is not running.")
         return None
 
+    def exe_key(self, exe_path):
+        """
+        Returns the key of `exe_path` in `self.applications`.
+        """
+        return path.normcase(path.normpath(exe_path))
+
+    def is_process_alive(self, pid, exe_path):
+        """
+        Checks if the process with `pid` is still running `exe_path` (the PID may have been reused by another process).
+
+        Returns:
+            bool: True if the process is alive, False otherwise.
+        """
+        try:
+            proc = Process(pid)
+            return proc.is_running() and self.exe_key(proc.exe()) == self.exe_key(exe_path)
+        except (NoSuchProcess, AccessDenied, ZombieProcess):
+            return False
+
     def access_application(self, exe_path, timeout):
         """
         Starts the application or connects to it if it's already running.
@@ -237,6 +305,13 @@ class MT4Controller:
         """
         try:
             self.logger.info(f"Attempting to access application at path: {exe_path}")
+            key = self.exe_key(exe_path)
+            cached = self.applications.get(key)
+            if cached and self.is_process_alive(cached[0], exe_path):  # Reuse the connection made earlier
+                self.app = cached[1]
+                return self.app
+
+            self.applications.pop(key, None)
             pid = self.is_application_running(exe_path)
 
             if pid == False:
@@ -247,7 +322,8 @@ class MT4Controller:
             else:
                 logger.info(f"Starting the application from path: {exe_path}.")
                 self.app = Application(backend="win32").start(exe_path, timeout=timeout)
-            
+
+            self.applications[key] = (self.app.process, self.app)
             return self.app
         except Exception as e:
             logger.error(f"Exception occurred while accessing the application: {e}")
@@ -301,15 +377,11 @@ class MT4Controller:
         """
         self.logger.info("Checking if the Visual Mode is visible...")
         try:
-            buttons = self.strategy_tester.children(class_name="Button")
-            for btn in buttons:
-                if btn.window_text() == 'Visual mode':
-                    if btn.is_visible():
-                        self.logger.info("Visual mode is already visible.")
-                        return True
-                    else:
-                        return False
-            
+            btn = self.tester_controls('visual_mode').visual_mode
+            if btn is not None and btn.is_visible():
+                self.logger.info("Visual mode is already visible.")
+                return True
+            return False
         except Exception as e:
             self.logger.error(f"Exception occurred while checking the Visual Mode: {e}")
             return False
@@ -323,6 +395,7 @@ class MT4Controller:
         """
         pass
 
+    @traced
     def is_strategy_tester_open(self, timeout):
         """
         Checks if the Strategy Tester is open.
@@ -337,12 +410,30 @@ class MT4Controller:
         try:
             self.strategy_tester = self.tradeview.child_window(title="Tester")
             self.strategy_tester.wait('exists visible', timeout=timeout)
+            if self.controls is not None and self.controls.is_stale(self.strategy_tester.handle):
+                self.controls = None  # The Strategy Tester window was recreated
             self.logger.info("Strategy Tester is open.")
             return True
         except Exception as e:
             self.logger.error(f"Exception occurred while checking the Strategy Tester: {e}")
             return False
 
+    def tester_controls(self, required=None):
+        """
+        Returns the controls of the Strategy Tester. They are resolved once and only resolved again when they are stale
+        or when the `required` control was not found the last time.
+
+        Args:
+            required (str): The name of a TesterControls field which is about to be used.
+
+        Returns:
+            TesterControls: The controls of the Strategy Tester.
+        """
+        if self.controls is None or self.controls.is_stale() or (required and getattr(self.controls, required) is None):
+            self.controls = TesterControls.resolve(self.strategy_tester.wrapper_object())
+        return self.controls
+
+    @traced
     def tester_switch_tab(self, tab):
         """
         Switches to the specified tab in the Strategy Tester.
@@ -358,13 +449,42 @@ class MT4Controller:
             if not self.tradeview.is_maximized():
                 self.tradeview.maximize()  # MT4 needs to be maximized because the mouse coordinates for the tabs will work only when MT4 is maximized
             click(coords=tab['coords'])
+            settings_tab = tab['name'] == self.SETTINGS_TAB['name']
+            # The Start/Stop button is visible only on the Settings tab
+            if not self.waiter.wait_until(f"switch_to_{tab['name']}", lambda: self.is_start_button_visible() == settings_tab, self.timeout):
+                self.logger.error(f"The {tab['name']} tab did not appear after clicking on it.")
+                return False
             self.logger.info(f"Successfully switched to tab: {tab['name']}")
-            sleep(1)
             return True
         except Exception as e:
             self.logger.error(f"Exception occurred while switching to {tab['name']} tab: {e}")
             return False
 
+    def is_test_running(self):
+        """
+        Returns True if the Stop button of the Strategy Tester is visible, which means that a test is running.
+        """
+        try:
+            stop_button = self.strategy_tester.child_window(class_name="Button", title="Stop")
+            return stop_button.exists(timeout=0) and stop_button.is_visible()
+        except Exception:
+            return False
+
+    def tester_journal(self):
+        """
+        Returns a TesterJournal for the tester logs of this terminal, or None if the MT4 data folder could not be found.
+        """
+        data_folder = self.data_folder()
+        return TesterJournal(data_folder) if data_folder else None
+
+    def is_start_button_visible(self):
+        """
+        Returns True if the Start (or Stop) button of the Strategy Tester is visible, False otherwise.
+        """
+        button = self.tester_controls('start').start
+        return button is not None and button.is_visible()
+
+    @traced
     def select_expert_advisor(self):
         """
         Ensures that 'Expert Advisor' is selected in the Strategy Tester.
@@ -387,6 +507,36 @@ class MT4Controller:
             self.logger.error(f"Exception occurred while selecting Expert Advisor: {e}")
             return False
 
+    def experts_folder_signature(self):
+        """
+        Returns a value which changes whenever an EA is added to or removed from the Experts folder (the modification
+        times of its subfolders), or None if the folder could not be found.
+        """
+        experts_folder = self.experts_folder()
+        if not experts_folder:
+            return None
+        return tuple((dirpath, path.getmtime(dirpath)) for dirpath, _, _ in walk(experts_folder))
+
+    def ea_index(self, combo, refresh=False):
+        """
+        Returns a dictionary of the name of every EA in the Expert input of the Strategy Tester to its index.
+        The options of the input are read only when the Experts folder has changed since they were last read, or if `refresh` is True.
+
+        Args:
+            combo (ComboBoxWrapper): The Expert input.
+            refresh (bool): Whether to read the options again even if the Experts folder looks unchanged.
+
+        Returns:
+            dict: The name of each EA to its index in the input.
+        """
+        signature = self.experts_folder_signature()
+        if refresh or self.ea_options is None or signature is None or signature != self.ea_options_signature:
+            self.ea_options = {name: i for i, name in enumerate(combo.item_texts())}
+            self.ea_options_signature = signature
+            self.logger.info(f"Read {len(self.ea_options)} EAs from the Expert input")
+        return self.ea_options
+
+    @traced
     def choose_EA(self, ea_name):
         """
         Selects the specified expert advisor (EA) in the Strategy Tester.
@@ -399,56 +549,37 @@ class MT4Controller:
         """
         try:
             self.logger.info("Searching for the Expert input in the Strategy Tester")
-            sleep(2)  # give the Strategy Tester time to load
-            combo_boxes = self.strategy_tester.children(class_name="ComboBox")
-            ea_box_found = False
-
-            for combo in combo_boxes:
-                title = combo.window_text()
-                if "ex4" in title:
-                    combo.click_input()
-                    ea_box_found = True
-                    i = 0
-                    prev_option = ''
-                    current_option = combo.window_text()
-
-                    self.logger.info(f"Navigating through options to find '{ea_name}'")
-                    while i in range(50):
-                        if ea_name == current_option:  # if the EA is found
-                            logger.info(f"Found '{ea_name}' in the options.")
-                            return True
-                        
-                        send_keys('{DOWN}')
-                        sleep(0.1)
-                        prev_option = current_option
-                        current_option = combo.window_text()
-                        if prev_option == current_option:  # if the limit of the EAs has been reached 
-                            break
-
-                        i += 1
-                    
-                    # Use UP key to navigate through the dropdown options
-                    i = 0
-                    while i in range(50):
-                        if ea_name == current_option:  # if the EA is found
-                            logger.info(f"Found '{ea_name}' in the options.")
-                            return True
-                        
-                        send_keys('{UP}')
-                        sleep(0.1)
-                        prev_option = current_option
-                        current_option = combo.window_text()
-                        if prev_option == current_option:  # if the limit of the EAs has been reached 
-                            return False
-
-                        i += 1
-            if not ea_box_found:
+            # Wait for the Strategy Tester to load the Expert input
+            if not self.waiter.wait_until('load_expert_input', lambda: self.tester_controls('expert_combo').expert_combo, self.timeout):
                 self.logger.warning("No combo box with 'ex4' or 'ex5' found.")
                 return False
+            combo = self.controls.expert_combo
+
+            if combo.window_text() == ea_name:
+                self.logger.info(f"'{ea_name}' has already been selected.")
+                return True
+
+            index = self.ea_index(combo).get(ea_name)
+            if index is None:  # The EA may have been added while MT4 was running
+                index = self.ea_index(combo, refresh=True).get(ea_name)
+            if index is None:
+                self.logger.error(f"'{ea_name}' is not one of the options of the Expert input.")
+                return False
+
+            combo.select(index)
+            if combo.window_text() != ea_name:  # The options changed order since they were read
+                index = self.ea_index(combo, refresh=True).get(ea_name)
+                if index is None:
+                    return False
+                combo.select(index)
+
+            logger.info(f"Found and selected '{ea_name}' in the options.")
+            return combo.window_text() == ea_name
         except Exception as e:
             self.logger.error(f"Exception occurred while selecting the combo box: {e}")
             return False
 
+    @traced
     def choose_symbol(self, symbol):
         """
         Selects the specified symbol in the Strategy Tester.
@@ -461,28 +592,30 @@ class MT4Controller:
         """
         try:
             self.logger.info("Searching for the Symbol input in the Strategy Tester")
-            combo_boxes = self.strategy_tester.children(class_name="ComboBox")
-            for combo in combo_boxes:
-                title = combo.window_text()
-                if "vs" in title or 'NOKSEK' in title:
-                    self.logger.info(f'Found symbol input: {combo}')
-                    if symbol in title:
-                        self.logger.info(f'{symbol} has already been selected.')
-                        return True
-                    else:
-                        combo.click()
-                        for i, full_symbol in enumerate(combo.item_texts()):
-                            if symbol in full_symbol:
-                                combo.select(i)
-                                combo.set_keyboard_focus()
-                                send_keys('{ENTER}')
-                                self.logger.info(f'Found and selected {symbol} in the dropdown.')
-                                return True
+            combo = self.tester_controls('symbol_combo').symbol_combo
+            if combo is None:
+                return False
+
+            title = combo.window_text()
+            self.logger.info(f'Found symbol input: {combo}')
+            if symbol in title:
+                self.logger.info(f'{symbol} has already been selected.')
+                return True
+
+            combo.click()
+            for i, full_symbol in enumerate(combo.item_texts()):
+                if symbol in full_symbol:
+                    combo.select(i)
+                    combo.set_keyboard_focus()
+                    send_keys('{ENTER}')
+                    self.logger.info(f'Found and selected {symbol} in the dropdown.')
+                    return True
             return False
         except Exception as e:
             self.logger.error(f'Error has occurred when choosing the symbol: {e}')
             return False
 
+    @traced
     def choose_period(self, period):
         """
         Selects the specified period in the Strategy Tester.
@@ -495,29 +628,30 @@ class MT4Controller:
         """
         try:
             self.logger.info("Searching for the Period input in the Strategy Tester")
-            combo_boxes = self.strategy_tester.children(class_name="ComboBox")
-            for combo in combo_boxes:
-                title = combo.window_text()
-                if "M1" in title or 'M5' in title or 'M15' in title or 'M30' in title or 'H1' in title or 'H4' in title or 'Daily' in title:
-                    self.logger.info(f'Found Period input: {combo}')
-                    if period in title:
-                        self.logger.info(f'{period} has already been selected.')
-                        return True
-                    else:
-                        combo.click()
-                        for i, option in enumerate(combo.item_texts()):
-                            if period in option:
-                                combo.select(i)
-                                combo.set_keyboard_focus()
-                                send_keys('{ENTER}')
-                                self.logger.info(f'Found and selected {period} in the dropdown.')
-                                return True
-            
+            combo = self.tester_controls('period_combo').period_combo
+            if combo is None:
+                return False
+
+            title = combo.window_text()
+            self.logger.info(f'Found Period input: {combo}')
+            if period in title:
+                self.logger.info(f'{period} has already been selected.')
+                return True
+
+            combo.click()
+            for i, option in enumerate(combo.item_texts()):
+                if period in option:
+                    combo.select(i)
+                    combo.set_keyboard_focus()
+                    send_keys('{ENTER}')
+                    self.logger.info(f'Found and selected {period} in the dropdown.')
+                    return True
             return False
         except Exception as e:
             self.logger.error(f'Error has occurred when choosing the period: {e}')
             return False
 
+    @traced
     def choose_modelling(self, model):
         """
         Selects the specified modeling type in the Strategy Tester.
@@ -530,28 +664,30 @@ class MT4Controller:
         """
         try:
             self.logger.info("Searching for the Model input in the Strategy Tester")
-            combo_boxes = self.strategy_tester.children(class_name="ComboBox")
-            for combo in combo_boxes:
-                title = combo.window_text()
-                if "Every tick" in title or 'Control points' in title or 'Open prices' in title:
-                    self.logger.info(f'Found Model input: {combo}')
-                    if model in title:
-                        self.logger.info(f'{model} has already been selected.')
-                        return True
-                    else:
-                        combo.click()
-                        for i, option in enumerate(combo.item_texts()):
-                            if model in option:
-                                combo.select(i)
-                                combo.set_keyboard_focus()
-                                send_keys('{ENTER}')
-                                self.logger.info(f'Found and selected {model} in the dropdown.')
-                                return True
+            combo = self.tester_controls('model_combo').model_combo
+            if combo is None:
+                return False
+
+            title = combo.window_text()
+            self.logger.info(f'Found Model input: {combo}')
+            if model in title:
+                self.logger.info(f'{model} has already been selected.')
+                return True
+
+            combo.click()
+            for i, option in enumerate(combo.item_texts()):
+                if model in option:
+                    combo.select(i)
+                    combo.set_keyboard_focus()
+                    send_keys('{ENTER}')
+                    self.logger.info(f'Found and selected {model} in the dropdown.')
+                    return True
             return False
         except Exception as e:
             self.logger.error(f'Error has occurred when choosing the model: {e}')
             return False
 
+    @traced
     def configure_visual_mode(self):
         """
         Configures the Visual mode in the Strategy Tester by unchecking it.
@@ -561,18 +697,18 @@ class MT4Controller:
         """
         try:
             self.logger.info("Searching for the Visual mode button in the Strategy Tester")
-            buttons = self.strategy_tester.children(class_name="Button")
-            for btn in buttons:
-                if btn.window_text() == 'Visual mode':
-                    btn.uncheck()
-                    self.logger.info("Visual mode unchecked.")
-                    return True
-            
-            return False
+            btn = self.tester_controls('visual_mode').visual_mode
+            if btn is None:
+                return False
+
+            btn.uncheck()
+            self.logger.info("Visual mode unchecked.")
+            return True
         except Exception as e:
             self.logger.error(f'Error has occurred when unchecking Visual mode: {e}')
             return False
 
+    @traced
     def configure_dates(self, from_date, to_date):
         """
         Configures the date range in the Strategy Tester.
@@ -590,23 +726,21 @@ class MT4Controller:
                 return True
 
             self.logger.info("Searching for the Use date button in the Strategy Tester...")
-            buttons = self.strategy_tester.children(class_name="Button")
-            for btn in buttons:
-                if btn.window_text() == 'Use date':
-                    btn.check()
-                    self.logger.info("Use date checked.")
-                    break
+            controls = self.tester_controls('use_date')
+            if controls.use_date is not None:
+                controls.use_date.check()
+                self.logger.info("Use date checked.")
 
             self.logger.info("Searching for the dates in the Strategy Tester...")
-            dates = self.strategy_tester.children(class_name="SysDateTimePick32")
+            controls = self.tester_controls('to_date')
 
             if from_date is not None:
                 _from = datetime.strptime(from_date, '%Y.%m.%d')
-                dates[0].set_time(year=_from.year, month=_from.month, day=_from.day)
+                controls.from_date.set_time(year=_from.year, month=_from.month, day=_from.day)
 
             if to_date is not None:
                 to = datetime.strptime(to_date, '%Y.%m.%d')
-                dates[1].set_time(year=to.year, month=to.month, day=to.day)
+                controls.to_date.set_time(year=to.year, month=to.month, day=to.day)
 
             self.logger.info("Dates configured successfully.")
             return True
@@ -614,6 +748,7 @@ class MT4Controller:
             self.logger.error(f'Error has occurred when configuring the dates: {e}')
             return False
 
+    @traced
     def start_strategy_tester(self):
         """
         Starts the Strategy Tester by clicking the Start button.
@@ -623,17 +758,46 @@ class MT4Controller:
         """
         try:
             self.logger.info("Searching for the Start button in the Strategy Tester...")
-            buttons = self.strategy_tester.children(class_name="Button")
-            for btn in buttons:
-                if btn.window_text() == 'Start':
-                    btn.click()
-                    self.logger.info("Clicked on 'Start' button")
-                    return True
-            return False
+            btn = self.tester_controls('start').start
+            if btn is None or btn.window_text() != 'Start':
+                return False
+
+            btn.click()
+            self.logger.info("Clicked on 'Start' button")
+            return True
         except Exception as e:
             self.logger.error(f"An error occurred while starting the Strategy Tester: {e}")
             return False
 
+    def is_cancelled(self):
+        """
+        Returns True if the current test should be aborted immediately.
+        """
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    @traced
+    def stop_strategy_tester(self):
+        """
+        Stops a running test by clicking the Stop button of the Strategy Tester.
+
+        Returns:
+            bool: True if no test is running anymore, False otherwise.
+        """
+        try:
+            stop_button = self.strategy_tester.child_window(class_name="Button", title="Stop")
+            if stop_button.exists(timeout=0):
+                stop_button.click()
+                self.logger.info("Clicked on 'Stop' button")
+            # Not through the waiter, because its waits are cancelled at this point
+            deadline = monotonic() + 1
+            while self.is_test_running() and monotonic() < deadline:
+                sleep(0.05)
+            return not self.is_test_running()
+        except Exception as e:
+            self.logger.error(f"An error occurred while stopping the Strategy Tester: {e}")
+            return False
+
+    @traced
     def setup_MT4(self):
         """
         Opens MT4 or connects to it if it is already open and maximizes it.
@@ -649,8 +813,8 @@ class MT4Controller:
 
             if not self.tradeview.is_maximized():
                 self.tradeview.maximize()
+                self.waiter.wait_until('maximize', self.tradeview.is_maximized, self.timeout)
                 self.logger.info("Tradeview window maximized.")
-                sleep(1)
             return True
         except Exception as e:
             self.logger.error(f"An error occurred while setting up the MetaTrader 4 application: {e}")
@@ -661,13 +825,17 @@ class StrategyTester:
     def __init__(self, mt4):
         self.mt4 = mt4
         self.logger = setup_logger(__name__)
+        self.journal_errors = []  # Errors printed in the tester journal during the last test
+        self.cancelled = False  # Whether the last test was aborted through `mt4.cancel_event`
+        self.aborted = None  # Why the last test was stopped early by its abort rules, with its partial statistics
 
+    @traced
     def configure_tester(self, settings):
         """
         Configures the MetaTrader 4 Strategy Tester with the given settings.
 
         Args:
-            settings (dict): A dictionary containing the settings for the Strategy Tester.
+            settings (TestJob): The test to configure. Its values which are not set are left as they are.
 
         Returns:
             bool: True if the configuration was successful, False otherwise.
@@ -679,7 +847,8 @@ class StrategyTester:
             if tester_open == False:  # Check if the Strategy Tester is open. Open it if it's not
                 self.logger.info("Strategy Tester is not open. Trying to open it.")
                 self.mt4.tradeview.send_keystrokes('^r')  # Press Ctrl+R to open the Strategy Tester
-                sleep(2.5)  # Give the Strategy Tester time to open
+                tester_window = self.mt4.tradeview.child_window(title="Tester")
+                self.mt4.waiter.wait_until('open_tester', lambda: tester_window.exists(timeout=0) and tester_window.is_visible(), self.mt4.timeout)
                 tester_open = self.mt4.is_strategy_tester_open(3)
                 if not tester_open:
                     self.logger.error("Failed to open the Strategy Tester. Exiting.")
@@ -693,41 +862,43 @@ class StrategyTester:
                 self.logger.error(f"Failed to select Expert Advisor in Strategy Tester. Continuing.")
                 return False
 
-            ea_name = settings['Expert'].strip()
+            variant = settings.variant  # Name of the prebuilt EA variant which already has the Expert properties
+            ea_name = variant or settings.expert
             if not self.mt4.choose_EA(ea_name):  # Select the EA
                 self.logger.error(f"Failed to select EA '{ea_name}'. Continuing.")
                 return False
 
-            # Configure Expert properties
-            if not self.mt4.configure_expert_properties(settings['Expert'], settings['Expert properties']):
-                self.logger.error(f"Failed to configure properties for EA '{ea_name}'. Continuing.")
-                return False
+            if not variant:
+                # Configure Expert properties
+                if not self.mt4.configure_expert_properties(settings.expert, settings.properties):
+                    self.logger.error(f"Failed to configure properties for EA '{ea_name}'. Continuing.")
+                    return False
 
-            self.mt4.access_application(self.mt4.mt4_exe_path, self.mt4.timeout)
-            if self.mt4.wait_for_window(title_re=".*Tradeview.*", total_timeout=10) is None:
-                self.logger.error("Failed to re-focus the Tradeview window after configuring properties.")
-                return False
+                self.mt4.access_application(self.mt4.mt4_exe_path, self.mt4.timeout)
+                if self.mt4.wait_for_window(title_re=".*Tradeview.*", total_timeout=10) is None:
+                    self.logger.error("Failed to re-focus the Tradeview window after configuring properties.")
+                    return False
 
-            symbol = settings['Symbol'].strip()
-            if not self.mt4.choose_symbol(symbol):  # Select the symbol
+            symbol = settings.symbol
+            if symbol and not self.mt4.choose_symbol(symbol):  # Select the symbol
                 self.logger.error(f"Failed to select symbol '{symbol}'. Continuing.")
                 return False
 
-            period = settings['Period'].strip()
-            if not self.mt4.choose_period(period):  # Select the period
-                self.logger.error(f"Failed to select period '{period}'. Continuing.")
+            period = settings.period
+            if period and not self.mt4.choose_period(period.label):  # Select the period
+                self.logger.error(f"Failed to select period '{period.label}'. Continuing.")
                 return False
 
-            model = settings['Model'].strip()
-            if not self.mt4.choose_modelling(model):  # Select the model
-                self.logger.error(f"Failed to select model '{model}'. Continuing.")
+            model = settings.model
+            if model and not self.mt4.choose_modelling(model.label):  # Select the model
+                self.logger.error(f"Failed to select model '{model.label}'. Continuing.")
                 return False
 
             if not self.mt4.configure_visual_mode():  # Configure Visual mode
                 self.logger.error(f"Failed to uncheck Visual mode. Continuing.")
                 return False
 
-            if not self.mt4.configure_dates(settings['From'], settings['To']):  # Configure the dates
+            if not self.mt4.configure_dates(tester_date(settings.from_date), tester_date(settings.to_date)):  # Configure the dates
                 self.logger.error(f"Failed to configure the dates. Continuing.")
                 return False
 
@@ -737,33 +908,83 @@ class StrategyTester:
             self.logger.error(f"Exception occurred while configuring the Strategy Tester: {e}")
             return False
 
-    def run_test(self):
+    @traced
+    def run_test(self, rules=None):
         """
-        Starts a back test and waits until it stops.
+        Starts a back test and waits until it stops. If `mt4.cancel_event` is set in the meantime, the test is stopped
+        with the Stop button and `self.cancelled` is set. If the test breaks one of `rules`, it is stopped too and
+        `self.aborted` describes why. Its report then has the statistics up to that point.
+
+        Args:
+            rules (abort_rules.AbortRules): The rules which end the test early. They are checked in the tester journal.
 
         Returns:
             bool: True if the test was successfully started and finished, False otherwise.
         """
         try:
+            self.journal_errors = []
+            self.cancelled = False
+            self.aborted = None
+            journal = self.mt4.tester_journal()
+            if journal and not journal.start():
+                journal = None
+            monitor = TestMonitor(rules) if rules and journal else None
+            if rules and not journal:
+                self.logger.warning("The abort rules can't be checked because the tester journal was not found.")
+            # The Stop button is only a fallback when the journal is followed, otherwise it is checked on every poll
+            button_check_interval = BUTTON_CHECK_INTERVAL if journal else JOURNAL_POLL_INTERVAL
+
             if not self.mt4.start_strategy_tester():  # Start the Strategy Tester
                 self.logger.error(f"Failed to start the Strategy Tester. Continuing.")
                 return False
 
-            # Loop will run as long as the "Stop" button is visible, indicating the test is running
+            start_time = last_button_check = monotonic()
             while True:
-                try:
-                    self.mt4.strategy_tester.child_window(class_name="Button", title="Stop").wait("exists visible", 1)
-                except Exception as e:
-                    self.logger.info("Stop button is no longer present, assuming the test has finished.")
+                if self.mt4.waiter.pause(JOURNAL_POLL_INTERVAL):
+                    self.logger.info("Cancelling the running test.")
+                    self.mt4.stop_strategy_tester()
+                    self.cancelled = True
+                    return False
+                if journal and journal.poll(monitor):
                     break
-            
-            # As soon as the while loop exits, the test has finished because the "Stop" button is not visible anymore
+                if monitor and monitor.violation:
+                    self.aborted = monitor.summary()
+                    self.logger.info(f"Stopping the test early: {self.aborted}")
+                    self.mt4.stop_strategy_tester()
+                    break
+
+                if monotonic() - last_button_check >= button_check_interval:
+                    last_button_check = monotonic()
+                    if not self.mt4.is_test_running():
+                        self.logger.info("Stop button is no longer present, assuming the test has finished.")
+                        break
+
+                if monotonic() - start_time > MAX_TEST_DURATION:
+                    self.logger.error(f"The test did not finish within {MAX_TEST_DURATION} seconds. Giving up on it.")
+                    return False
+
+            if journal:
+                self.journal_errors = journal.errors
+                if self.journal_errors:
+                    self.logger.warning(self.journal_error_summary())
+                # The journal reports the end slightly before the tester is ready to show the report
+                self.mt4.waiter.wait_until('test_teardown', lambda: not self.mt4.is_test_running(), self.mt4.timeout)
+
             self.logger.info("Test has finished.")
             return True
         except Exception as e:
             self.logger.error(f"Exception occurred while waiting for the Strategy Tester to start: {e}")
             return False
         
+    def journal_error_summary(self):
+        """
+        Returns a message about the errors the EA printed in the tester journal during the last test, or None if there were none.
+        """
+        if not self.journal_errors:
+            return None
+        return f"The EA printed {len(self.journal_errors)} errors in the tester journal, e.g. '{self.journal_errors[0]}'"
+
+    @traced
     def download_report(self, ea_name, count):
         """
         Navigates to the Report tab and saves the generated back test report as an HTML file in a folder.
@@ -776,6 +997,10 @@ class StrategyTester:
             bool: True if the report was successfully saved, False otherwise.
         """
         try:
+            if self.mt4.is_cancelled():
+                self.logger.info("Not saving the report because the run was cancelled.")
+                return False
+
             if not self.mt4.tester_switch_tab(self.mt4.REPORT_TAB):  # Switch to Report tab
                 self.logger.error(f"Failed to switch to Report tab in the Strategy Tester. Exiting")
             
@@ -793,6 +1018,10 @@ class StrategyTester:
             new_app = Application(backend="win32").connect(title="Save As")
             save_as_dialog = new_app.window(title="Save As")
             save_as_dialog.wait("exists visible", timeout=5)
+            if self.mt4.is_cancelled():
+                save_as_dialog.close()
+                self.logger.info("Closed the Save As dialog because the run was cancelled.")
+                return False
             
             address_bar = save_as_dialog.child_window(title_re=r"Address:.+", class_name='ToolbarWindow32')
             if address_bar.window_text().replace('Address: ', '') != self.mt4.reports_folder_path:  # If a different directory is chosen
@@ -805,8 +1034,8 @@ class StrategyTester:
             save_as_dialog.wrapper_object().set_focus() 
             send_keys('%n')  # Alt+N to select the File name input box
             send_keys('{BACKSPACE}')
-            file_name = self.mt4.ea_base_name(ea_name)
-            send_keys(file_name+str(count), with_spaces=True, pause=0.01)  # Add a number to the file name to make it unique
+            file_name = self.mt4.report_name(ea_name, count)  # The number makes the file name unique
+            send_keys(file_name, with_spaces=True, pause=0.01)
             send_keys('{ENTER}')
 
             self.logger.info(f"{file_name} Report saved successfully in {self.mt4.reports_folder_path}")
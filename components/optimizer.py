@@ -0,0 +1,425 @@
+'''
+This module searches the inputs of an EA for the best results without testing every combination.
+
+A row of the Settings file becomes a search space when some of its Expert properties are sweeps:
+- name=[start:stop:step] tests the numbers from start to stop (inclusive) in steps of step, e.g. TakeProfit=[10:200:10],
+- name=[a|b|c] tests each of the listed values, e.g. Mode=[1|2|3] or UseTrailing=[true|false].
+Without an optimizer, such a row is expanded into every combination (`expand_grid`). With an optimizer, an `Optimizer`
+proposes batches of input sets based on the results which were already ingested in Back Test Data, until the budget of
+tests is used up or the best result stops improving. The methods are:
+- 'genetic': the next batch is bred from the best results by crossover and mutation,
+- 'bayesian': a Gaussian process models the results and the batch maximizes the expected improvement.
+'''
+
+import itertools
+import math
+import re
+import numpy as np
+from components.logger import setup_logger
+from components.ea_compiler import is_variant_of
+
+logger = setup_logger(__name__)
+
+SWEEP = re.compile(r'^\[(.*)\]$')
+METHODS = ('genetic', 'bayesian')
+BATCH_SIZE = 8
+BUDGET = 64  # Tests proposed per search space
+PATIENCE = 3  # Batches without improvement after which a search has converged
+TOLERANCE = 1e-3  # Relative improvement of the best score which counts as an improvement
+MAX_ENUMERATED = 50000  # Larger search spaces are sampled instead of enumerated by the Bayesian search
+SAMPLED_CANDIDATES = 20000
+LENGTH_SCALES = (0.05, 0.1, 0.2, 0.4, 0.8)  # Candidate length scales of the Gaussian process, in normalized units
+NOISE = 1e-3
+
+class Parameter:
+    '''An input of the EA and the values which can be tested.'''
+
+    def __init__(self, name, values):
+        self.name = name
+        self.values = values  # The values as they are written in the Expert properties
+        self.numbers = np.array([float(value) for value in values]) if all(is_number(v) for v in values) else None
+
+    def __repr__(self):
+        return f'Parameter({self.name}, {len(self.values)} values)'
+
+    def index_of(self, value):
+        """
+        Returns the index of `value` in `self.values`, or None if it is not one of them.
+        """
+        if self.numbers is not None:
+            try:
+                matches = np.flatnonzero(np.isclose(self.numbers, float(value)))
+            except (TypeError, ValueError):
+                return None
+            return int(matches[0]) if len(matches) else None
+        return self.values.index(str(value)) if str(value) in self.values else None
+
+def is_number(text):
+    try:
+        float(text)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+def sweep_values(text):
+    """
+    Returns the values of a sweep like '[10:200:10]' or '[a|b|c]', or None if `text` is not a sweep.
+    """
+    match = SWEEP.match(text.strip())
+    if not match:
+        return None
+    body = match.group(1)
+    if '|' in body or ':' not in body:
+        return [value.strip() for value in body.split('|') if value.strip()]
+
+    start, stop, step = (float(part) for part in (body.split(':') + ['1'])[:3])
+    if step <= 0:
+        raise ValueError(f"The step of the sweep '{text}' must be positive")
+    decimals = max(len(part.split('.')[1]) if '.' in part else 0 for part in body.split(':'))
+    count = int(math.floor((stop - start) / step + 1e-9)) + 1
+    return [f'{start + i * step:.{decimals}f}' for i in range(max(count, 0))]
+
+def parse_search_space(properties_string):
+    """
+    Splits Expert properties into the fixed inputs and the swept ones.
+
+    Args:
+        properties_string (str): The properties in the format 'name=value, name=[start:stop:step], name=[a|b],...'.
+
+    Returns:
+        tuple: The fixed inputs (dict of name to value) and the swept inputs (list of Parameter).
+    """
+    fixed, parameters = {}, []
+    for prop in (properties_string or '').split(','):
+        if '=' not in prop:
+            continue
+        name, value = (part.strip() for part in prop.split('=', 1))
+        values = sweep_values(value)
+        if values is None:
+            fixed[name] = value
+        elif values:
+            parameters.append(Parameter(name, values))
+    return fixed, parameters
+
+def has_sweep(settings):
+    """
+    Returns True if the Expert properties of a row of the Settings file contain a sweep.
+    """
+    properties_string = settings.get('Expert properties')
+    if not isinstance(properties_string, str):
+        return False
+    return any(SWEEP.match(prop.split('=', 1)[1].strip()) for prop in properties_string.split(',') if '=' in prop)
+
+def properties_string(fixed, parameters, point):
+    """
+    Returns the Expert properties of a point of a search space.
+
+    Args:
+        fixed (dict): The fixed inputs.
+        parameters (list of Parameter): The swept inputs.
+        point (tuple of int): The index of the value of each swept input.
+    """
+    values = dict(fixed)
+    values.update({parameter.name: parameter.values[index] for parameter, index in zip(parameters, point)})
+    return ', '.join(f'{name}={value}' for name, value in values.items())
+
+def job_settings(settings, fixed, parameters, point):
+    """
+    Returns the test of the row `settings` (a TestJob) with the inputs of `point`.
+    """
+    return settings.with_sweep(fixed, tuple((parameter.name, parameter.values[index]) for parameter, index in zip(parameters, point)))
+
+def expand_grid(settings):
+    """
+    Returns a test for every combination of the swept inputs of `settings` (a TestJob). The tests share the fixed
+    inputs and the (name, value) pairs of the swept inputs, so each of them only holds a tuple of references.
+    """
+    fixed, parameters = parse_search_space(settings.properties)
+    choices = [[(parameter.name, value) for value in parameter.values] for parameter in parameters]
+    return [settings.with_sweep(fixed, swept) for swept in itertools.product(*choices)]
+
+def erf(x):
+    """
+    Vectorized error function (Abramowitz and Stegun 7.1.26, absolute error below 1.5e-7).
+    """
+    sign = np.sign(x)
+    x = np.abs(x)
+    t = 1 / (1 + 0.3275911 * x)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    return sign * (1 - poly * np.exp(-x * x))
+
+def rbf(a, b, length_scale):
+    distances = ((a[:, None, :] - b[None, :, :]) ** 2).sum(axis=2)
+    return np.exp(-0.5 * distances / length_scale ** 2)
+
+class GaussianProcess:
+    '''A Gaussian process with an RBF kernel whose length scale maximizes the marginal likelihood of the observations.'''
+
+    def __init__(self, x, y, length_scale=None):
+        self.x = x
+        self.mean, self.deviation = y.mean(), y.std() or 1.0
+        self.y = (y - self.mean) / self.deviation
+        if length_scale is None:
+            length_scale = max(LENGTH_SCALES, key=self.log_likelihood)
+        self.length_scale = length_scale
+        self.factor = np.linalg.cholesky(rbf(x, x, length_scale) + NOISE * np.eye(len(x)))
+        self.alpha = np.linalg.solve(self.factor.T, np.linalg.solve(self.factor, self.y))
+
+    def log_likelihood(self, length_scale):
+        try:
+            factor = np.linalg.cholesky(rbf(self.x, self.x, length_scale) + NOISE * np.eye(len(self.x)))
+        except np.linalg.LinAlgError:
+            return -np.inf
+        alpha = np.linalg.solve(factor.T, np.linalg.solve(factor, self.y))
+        return -0.5 * self.y @ alpha - np.log(np.diag(factor)).sum()
+
+    def predict(self, candidates):
+        """
+        Returns the mean and the standard deviation of the prediction at each candidate, in the units of the observations.
+        """
+        cross = rbf(candidates, self.x, self.length_scale)
+        mean = cross @ self.alpha
+        v = np.linalg.solve(self.factor, cross.T)
+        variance = np.clip(1 - (v ** 2).sum(axis=0), 1e-12, None)
+        return mean * self.deviation + self.mean, np.sqrt(variance) * self.deviation
+
+def expected_improvement(mean, deviation, best):
+    z = (mean - best) / deviation
+    cdf = 0.5 * (1 + erf(z / math.sqrt(2)))
+    pdf = np.exp(-0.5 * z * z) / math.sqrt(2 * math.pi)
+    return (mean - best) * cdf + deviation * pdf
+
+class Optimizer:
+    def __init__(self, settings, method='bayesian', budget=BUDGET, metric='Total net profit', batch_size=BATCH_SIZE,
+                 patience=PATIENCE, seed=None):
+        """
+        Args:
+            settings (TestJob): A row of the Settings file whose Expert properties contain sweeps.
+            method (str): 'genetic' or 'bayesian'.
+            budget (int): The largest number of tests to propose.
+            metric (str): The column of Back Test Data to maximize. Prefix it with '-' to minimize it, or give a
+                composite score like 'Profit factor=1,Relative drawdown=-0.5' (see `results_query.ResultTable.score`).
+            batch_size (int): The number of tests proposed at once.
+            patience (int): The number of batches without improvement after which the search has converged.
+            seed (int): The seed of the random proposals.
+        """
+        if method not in METHODS:
+            raise ValueError(f"Unknown optimizer '{method}'. It should be one of: {', '.join(METHODS)}")
+        self.settings = settings
+        self.method = method
+        self.budget = budget
+        self.metric = metric
+        self.batch_size = batch_size
+        self.patience = patience
+        self.rng = np.random.default_rng(seed)
+        self.fixed, self.parameters = parse_search_space(settings.properties)
+        self.sizes = np.array([len(parameter.values) for parameter in self.parameters])
+        self.observations = {}  # Point to its score
+        self.proposed = set()  # Points which were submitted as tests
+        self.pending = 0  # Tests of the current batch which have not finished yet
+        self.best_history = []  # Best score after each batch
+        self.logger = logger
+
+    def __repr__(self):
+        return f"Optimizer({self.method}, {self.settings.expert}, {len(self.proposed)}/{self.budget} tests)"
+
+    @property
+    def space_size(self):
+        return int(np.prod(self.sizes, dtype=float)) if len(self.sizes) else 0
+
+    def best(self):
+        """
+        Returns the best observed Expert properties and their score, or None if nothing was observed.
+        """
+        if not self.observations:
+            return None
+        point = max(self.observations, key=self.observations.get)
+        return properties_string(self.fixed, self.parameters, point), self.observations[point]
+
+    def by(self):
+        if '=' in self.metric:
+            return {name.strip(): float(weight) for name, weight in (entry.rsplit('=', 1) for entry in self.metric.split(','))}
+        if self.metric.startswith('-'):
+            return {self.metric[1:].strip(): -1.0}
+        return self.metric
+
+    def observe(self, table):
+        """
+        Updates the observations with the results of this search space in `table`, which includes results ingested
+        before the search started.
+
+        Args:
+            table (ResultTable): The results in Back Test Data.
+        """
+        mask = np.ones(len(table), dtype=bool)
+        if self.settings.symbol and 'Symbol' in table.columns:
+            symbol = self.settings.symbol.upper()
+            codes = [code for code, name in enumerate(table.categories['Symbol']) if name.upper() == symbol]
+            mask &= np.isin(table.column('Symbol'), codes)
+        # The query columns hold the code of the Period and the start of the text of the Model (see `results_query.normalize`)
+        if self.settings.period and 'Period' in table.columns:
+            mask &= table.matches('Period', self.settings.period.name)
+        if self.settings.model and 'Model' in table.columns:
+            mask &= table.matches('Model', self.settings.model.value)
+        for name, date in (('From', self.settings.from_date), ('To', self.settings.to_date)):
+            if date and name in table.columns:
+                mask &= table.column(name) == np.datetime64(f'{date:%Y-%m-%d}', 'D')
+        if 'Expert' in table.columns:
+            # Results of the prebuilt variants of the EA (see `ea_compiler`) match the EA too
+            codes = [code for code, name in enumerate(table.categories['Expert']) if is_variant_of(name, self.settings.expert)]
+            mask &= np.isin(table.column('Expert'), codes)
+        for name, value in self.fixed.items():
+            if 'input.' + name in table.columns:
+                mask &= table.matches('input.' + name, value)
+        matching = table.take(mask)
+
+        columns = ['input.' + parameter.name for parameter in self.parameters]
+        if not len(matching) or any(column not in matching.columns for column in columns):
+            return
+        scores = matching.score(self.by())
+        inputs = matching.rows(columns)
+
+        totals = {}
+        for row, score in zip(inputs, scores):
+            point = tuple(parameter.index_of(row[column]) for parameter, column in zip(self.parameters, columns))
+            if None in point or np.isnan(score):
+                continue
+            totals.setdefault(point, []).append(float(score))
+        self.observations = {point: sum(values) / len(values) for point, values in totals.items()}
+
+    def job_finished(self):
+        """
+        Counts a finished test of the current batch.
+
+        Returns:
+            bool: True if all of the tests of the batch have finished.
+        """
+        self.pending = max(0, self.pending - 1)
+        return self.pending == 0
+
+    def converged(self):
+        """
+        Returns True if the best score has not improved by more than TOLERANCE in the last `self.patience` batches.
+        """
+        if len(self.best_history) <= self.patience:
+            return False
+        before, now = self.best_history[-self.patience - 1], self.best_history[-1]
+        return now - before <= TOLERANCE * max(1.0, abs(before))
+
+    def done(self):
+        return len(self.proposed) >= self.budget or len(self.proposed) >= self.space_size or self.converged()
+
+    def next_batch(self):
+        """
+        Proposes the next tests, once the tests of the previous batch have finished and been observed.
+
+        Returns:
+            list of TestJob: The tests to run, or an empty list if the search is over.
+        """
+        if self.observations:
+            self.best_history.append(max(self.observations.values()))
+        if self.done():
+            best = self.best()
+            self.logger.info(f"Search of {self.settings.expert} finished after {len(self.proposed)} tests. Best: {best}")
+            return []
+
+        count = min(self.batch_size, self.budget - len(self.proposed), self.space_size - len(self.proposed))
+        if len(self.observations) < max(2, len(self.parameters) + 1):
+            points = self.random_points(count)
+        elif self.method == 'genetic':
+            points = self.genetic_points(count)
+        else:
+            points = self.bayesian_points(count)
+
+        self.proposed.update(points)
+        self.pending = len(points)
+        self.logger.info(f"Proposed {len(points)} tests of {self.settings.expert} ({len(self.proposed)}/{self.budget})")
+        return [job_settings(self.settings, self.fixed, self.parameters, point) for point in points]
+
+    def is_new(self, point):
+        return point not in self.proposed and point not in self.observations
+
+    def random_points(self, count, exclude=()):
+        points = []
+        for _ in range(count * 50):
+            if len(points) == count:
+                break
+            point = tuple(int(i) for i in self.rng.integers(0, self.sizes))
+            if self.is_new(point) and point not in points and point not in exclude:
+                points.append(point)
+        return points
+
+    def genetic_points(self, count):
+        """
+        Breeds `count` new points from the best observations by tournament selection, uniform crossover and mutation.
+        """
+        ranked = sorted(self.observations, key=self.observations.get, reverse=True)
+        population = ranked[:max(2 * self.batch_size, 10)]
+        scores = np.array([self.observations[point] for point in population])
+
+        def select():
+            contestants = self.rng.integers(0, len(population), size=min(3, len(population)))
+            return population[max(contestants, key=lambda i: scores[i])]
+
+        children = []
+        for _ in range(count * 50):
+            if len(children) == count:
+                break
+            first, second = select(), select()
+            child = np.where(self.rng.random(len(self.sizes)) < 0.5, first, second)
+            for gene in range(len(child)):
+                if self.rng.random() < 1 / len(child):
+                    if self.rng.random() < 0.2:
+                        child[gene] = self.rng.integers(0, self.sizes[gene])
+                    else:
+                        step = self.rng.choice((-2, -1, 1, 2))
+                        child[gene] = np.clip(child[gene] + step, 0, self.sizes[gene] - 1)
+            child = tuple(int(i) for i in child)
+            if self.is_new(child) and child not in children:
+                children.append(child)
+        return children + self.random_points(count - len(children), exclude=children)
+
+    def candidates(self):
+        """
+        Returns the points which the Bayesian search chooses from: every point of small search spaces, otherwise
+        random points and the neighbours of the best observations.
+        """
+        if self.space_size <= MAX_ENUMERATED:
+            grid = np.indices(self.sizes).reshape(len(self.sizes), -1).T
+        else:
+            grid = self.rng.integers(0, self.sizes, size=(SAMPLED_CANDIDATES, len(self.sizes)))
+            best = sorted(self.observations, key=self.observations.get, reverse=True)[:5]
+            steps = self.rng.integers(-2, 3, size=(len(best), 200, len(self.sizes)))
+            neighbours = np.clip(np.array(best)[:, None, :] + steps, 0, self.sizes - 1).reshape(-1, len(self.sizes))
+            grid = np.unique(np.vstack([grid, neighbours]), axis=0)
+        taken = self.proposed | set(self.observations)
+        return np.array([point for point in map(tuple, grid) if point not in taken], dtype=int).reshape(-1, len(self.sizes))
+
+    def normalize(self, points):
+        return np.asarray(points, dtype=float) / np.maximum(self.sizes - 1, 1)
+
+    def bayesian_points(self, count):
+        """
+        Chooses `count` points which maximize the expected improvement of a Gaussian process fitted to the observations.
+        The batch is built one point at a time, assuming that each chosen point scores its predicted mean.
+        """
+        candidates = self.candidates()
+        if not len(candidates):
+            return []
+        points = list(self.observations)
+        x = self.normalize(points)
+        y = np.array([self.observations[point] for point in points])
+        length_scale = None
+
+        chosen = []
+        for _ in range(min(count, len(candidates))):
+            model = GaussianProcess(x, y, length_scale)
+            length_scale = model.length_scale  # Fitted once per batch
+            mean, deviation = model.predict(self.normalize(candidates))
+            improvement = expected_improvement(mean, deviation, y.max())
+            index = int(np.argmax(improvement))
+            chosen.append(tuple(int(i) for i in candidates[index]))
+            x = np.vstack([x, self.normalize(candidates[index:index + 1])])
+            y = np.append(y, mean[index])
+            candidates = np.delete(candidates, index, axis=0)
+        return chosen
@@ -0,0 +1,105 @@
+'''
+This module ingests the saved reports on a thread of their own, so that the Strategy Tester starts the next test while the
+report of the previous one is scraped and written to Back Test Data.
+
+The tester stage submits every saved report to a bounded queue. When INGEST_QUEUE_SIZE reports are already waiting,
+submitting blocks until one has been ingested, so a slow ingest slows the tester down instead of piling up reports.
+A report which can't be ingested only fails its own test. The outcome of each test is put on the `finished` queue, which
+the tester stage drains between tests, so that the run state, the progress and the optimizers are updated from one thread.
+Back Test Data is only written while `workbook_lock` is held, so that the tester stage can read it (e.g. for the
+optimizers) without seeing a workbook which is half saved.
+'''
+
+from queue import Queue, SimpleQueue, Empty
+from threading import Lock, Thread
+from time import monotonic
+from components.logger import setup_logger
+from components.metrics import metrics, observe_stage
+from components.reports_processor import process_html_file
+
+logger = setup_logger(__name__)
+
+INGEST_QUEUE_SIZE = 4
+
+class IngestStage:
+    def __init__(self, browser, excel_util, queue_size=INGEST_QUEUE_SIZE, workbook_lock=None):
+        """
+        Args:
+            browser (LazyBrowser): The browser used to scrape the reports. Only the ingest thread uses it.
+            excel_util (ExcelUtil): Writes the scraped data to Back Test Data. Only the ingest thread uses it.
+            queue_size (int): The largest number of reports waiting to be ingested.
+            workbook_lock (Lock): Held while Back Test Data is written. Readers of the workbook hold it too.
+        """
+        self.browser = browser
+        self.excel_util = excel_util
+        self.workbook_lock = workbook_lock or Lock()
+        self.queue = Queue(maxsize=queue_size)
+        self.finished = SimpleQueue()  # (job, outcome, error) of every ingested report
+        self.pending = 0  # Reports submitted whose outcome has not been drained yet
+        self.thread = Thread(target=self.run, name='ingest', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def submit(self, job, report_path, aborted=None):
+        """
+        Queues a saved report to be ingested. Blocks while the queue is full.
+
+        Args:
+            job (TestJob): The test of the report.
+            report_path (str): The path of the report.
+            aborted (str): Why the test was stopped early by its abort rules, if it was.
+        """
+        self.pending += 1
+        start = monotonic()
+        self.queue.put((job, report_path, aborted))
+        waited = monotonic() - start
+        if waited > 0.01:  # The tester was held back by the ingest
+            observe_stage('ingest_wait', waited, {})
+        metrics.ingest_backlog.set(self.queue.qsize())
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            job, report_path, aborted = item
+            error = None
+            try:
+                process_html_file(report_path, self.browser, lambda data: self.write(data, aborted))
+                metrics.report_ingested()
+                outcome = 'aborted' if aborted else 'completed'
+            except Exception as e:
+                outcome, error = 'failed', f"Failed to ingest the report {report_path}: {e}"
+                logger.error(error)
+            metrics.ingest_backlog.set(self.queue.qsize())
+            self.finished.put((job, outcome, error))
+
+    def write(self, data, aborted):
+        with self.workbook_lock:
+            self.excel_util.add_data_to_excel({**data, 'Aborted': aborted or ''})
+
+    def drain(self, wait=False):
+        """
+        Returns the (job, outcome, error) of the reports which were ingested since the last call.
+
+        Args:
+            wait (bool): Whether to wait until every submitted report has been ingested.
+        """
+        results = []
+        while self.pending:
+            try:
+                results.append(self.finished.get(block=wait))
+            except Empty:
+                break
+            self.pending -= 1
+        return results
+
+    def close(self):
+        """
+        Ingests the reports which are still queued and stops the thread.
+        """
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
@@ -0,0 +1,303 @@
+'''
+This module estimates how long the tests of a Settings file will take, before any of them runs.
+
+The time of every test is appended to a run history file (a JSON object per line with the Expert, Symbol, Period, Model,
+the number of days tested and the seconds the Strategy Tester took). A test is estimated from the completed tests of the
+most specific group with at least MIN_SAMPLES of them:
+    Expert, Symbol, Period and Model > Expert, Period and Model > Symbol, Period and Model > Period and Model > Model > all.
+Within a group the seconds per tested day are assumed to be the same, so a test of twice the dates takes twice as long.
+The range of an estimate is the 90% prediction interval of the seconds per day of its group, which is wide when the group
+is small or its tests vary a lot. Tests without history are estimated at DEFAULT_SECONDS.
+The range of the total is not the sum of the ranges of the tests, since the tests are unlikely to all be slow at once.
+Tests estimated from the same group share its error, so they are added up as one test. The sums of the groups are
+independent, and their total is approximated by a lognormal of the same mean and variance (Fenton-Wilkinson).
+
+The tests are scheduled on the workers longest first, each to the worker which is free first.
+
+Usage:
+    python -m components.planner [Settings file] [--workers 1] [--history run_history.jsonl] [--optimizer bayesian]
+        [--budget 64] [--resume] [--top 10]
+'''
+
+import argparse
+import heapq
+import json
+import math
+from dataclasses import dataclass
+from os import getenv, path
+from statistics import median, stdev
+from threading import Lock
+from time import time
+from components.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+RUN_HISTORY_FILE = 'run_history.jsonl'
+DEFAULT_SECONDS = 120  # Estimate of a test when no test has been timed yet
+Z_90 = 1.645
+DEFAULT_SPREAD = math.log(4) / Z_90  # Estimates without history may be 4 times too low or too high
+MIN_SAMPLES = 3  # Completed tests a group needs before its estimate is used
+MIN_SPREAD = 0.1  # Even identical tests vary by about 10%
+LEVELS = (('expert', 'symbol', 'period', 'model'), ('expert', 'period', 'model'), ('symbol', 'period', 'model'),
+          ('period', 'model'), ('model',), ())
+
+def test_days(job):
+    """
+    Returns the number of days from the From date to the To date of a test, or None if either is not set.
+    """
+    if not job.from_date or not job.to_date:
+        return None
+    return max((job.to_date - job.from_date).days + 1, 1)
+
+def job_key(job):
+    """
+    Returns the values of a test which its time depends on, in the form they are recorded in the run history.
+    """
+    return {
+        'expert': job.expert,
+        'symbol': job.symbol.upper() if job.symbol else None,
+        'period': job.period.name if job.period else None,
+        'model': job.model.value if job.model else None,
+    }
+
+def format_duration(seconds):
+    """Formats a number of seconds as e.g. '2h 05m' or '3d 04h'."""
+    minutes = int(round(seconds / 60))
+    if minutes >= 24 * 60:
+        return f"{minutes // (24 * 60)}d {minutes // 60 % 24:02d}h"
+    return f"{minutes // 60}h {minutes % 60:02d}m"
+
+class RunHistory:
+    '''The times of the tests of previous runs.'''
+
+    def __init__(self, history_path=RUN_HISTORY_FILE):
+        self.history_path = history_path
+        self.records = []
+        self.lock = Lock()
+        self.load()
+
+    def load(self):
+        """
+        Reads the records of `self.history_path`, if it exists. Lines which can't be read are left out.
+        """
+        if not path.exists(self.history_path):
+            return
+        try:
+            with open(self.history_path) as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                        if record.get('seconds', 0) > 0:
+                            self.records.append(record)
+                    except (ValueError, AttributeError, TypeError):
+                        continue
+        except Exception as e:
+            logger.error(f"Failed to load the run history from {self.history_path}: {e}")
+
+    def record(self, job, seconds, outcome='completed', worker=None):
+        """
+        Appends the time of a test to the run history.
+
+        Args:
+            job (TestJob): The test.
+            seconds (float): The time the Strategy Tester took to run the test and save its report.
+            outcome (str): 'completed' or 'aborted'. Only completed tests are used for estimates.
+            worker (str): The name of the machine which ran the test, if it was distributed.
+        """
+        record = {'time': time(), **job_key(job), 'days': test_days(job), 'seconds': round(seconds, 3), 'outcome': outcome}
+        if worker:
+            record['worker'] = worker
+        try:
+            with self.lock:
+                self.records.append(record)
+                with open(self.history_path, 'a') as file:
+                    file.write(json.dumps(record) + '\n')
+        except Exception as e:
+            logger.error(f"Failed to record the time of {job.label} in {self.history_path}: {e}")
+
+@dataclass(slots=True)
+class Estimate:
+    job: object  # TestJob
+    seconds: float
+    low: float  # Bounds of the 90% prediction interval
+    high: float
+    spread: float  # Standard deviation of the log of the seconds
+    group: str  # The group of past tests the estimate is based on, e.g. 'MyEA EURUSD H1 Every tick'
+    samples: int  # The number of past tests in the group
+
+    @property
+    def uncertainty(self):
+        return self.high - self.low
+
+class DurationModel:
+    '''Estimates the time of a test from the completed tests of the run history.'''
+
+    def __init__(self, records):
+        self.groups = [{} for _ in LEVELS]  # For each level, the values of a group to the (seconds, days) of its tests
+        for record in records:
+            if record.get('outcome', 'completed') != 'completed':
+                continue  # Aborted tests stopped early, so their times are too short
+            for fields, groups in zip(LEVELS, self.groups):
+                groups.setdefault(tuple(record.get(name) for name in fields), []).append((record['seconds'], record.get('days')))
+        self.cache = {}
+
+    def estimate(self, job):
+        """
+        Returns the Estimate of a test.
+        """
+        key, days = job_key(job), test_days(job)
+        cache_key = (tuple(key.values()), days)
+        if cache_key not in self.cache:
+            self.cache[cache_key] = self.estimate_seconds(key, days)
+        return Estimate(job, *self.cache[cache_key])
+
+    def estimate_seconds(self, key, days):
+        for fields, groups in zip(LEVELS, self.groups):
+            values = tuple(key[name] for name in fields)
+            if None in values:
+                continue
+            tests = groups.get(values, [])
+            rates = [seconds / tested for seconds, tested in tests if tested] if days else []
+            if len(rates) >= MIN_SAMPLES:
+                center, spread = self.fit(rates)
+                center *= days
+            elif len(tests) >= MIN_SAMPLES:
+                center, spread = self.fit([seconds for seconds, _ in tests])
+            else:
+                continue
+            return (center, center * math.exp(-Z_90 * spread), center * math.exp(Z_90 * spread), spread,
+                    ' '.join(values) or 'all tests', len(tests))
+        return (DEFAULT_SECONDS, DEFAULT_SECONDS * math.exp(-Z_90 * DEFAULT_SPREAD), DEFAULT_SECONDS * math.exp(Z_90 * DEFAULT_SPREAD),
+                DEFAULT_SPREAD, 'no history', 0)
+
+    @staticmethod
+    def fit(values):
+        """
+        Returns the median of `values` and the spread of a new value around it on a log scale, which grows when there are
+        few values.
+        """
+        logs = [math.log(value) for value in values]
+        spread = max(stdev(logs), MIN_SPREAD) * math.sqrt(1 + 1 / len(logs))
+        return median(values), spread
+
+@dataclass
+class Plan:
+    estimates: list  # The Estimate of each test
+    schedule: list  # The estimates of the tests of each worker, in the order they run
+
+    @property
+    def total_seconds(self):
+        return sum(estimate.seconds for estimate in self.estimates)
+
+    def total_range(self):
+        """
+        Returns the bounds of the 90% prediction interval of the total time of the tests (see the module docstring).
+        """
+        groups = {}  # The sum of the estimates of the tests of each group
+        for estimate in self.estimates:
+            key = (estimate.group, estimate.spread)
+            groups[key] = groups.get(key, 0.0) + estimate.seconds
+        # Mean and variance of a lognormal with the median `seconds` and the standard deviation `spread` of its log
+        mean = sum(seconds * math.exp(spread ** 2 / 2) for (_, spread), seconds in groups.items())
+        variance = sum(seconds ** 2 * math.exp(spread ** 2) * (math.exp(spread ** 2) - 1) for (_, spread), seconds in groups.items())
+        if not mean:
+            return 0.0, 0.0
+        spread = math.sqrt(math.log(1 + variance / mean ** 2))
+        center = mean * math.exp(-spread ** 2 / 2)
+        return center * math.exp(-Z_90 * spread), center * math.exp(Z_90 * spread)
+
+    @property
+    def loads(self):
+        return [sum(estimate.seconds for estimate in tests) for tests in self.schedule]
+
+    @property
+    def makespan(self):
+        """The time until the last worker is done."""
+        return max(self.loads, default=0)
+
+    def most_uncertain(self, count=10):
+        """
+        Returns the rows of the Settings file whose tests add the most uncertainty to the total, as a list of (Estimate,
+        number of tests). The tests expanded from one row share their estimate.
+        """
+        rows = {}
+        for estimate in self.estimates:
+            first, tests = rows.get(id(estimate.job.row), (estimate, 0))
+            rows[id(estimate.job.row)] = (first, tests + 1)
+        return sorted(rows.values(), key=lambda row: row[0].uncertainty * row[1], reverse=True)[:count]
+
+def plan(jobs, model, workers=1):
+    """
+    Estimates the tests and schedules them on `workers` workers, longest first, each to the worker which is free first.
+
+    Args:
+        jobs (list of TestJob): The tests.
+        model (DurationModel): Estimates the time of each test.
+        workers (int): The number of machines which run tests at the same time.
+
+    Returns:
+        Plan: The estimates and the schedule.
+    """
+    estimates = [model.estimate(job) for job in jobs]
+    schedule = [[] for _ in range(max(workers, 1))]
+    free = [(0.0, worker) for worker in range(len(schedule))]
+    for estimate in sorted(estimates, key=lambda estimate: estimate.seconds, reverse=True):
+        load, worker = heapq.heappop(free)
+        schedule[worker].append(estimate)
+        heapq.heappush(free, (load + estimate.seconds, worker))
+    return Plan(estimates, schedule)
+
+def planned_jobs(settings_excel_path, optimizer=None, budget=64, resume=False, run_state_path=None):
+    """
+    Reads the tests of a Settings file like a run would. A row searched by an optimizer counts as `budget` tests, or as
+    every combination of its sweeps if there are fewer.
+    """
+    from components.settings_reader import SettingsReader
+    from components.optimizer import has_sweep, expand_grid, parse_search_space
+    from components.run_state import RunState, RUN_STATE_FILE
+
+    jobs = []
+    for settings in SettingsReader(settings_excel_path).read_jobs():
+        if settings.expert is None:
+            continue
+        if not has_sweep(settings):
+            jobs.append(settings)
+        elif optimizer:
+            _, parameters = parse_search_space(settings.properties)
+            jobs += [settings] * min(budget, math.prod(len(parameter.values) for parameter in parameters))
+        else:
+            jobs += expand_grid(settings)
+    if resume:
+        run_state = RunState(run_state_path or getenv('BACKTEST_RUN_STATE') or RUN_STATE_FILE)
+        jobs = [job for job in jobs if not run_state.is_done(job)]
+    return jobs
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Estimates how long the tests of a Settings file will take, without running them.')
+    parser.add_argument('settings', help='The Settings file.')
+    parser.add_argument('--workers', type=int, default=1, help='The number of machines which run tests at the same time.')
+    parser.add_argument('--history', default=getenv('BACKTEST_RUN_HISTORY') or RUN_HISTORY_FILE, help='The run history file.')
+    parser.add_argument('--optimizer', default=getenv('BACKTEST_OPTIMIZER'), help='genetic or bayesian, if the sweeps are searched.')
+    parser.add_argument('--budget', type=int, default=int(getenv('BACKTEST_OPTIMIZER_BUDGET') or 64), help='The tests of each search.')
+    parser.add_argument('--resume', action='store_true', help='Leave out the tests which are done in the run state file.')
+    parser.add_argument('--top', type=int, default=10, help='The number of most uncertain tests to show.')
+    args = parser.parse_args(argv)
+
+    history = RunHistory(args.history)
+    jobs = planned_jobs(args.settings, args.optimizer, args.budget, args.resume)
+    result = plan(jobs, DurationModel(history.records), args.workers)
+
+    low, high = result.total_range()
+    print(f'{len(jobs)} tests, estimated from {len(history.records)} timed tests: {format_duration(result.total_seconds)} '
+          f'of testing (90% likely between {format_duration(low)} and {format_duration(high)})')
+    print(f"With {len(result.schedule)} worker{'s' if len(result.schedule) > 1 else ''}, the last test is done after {format_duration(result.makespan)}")
+    for worker, (tests, load) in enumerate(zip(result.schedule, result.loads), start=1):
+        print(f'  Worker {worker}: {len(tests)} tests, {format_duration(load)}')
+
+    print('\nMost uncertain estimates:')
+    for estimate, tests in result.most_uncertain(args.top):
+        print(f'  {estimate.job.label} ({estimate.job.row.get("Expert properties") or "default inputs"}): {tests} x {format_duration(estimate.seconds)}, '
+              f'{format_duration(estimate.low)} - {format_duration(estimate.high)} each, from {estimate.samples} tests of {estimate.group}')
+
+if __name__ == '__main__':
+    main()
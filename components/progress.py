@@ -0,0 +1,125 @@
+'''
+This module passes the progress of a run from the thread running the tests to the GUI.
+The worker publishes events to a queue and never touches Tk widgets. The GUI drains the queue on a timer in the Tk main
+loop and keeps a ProgressState from which it shows the current job, done/total, tests per hour, ETA and the last error.
+'''
+
+from queue import SimpleQueue, Empty
+from time import time
+
+class ProgressReporter:
+    def __init__(self, enabled=True):
+        self.enabled = enabled  # A disabled reporter drops the events, for runs without a GUI
+        self.events = SimpleQueue()
+
+    def publish(self, kind, **data):
+        """
+        Puts an event of the type `kind` with `data` on the queue.
+        """
+        if self.enabled:
+            self.events.put({'kind': kind, 'time': time(), **data})
+
+    def run_started(self, total):
+        self.publish('run_started', total=total)
+
+    def total_changed(self, total):
+        """
+        Publishes that tests were added to or removed from the run, e.g. by an optimizer, so that it has `total` tests now.
+        """
+        self.publish('total_changed', total=total)
+
+    def job_started(self, index, description):
+        self.publish('job_started', index=index, description=description)
+
+    def job_finished(self, outcome):
+        """
+        Publishes that the current job finished with the `outcome` 'completed', 'aborted', 'failed', 'skipped' or 'cancelled'.
+        """
+        self.publish('job_finished', outcome=outcome)
+
+    def report_saved(self, report_path):
+        self.publish('report_saved', report_path=report_path)
+
+    def error(self, message, fatal=False):
+        """
+        Publishes an error. A `fatal` error is one which ended the run.
+        """
+        self.publish('error', message=message, fatal=fatal)
+
+    def run_finished(self, stopped):
+        """
+        Publishes that the run ended, either because all of the jobs were done or because it was `stopped` by the user.
+        """
+        self.publish('run_finished', stopped=stopped)
+
+    def drain(self):
+        """
+        Returns all of the events that are on the queue without blocking.
+        """
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except Empty:
+                return events
+
+class ProgressState:
+    def __init__(self, report_count=None):
+        self.report_count = report_count  # Number of reports in the HTML Reports folder
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self.skipped = 0
+        self.current_job = None
+        self.last_error = None
+        self.started_at = None
+        self.finished_at = None
+        self.stopped = False
+
+    def apply(self, event):
+        """
+        Updates the state with an event published by a ProgressReporter.
+        """
+        kind = event['kind']
+        if kind == 'run_started':
+            self.total, self.done, self.failed, self.skipped = event['total'], 0, 0, 0
+            self.started_at, self.finished_at, self.stopped, self.last_error = event['time'], None, False, None
+        elif kind == 'total_changed':
+            self.total = event['total']
+        elif kind == 'job_started':
+            self.current_job = f"{event['index'] + 1}. {event['description']}"
+        elif kind == 'job_finished':
+            if event['outcome'] == 'cancelled':  # The job will be run again when the run is resumed
+                return
+            self.done += 1
+            if event['outcome'] == 'failed':
+                self.failed += 1
+            elif event['outcome'] == 'skipped':
+                self.skipped += 1
+        elif kind == 'report_saved':
+            if self.report_count is not None:
+                self.report_count += 1
+        elif kind == 'error':
+            self.last_error = event['message']
+        elif kind == 'run_finished':
+            self.current_job = None
+            self.finished_at = event['time']
+            self.stopped = event['stopped']
+
+    def tests_per_hour(self):
+        """
+        Returns the number of jobs done per hour since the run started, or None before the first job is done.
+        """
+        if not self.started_at or not self.done:
+            return None
+        elapsed = (self.finished_at or time()) - self.started_at
+        return self.done / elapsed * 3600 if elapsed > 0 else None
+
+    def eta_seconds(self):
+        """
+        Returns the estimated number of seconds until all of the jobs are done, or None if it can't be estimated yet.
+        """
+        rate = self.tests_per_hour()
+        if not rate or self.finished_at:
+            return None
+        return (self.total - self.done) / rate * 3600
@@ -0,0 +1,286 @@
+'''
+This module has the typed records which travel through the pipeline:
+- `TestJob`, a row of the Settings file whose values are parsed once: the period and model become enums, the dates
+  datetimes, the Expert properties a dict of inputs and the optional columns `AbortRules`,
+- `TestResult`, the statistics scraped from a report,
+- `ResultBatch`, many results stored by column, with the statistics in float arrays instead of a dict per row.
+
+The tests of a sweep share the row and the fixed inputs of the row they were expanded from, and only hold the values of
+their swept inputs, so that millions of them fit in memory.
+'''
+
+import math
+import re
+from array import array
+from dataclasses import dataclass, field, replace
+from enum import Enum
+from components.abort_rules import AbortRules, parse_date
+
+NUMBER = re.compile(r'-?\d+(?:\.\d+)?')
+PERIOD_CODE = re.compile(r'\((M1|M5|M15|M30|H1|H4|D1|W1|MN1?|Daily|Weekly|Monthly)\)')
+
+class Period(Enum):
+    '''A period of the Strategy Tester. The value is its length in minutes.'''
+    M1 = 1
+    M5 = 5
+    M15 = 15
+    M30 = 30
+    H1 = 60
+    H4 = 240
+    D1 = 1440
+    W1 = 10080
+    MN1 = 43200
+
+    @property
+    def label(self):
+        """
+        Returns the text of the period in the Period dropdown of the Strategy Tester.
+        """
+        return {'D1': 'Daily', 'W1': 'Weekly', 'MN1': 'Monthly'}.get(self.name, self.name)
+
+    @classmethod
+    def parse(cls, text):
+        """
+        Returns the period of a cell of the Settings file (e.g. 'H1' or 'Daily') or of a report (e.g. '1 Hour (H1) ...').
+
+        Raises:
+            ValueError: If `text` is not a period.
+        """
+        text = str(text).strip()
+        match = PERIOD_CODE.search(text)
+        code = (match.group(1) if match else text).upper()
+        for period in cls:
+            if code in (period.name, period.label.upper()) or (period is cls.MN1 and code == 'MN'):
+                return period
+        raise ValueError(f"Unknown period '{text}'")
+
+class Model(Enum):
+    '''A modelling of the Strategy Tester. The value is the start of its text in the Model dropdown.'''
+    EVERY_TICK = 'Every tick'
+    CONTROL_POINTS = 'Control points'
+    OPEN_PRICES = 'Open prices'
+
+    @property
+    def label(self):
+        return self.value
+
+    @classmethod
+    def parse(cls, text):
+        """
+        Returns the model of a cell of the Settings file (e.g. 'Every tick') or of a report (e.g. 'Every tick (the most ...').
+
+        Raises:
+            ValueError: If `text` is not a model.
+        """
+        words = ' '.join(str(text).lower().split()[:2])
+        for model in cls:
+            if words == model.value.lower():
+                return model
+        raise ValueError(f"Unknown model '{text}'")
+
+def parse_number(text):
+    """
+    Returns the first number in `text`, or NaN if there is none.
+    """
+    if text is None:
+        return math.nan
+    if isinstance(text, (int, float)):
+        return float(text)
+    match = NUMBER.search(text or '')
+    return float(match.group()) if match else math.nan
+
+def parse_properties(text):
+    """
+    Returns the inputs of Expert properties like 'Lots=0.1, TakeProfit=50' as a dict of name to value.
+    """
+    inputs = {}
+    for prop in (text or '').split(','):
+        if '=' in prop:
+            name, value = prop.split('=', 1)
+            inputs[name.strip()] = value.strip()
+    return inputs
+
+def tester_date(date):
+    """
+    Returns a date in the 'YYYY.MM.DD' format of the Strategy Tester, or None if it is not set.
+    """
+    return f'{date:%Y.%m.%d}' if date else None
+
+def parse_text(value):
+    if value is None or str(value).strip() == '':
+        return None
+    return str(value).strip()
+
+@dataclass(slots=True)
+class TestJob:
+    '''
+    A test to run. It can be read like the row of the Settings file it came from, e.g. `job['Max drawdown']`, so
+    that its fingerprint (see `run_state`) is the fingerprint of that row.
+    '''
+    row: dict  # The row of the Settings file, shared by the tests expanded from it
+    expert: str = None
+    symbol: str = None
+    period: Period = None
+    model: Model = None
+    from_date: object = None  # datetime
+    to_date: object = None  # datetime
+    rules: AbortRules = None
+    fixed: dict = field(default_factory=dict)  # Inputs which are the same for every test of the row
+    swept: tuple = ()  # (name, value) of each swept input of this test
+    variant: str = None  # Name of the prebuilt EA variant which already has the inputs (see `ea_compiler`)
+    optimizer: object = None  # The Optimizer which proposed this test
+
+    @classmethod
+    def from_row(cls, row):
+        """
+        Parses a row of the Settings file.
+
+        Args:
+            row (dict): Column header to cell value.
+
+        Raises:
+            ValueError: If the Period, Model, From or To cell is not valid.
+        """
+        period, model = parse_text(row.get('Period')), parse_text(row.get('Model'))
+        return cls(
+            row=row,
+            expert=parse_text(row.get('Expert')),
+            symbol=parse_text(row.get('Symbol')),
+            period=Period.parse(period) if period else None,
+            model=Model.parse(model) if model else None,
+            from_date=parse_date(row.get('From')),
+            to_date=parse_date(row.get('To')),
+            rules=AbortRules.from_settings(row),
+            fixed=parse_properties(row.get('Expert properties')),
+        )
+
+    def with_sweep(self, fixed, swept):
+        """
+        Returns the test of one combination of the swept inputs of this row.
+
+        Args:
+            fixed (dict): The inputs which are not swept, shared by the tests of the sweep.
+            swept (tuple): (name, value) of each swept input.
+        """
+        return replace(self, fixed=fixed, swept=swept, variant=None, optimizer=None)
+
+    @property
+    def inputs(self):
+        """
+        Returns the inputs of the test as a dict of name to value.
+        """
+        if not self.swept:
+            return self.fixed
+        inputs = dict(self.fixed)
+        inputs.update(self.swept)
+        return inputs
+
+    @property
+    def properties(self):
+        """
+        Returns the Expert properties of the test, e.g. 'Lots=0.1, TakeProfit=50'.
+        """
+        if not self.swept:
+            return self.row.get('Expert properties')
+        return ', '.join(f'{name}={value}' for name, value in self.inputs.items())
+
+    @property
+    def label(self):
+        return ' '.join(str(value) for value in (self.expert, self.symbol, self.period and self.period.label) if value)
+
+    def __getitem__(self, key):
+        if key == 'Variant':
+            return self.variant
+        if key == 'Optimizer':
+            return self.optimizer
+        if key == 'Expert properties':
+            return self.properties
+        return self.row[key]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def items(self):
+        """
+        Returns the (column, value) pairs of the row of this test, with its own Expert properties.
+        """
+        properties = self.properties
+        return [(key, properties if key == 'Expert properties' else value) for key, value in self.row.items()]
+
+@dataclass(slots=True)
+class TestResult:
+    '''The statistics scraped from a report.'''
+    source_file: str
+    values: dict  # Title of each statistic (see `reports_processor.titles_and_selectors`) to its text
+    aborted: str = None  # Why the test was stopped early by its abort rules, if it was
+
+    def number(self, title):
+        """
+        Returns the first number of a statistic, e.g. 1234.56 for "1234.56 (12.34%)", or NaN if there is none.
+        """
+        return parse_number(self.values.get(title))
+
+    def to_row(self):
+        """
+        Returns the result as a row of Back Test Data.
+        """
+        row = {'Source File': self.source_file, **self.values}
+        if self.aborted is not None:
+            row['Aborted'] = self.aborted
+        return row
+
+class ResultBatch:
+    '''Results stored by column. Text columns are lists and the other columns are float arrays, in which missing values are NaN.'''
+
+    def __init__(self, text_columns=(), text_prefixes=()):
+        """
+        Args:
+            text_columns (iterable of str): The columns which are kept as text.
+            text_prefixes (tuple of str): Columns starting with one of these are kept as text too.
+        """
+        self.text_columns = set(text_columns)
+        self.text_prefixes = tuple(text_prefixes)
+        self.columns = {}  # Column name to its list or array('d')
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def is_text(self, name):
+        return name in self.text_columns or name.startswith(self.text_prefixes)
+
+    def append(self, row):
+        """
+        Adds a result.
+
+        Args:
+            row (dict or TestResult): Column name to value.
+        """
+        if isinstance(row, TestResult):
+            row = row.to_row()
+        for name, value in row.items():
+            if name is None:
+                continue
+            column = self.columns.get(name)
+            if column is None:
+                column = self.columns[name] = [None] * self.size if self.is_text(name) else array('d', [math.nan]) * self.size
+            column.append(value if isinstance(column, list) else parse_number(value))
+        self.size += 1
+        for column in self.columns.values():
+            if len(column) < self.size:
+                column.append(None if isinstance(column, list) else math.nan)
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+        return self
+
+    def rows(self):
+        """
+        Returns the results as dicts of column name to value.
+        """
+        names = list(self.columns)
+        return [dict(zip(names, values)) for values in zip(*self.columns.values())]
@@ -3,15 +3,21 @@ This module works with the HTML backtest reports on the browser.
 '''
 
 import os
-import time
 from components.logger import setup_logger, INFO
-from components.browser import By
+from components.tracing import traced
+from components.records import TestResult
 
 # Set up logger for this file
 main_logger = setup_logger(__name__, INFO)
 
+
 # Each key is a stat on an HTML report and its value is an XPATH selector
 titles_and_selectors = {
+    "Expert": '(//div/b)[2]',
+    "Symbol": '//td[text()="Symbol"]/following-sibling::td',
+    "Period": '//td[text()="Period"]/following-sibling::td',
+    "Model": '//td[text()="Model"]/following-sibling::td',
+    "Parameters": '//td[text()="Parameters"]/following-sibling::td',
     "Initial deposit": '//td[contains(text(), "Initial deposit")]/following-sibling::td',
     "Total net profit": '//td[contains(text(), "Total net profit")]/following-sibling::td',
     "Gross profit": '//td[contains(text(), "Gross profit")]/following-sibling::td',
@@ -39,6 +45,7 @@ titles_and_selectors = {
 }
 
 
+@traced
 def process_html_file(file_path, browser_instance, add_data_to_excel):
     """
     Opens the HTML report located at `file_path`, scrapes the data from it, and adds/updates it in the Backtest Report Data Excel file.
@@ -47,34 +54,35 @@ def process_html_file(file_path, browser_instance, add_data_to_excel):
         file_path (str): The full path to the HTML file.
         browser_instance (browser.Browser): The browser instance to use for scraping.
         add_data_to_excel (excel_utils.add_data_to_excel): The function to add/update the scraped data in the Backtest Report Data Excel file.
-    
+
+    Returns:
+        TestResult: The scraped statistics.
+
     Raises:
         Exception: If an error occurs during the processing of the HTML file.
     """
     try:
-        real_path = 'file:\\' + os.path.realpath(file_path).replace('html', 'htm')
+        real_path = 'file:\\' + os.path.realpath(file_path)
         browser_instance.open_page(real_path)
-        time.sleep(1)
 
-        # Check if there's an error when opening the file in the browser
-        if browser_instance.is_no_error(1.5) == False:
-            browser_instance.refresh_page() # if there's an error, refresh the page so that the file can load
-
-        # Dictionary to hold the scraped data
-        data = {"Source File": file_path}
-
-        # Scrape and store the data
+        # All of the values are read in one call, which waits until the page is ready
         main_logger.info(f'Scraping data from file')
-        for title, selector in titles_and_selectors.items():
-            try:
-                element = browser_instance.driver.find_element(By.XPATH, selector)
-                data[title] = element.text
-            except Exception as e:
-                main_logger.error(f'Error finding {title} in file {file_path}: {e}')
-                data[title] = "N/A"
+        result = browser_instance.scrape(titles_and_selectors)
+        if result['errorPage']:  # If there's an error when opening the file, refresh the page so that the file can load
+            browser_instance.refresh_page()
+            result = browser_instance.scrape(titles_and_selectors)
+
+        values = {}
+        for title, value in result['values'].items():
+            if value is None:
+                main_logger.error(f'Error finding {title} in file {file_path}')
+                value = "N/A"
+            values[title] = value
+        test_result = TestResult(file_path, values)
 
         # Append or update the scraped data in the Excel file
-        add_data_to_excel(data)
+        add_data_to_excel(test_result.to_row())
+        return test_result
     except Exception as e:
         main_logger.error(f'Error processing HTML file {file_path}: {e}')
         raise
@@ -0,0 +1,460 @@
+'''
+This module queries and ranks the results ingested in the Back Test Data workbook.
+
+The workbook is loaded once into numpy columns and cached in a .npz file next to it, which is rebuilt when the workbook
+changes. Statistics become float columns (the first number of a cell, e.g. 1234.56 for "1234.56 (12.34%)"), and text
+becomes categorical columns (integer codes into a sorted array of categories), so that filters and rankings are
+vectorized and stay fast over millions of rows. The description of a test is split into these columns:
+- Expert, Symbol (e.g. EURUSD), Period (e.g. H1) and Model (e.g. Every tick),
+- From and To, the dates of the test,
+- input.[name] for each input in Parameters, e.g. input.Lots.
+
+Usage:
+    python -m components.results_query [Back Test Data file] [--symbol EURUSD] [--period H1] [--input Lots=0.1]
+        [--where "Profit factor>1.5"] [--rank "Total net profit" | --score "Profit factor=1,Relative drawdown=-0.5"]
+        [--group-by Symbol,Period] [--top 10]
+'''
+
+import argparse
+import json
+import re
+from os import path
+import numpy as np
+from components.logger import setup_logger
+from components.records import ResultBatch, Period, Model, parse_number
+
+logger = setup_logger(__name__)
+
+TEXT_COLUMNS = ('Source File', 'Expert', 'Symbol', 'Period', 'Model', 'Parameters')
+INPUT_PREFIX = 'input.'
+CACHE_VERSION = 2
+
+PERIOD_CODE = re.compile(r'\((M1|M5|M15|M30|H1|H4|D1|W1|MN1?|Daily|Weekly|Monthly)\)')
+DATE_RANGE = re.compile(r'\((\d{4}\.\d{2}\.\d{2}) - (\d{4}\.\d{2}\.\d{2})\)\s*$')
+CONDITION = re.compile(r'^\s*(.+?)\s*(>=|<=|==|!=|>|<)\s*(.+?)\s*$')
+OPERATORS = {'>=': np.greater_equal, '<=': np.less_equal, '==': np.equal, '!=': np.not_equal, '>': np.greater, '<': np.less}
+
+def is_number(value):
+    """
+    Returns True if `value` is a number or missing.
+    """
+    if value is None or isinstance(value, (int, float)):
+        return True
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
+
+def parse_parameters(text):
+    """
+    Returns the inputs in the Parameters cell of a report, e.g. {'Lots': '0.1'} for "Lots=0.1; TakeProfit=50;".
+    """
+    inputs = {}
+    for entry in (text or '').split(';'):
+        if '=' in entry:
+            name, value = entry.split('=', 1)
+            inputs[name.strip()] = value.strip()
+    return inputs
+
+def normalize(name, value):
+    """
+    Returns a Period as its code (e.g. 'D1' for 'Daily') and a Model as the start of its text (e.g. 'Open prices' for
+    'Open prices only (fastest method ...)'), which is how they are stored in the query columns. Other values and values
+    which can't be parsed are returned stripped.
+    """
+    text = str(value).strip()
+    try:
+        if name == 'Period':
+            return Period.parse(text).name
+        if name == 'Model':
+            return Model.parse(text).value
+    except ValueError:
+        pass
+    return text
+
+def describe(row):
+    """
+    Splits the description cells of a row of Back Test Data into the values of the query columns.
+
+    Args:
+        row (dict): Header to cell value.
+
+    Returns:
+        dict: Query column to value.
+    """
+    period_text = row.get('Period') or ''
+    period = PERIOD_CODE.search(period_text)
+    dates = DATE_RANGE.search(period_text)
+    values = {
+        'Expert': (row.get('Expert') or '').strip(),
+        'Symbol': (row.get('Symbol') or '').split(' ')[0],
+        'Period': normalize('Period', period.group(1) if period else period_text),
+        'Model': normalize('Model', (row.get('Model') or '').split(' (')[0]),
+        'From': dates.group(1).replace('.', '-') if dates else 'NaT',
+        'To': dates.group(2).replace('.', '-') if dates else 'NaT',
+    }
+    for name, value in parse_parameters(row.get('Parameters')).items():
+        values[INPUT_PREFIX + name] = value
+    return values
+
+def categorical(values):
+    """
+    Returns the sorted categories of `values` and the code of each value. Missing values get the code -1.
+    """
+    text = np.array(['' if value is None else str(value) for value in values])
+    categories, codes = np.unique(text, return_inverse=True)
+    codes = codes.astype(np.int32)
+    if len(categories) and categories[0] == '':
+        categories, codes = categories[1:], codes - 1
+    return categories, codes
+
+class ResultTable:
+    def __init__(self, columns, categories):
+        self.columns = columns  # Column name to an array of floats, datetime64 or category codes
+        self.categories = categories  # Name of each categorical column to its array of categories
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()), ()))
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Builds the columns from the rows of Back Test Data.
+
+        Args:
+            rows (iterable of dict): Header to cell value.
+        """
+        batch = ResultBatch(TEXT_COLUMNS + ('From', 'To'), (INPUT_PREFIX,))
+        for row in rows:
+            batch.append({**row, **describe(row)})
+        return cls.from_batch(batch)
+
+    @classmethod
+    def from_batch(cls, batch):
+        """
+        Builds the columns from a ResultBatch whose text columns are the description columns (see `describe`).
+        """
+        columns, categories = {}, {}
+        for name, raw in batch.columns.items():
+            if name in ('From', 'To'):
+                columns[name] = np.array(['NaT' if value is None else value for value in raw], dtype='datetime64[D]')
+            elif name in TEXT_COLUMNS or (name.startswith(INPUT_PREFIX) and not all(is_number(value) for value in raw)):
+                categories[name], columns[name] = categorical(raw)
+            elif isinstance(raw, list):
+                columns[name] = np.array([parse_number(value) for value in raw], dtype=float)
+            else:
+                columns[name] = np.frombuffer(raw, dtype=float)
+        return cls(columns, categories)
+
+    def take(self, indices):
+        """
+        Returns a table with the rows at `indices` (an index array or a boolean mask).
+        """
+        return ResultTable({name: column[indices] for name, column in self.columns.items()}, self.categories)
+
+    def column(self, name):
+        if name not in self.columns:
+            raise KeyError(f"Unknown column '{name}'. The columns are: {', '.join(self.columns)}")
+        return self.columns[name]
+
+    def codes_of(self, name, values):
+        """
+        Returns the codes of the categories `values` of the categorical column `name`.
+        """
+        values = [values] if isinstance(values, str) else list(values)
+        categories = self.categories[name]
+        positions = np.searchsorted(categories, values)
+        return [int(p) for p, value in zip(positions, values) if p < len(categories) and categories[p] == value]
+
+    def matches(self, name, value):
+        """
+        Returns a boolean mask of the rows whose column `name` equals `value`. `value` can also be a list of accepted
+        values or, for numeric columns, a (low, high) tuple of an inclusive range in which either bound can be None.
+        """
+        column = self.column(name)
+        if name in self.categories:
+            return np.isin(column, self.codes_of(name, value))
+        if isinstance(value, tuple):
+            low, high = value
+            mask = np.ones(len(column), dtype=bool)
+            if low is not None:
+                mask &= column >= float(low)
+            if high is not None:
+                mask &= column <= float(high)
+            return mask
+        values = [value] if isinstance(value, (int, float, str)) else value
+        return np.isin(column, [float(v) for v in values])
+
+    def condition(self, text):
+        """
+        Returns a boolean mask of the rows which meet a condition like "Profit factor>1.5" or "Symbol==EURUSD".
+        """
+        match = CONDITION.match(text)
+        if not match:
+            raise ValueError(f"Invalid condition '{text}'")
+        name, operator, value = match.groups()
+        if name in self.categories:
+            if operator not in ('==', '!='):
+                raise ValueError(f"Only == and != can be used with the text column '{name}'")
+            mask = self.matches(name, value)
+            return mask if operator == '==' else ~mask
+        column = self.column(name)
+        if column.dtype.kind == 'M':
+            return OPERATORS[operator](column, np.datetime64(value.replace('.', '-'), 'D'))
+        return OPERATORS[operator](column, float(value))
+
+    def filter(self, expert=None, symbol=None, period=None, model=None, from_date=None, to_date=None, inputs=None, where=None):
+        """
+        Returns the rows which match all of the given filters. Each of `expert`, `symbol`, `period` and `model` can be
+        a value or a list of accepted values.
+
+        Args:
+            from_date (str): Only tests which start on or after this date (yyyy-mm-dd).
+            to_date (str): Only tests which end on or before this date (yyyy-mm-dd).
+            inputs (dict): Input name to a value, a list of values or a (low, high) range, e.g. {'Lots': 0.1}.
+            where (list of str): Conditions like "Profit factor>1.5".
+
+        Returns:
+            ResultTable: The matching rows.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for name, value in (('Expert', expert), ('Symbol', symbol), ('Period', period), ('Model', model)):
+            if value is not None:
+                values = [value] if isinstance(value, str) else value
+                mask &= self.matches(name, [normalize(name, value) for value in values])
+        if from_date:
+            mask &= self.column('From') >= np.datetime64(str(from_date)[:10], 'D')
+        if to_date:
+            mask &= self.column('To') <= np.datetime64(str(to_date)[:10], 'D')
+        for name, value in (inputs or {}).items():
+            mask &= self.matches(INPUT_PREFIX + name, value)
+        for text in where or ():
+            mask &= self.condition(text)
+        return self.take(mask)
+
+    def score(self, by):
+        """
+        Returns the score of every row, where a higher score is better.
+
+        Args:
+            by (str or dict): A metric, or metric to weight for a composite score. The metrics of a composite score
+                are standardized first, so a weight of -0.5 for "Relative drawdown" means half as important as a weight
+                of 1 and lower is better. Rows without a value of one of the metrics have no score (NaN).
+        """
+        if isinstance(by, str):
+            return self.column(by).astype(float)
+        total = np.zeros(len(self))
+        for name, weight in by.items():
+            column = self.column(name).astype(float)
+            deviation = np.nanstd(column) or 1.0
+            total += weight * (column - np.nanmean(column)) / deviation
+        return total
+
+    def top(self, by, k=10, group_by=None, ascending=False):
+        """
+        Returns the best `k` rows overall or in each group.
+
+        Args:
+            by (str or dict): A metric or composite score (see `score`).
+            k (int): The number of rows to keep overall or per group.
+            group_by (list of str): The columns whose combinations of values make the groups, e.g. ['Symbol', 'Period'].
+            ascending (bool): Whether lower values are better.
+
+        Returns:
+            ResultTable: The selected rows, ordered by group and then from best to worst, with the score in the 'score' column.
+        """
+        scores = self.score(by)
+        keys = -scores if not ascending else scores.copy()
+        keys[np.isnan(keys)] = np.inf  # Rows without a value come last
+
+        if not group_by:
+            if k < len(keys):
+                best = np.argpartition(keys, k)[:k]
+                order = best[np.argsort(keys[best], kind='stable')]
+            else:
+                order = np.argsort(keys, kind='stable')
+        else:
+            # Category codes and dates are stacked as integers, since numpy can't stack them together as they are
+            group_keys = np.stack([self.column(name).astype(np.int64) if name in self.categories or self.column(name).dtype.kind == 'M'
+                                   else self.column(name) for name in group_by], axis=1)
+            _, groups = np.unique(group_keys, axis=0, return_inverse=True)
+            groups = groups.ravel()
+            order = np.lexsort((keys, groups))
+            sorted_groups = groups[order]
+            positions = np.arange(len(order))
+            starts = np.r_[True, sorted_groups[1:] != sorted_groups[:-1]] if len(order) else np.zeros(0, dtype=bool)
+            rank = positions - np.maximum.accumulate(np.where(starts, positions, 0))
+            order = order[rank < k]
+
+        table = self.take(order)
+        table.columns['score'] = scores[order]
+        return table
+
+    def rows(self, names=None):
+        """
+        Returns the rows as dictionaries of column name to value, decoding the categorical columns.
+        """
+        names = names or list(self.columns)
+        decoded = {}
+        for name in names:
+            column = self.column(name)
+            if name in self.categories:
+                categories = np.append(self.categories[name], '')  # Code -1 becomes ''
+                decoded[name] = categories[column].tolist()
+            elif column.dtype.kind == 'M':
+                decoded[name] = [str(value) if not np.isnat(value) else '' for value in column]
+            else:
+                decoded[name] = column.tolist()
+        return [dict(zip(names, values)) for values in zip(*(decoded[name] for name in names))]
+
+    def save(self, cache_path, signature):
+        arrays = {f'column:{name}': column for name, column in self.columns.items()}
+        arrays.update({f'categories:{name}': categories for name, categories in self.categories.items()})
+        arrays['meta'] = np.array(json.dumps({'version': CACHE_VERSION, 'signature': signature, 'order': list(self.columns)}))
+        with open(cache_path, 'wb') as file:
+            np.savez(file, **arrays)
+
+    @classmethod
+    def load_cache(cls, cache_path, signature):
+        """
+        Returns the table cached in `cache_path`, or None if the cache is missing or was built from another workbook.
+        """
+        if not path.exists(cache_path):
+            return None
+        with np.load(cache_path, allow_pickle=False) as cache:
+            meta = json.loads(str(cache['meta']))
+            if meta.get('version') != CACHE_VERSION or meta.get('signature') != signature:
+                return None
+            columns = {name: cache[f'column:{name}'] for name in meta['order']}
+            categories = {key.split(':', 1)[1]: cache[key] for key in cache.files if key.startswith('categories:')}
+        return cls(columns, categories)
+
+def workbook_signature(file_path):
+    status = path.getmtime(file_path), path.getsize(file_path)
+    return f'{path.abspath(file_path)}:{status[0]}:{status[1]}'
+
+def read_rows(file_path):
+    """
+    Yields the rows of the 1st worksheet of a Back Test Data workbook as dictionaries of header to cell value.
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        headers = next(rows, ())
+        for row in rows:
+            if any(value is not None for value in row):
+                yield dict(zip(headers, row))
+    finally:
+        wb.close()
+
+def load_results(file_path, use_cache=True):
+    """
+    Loads a Back Test Data workbook and its shards (see `excel_utils`) into a ResultTable, from its cache if none of
+    them has changed since.
+
+    Args:
+        file_path (str): The path of the Back Test Data workbook.
+        use_cache (bool): Whether to read and write the cache file ([file_path].results.npz).
+
+    Returns:
+        ResultTable: The results.
+    """
+    from itertools import chain
+    from components.excel_utils import shard_paths
+
+    cache_path = file_path + '.results.npz'
+    file_paths = shard_paths(file_path)
+    signature = '|'.join(workbook_signature(shard_path) for shard_path in file_paths)
+    if use_cache:
+        try:
+            table = ResultTable.load_cache(cache_path, signature)
+            if table is not None:
+                return table
+        except Exception as e:
+            logger.error(f"Failed to read the results cache {cache_path}: {e}")
+
+    table = ResultTable.from_rows(chain.from_iterable(read_rows(shard_path) for shard_path in file_paths))
+    logger.info(f"Loaded {len(table)} results from {file_path}" + (f" and {len(file_paths) - 1} more shards" if len(file_paths) > 1 else ''))
+    if use_cache:
+        try:
+            table.save(cache_path, signature)
+        except Exception as e:
+            logger.error(f"Failed to write the results cache {cache_path}: {e}")
+    return table
+
+def parse_inputs(entries):
+    """
+    Parses --input arguments like "Lots=0.1", "Lots=0.1|0.2" or "TakeProfit=20:100" (an inclusive range).
+    """
+    inputs = {}
+    for entry in entries or ():
+        name, value = entry.split('=', 1)
+        if ':' in value:
+            low, high = value.split(':', 1)
+            inputs[name.strip()] = (low or None, high or None)
+        elif '|' in value:
+            inputs[name.strip()] = [v.strip() for v in value.split('|')]
+        else:
+            inputs[name.strip()] = value.strip()
+    return inputs
+
+def parse_weights(text):
+    """
+    Parses a --score argument like "Profit factor=1,Relative drawdown=-0.5".
+    """
+    return {name.strip(): float(weight) for name, weight in (entry.rsplit('=', 1) for entry in text.split(','))}
+
+def format_table(rows, names):
+    """
+    Returns `rows` as text with aligned columns.
+    """
+    def cell(value):
+        return f'{value:.4g}' if isinstance(value, float) else str(value)
+
+    lines = [[cell(row[name]) for name in names] for row in rows]
+    widths = [max([len(name)] + [len(line[i]) for line in lines]) for i, name in enumerate(names)]
+    output = ['  '.join(name.ljust(width) for name, width in zip(names, widths))]
+    output += ['  '.join(value.ljust(width) for value, width in zip(line, widths)) for line in lines]
+    return '\n'.join(output)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Filters and ranks the results in a Back Test Data workbook.')
+    parser.add_argument('file', help='The Back Test Data workbook.')
+    parser.add_argument('--expert', action='append', help='Only this EA. Can be repeated.')
+    parser.add_argument('--symbol', action='append', help='Only this symbol, e.g. EURUSD. Can be repeated.')
+    parser.add_argument('--period', action='append', help='Only this period, e.g. H1. Can be repeated.')
+    parser.add_argument('--model', action='append', help='Only this model, e.g. "Every tick". Can be repeated.')
+    parser.add_argument('--from', dest='from_date', help='Only tests which start on or after this date (yyyy-mm-dd).')
+    parser.add_argument('--to', dest='to_date', help='Only tests which end on or before this date (yyyy-mm-dd).')
+    parser.add_argument('--input', action='append', help='An input value, e.g. Lots=0.1, Lots=0.1|0.2 or TakeProfit=20:100.')
+    parser.add_argument('--where', action='append', help='A condition, e.g. "Profit factor>1.5". Can be repeated.')
+    parser.add_argument('--rank', default='Total net profit', help='The metric to rank by.')
+    parser.add_argument('--score', help='A composite score to rank by, e.g. "Profit factor=1,Relative drawdown=-0.5".')
+    parser.add_argument('--ascending', action='store_true', help='Lower values are better.')
+    parser.add_argument('--group-by', help='Comma separated columns, e.g. Symbol,Period. The top rows of each group are shown.')
+    parser.add_argument('--top', type=int, default=10, help='The number of rows to show overall or per group.')
+    parser.add_argument('--columns', help='Comma separated columns to show.')
+    parser.add_argument('--no-cache', action='store_true', help='Read the workbook even if it is cached.')
+    args = parser.parse_args(argv)
+
+    table = load_results(args.file, use_cache=not args.no_cache)
+    table = table.filter(args.expert, args.symbol, args.period, args.model, args.from_date, args.to_date,
+                         parse_inputs(args.input), args.where)
+    by = parse_weights(args.score) if args.score else args.rank
+    group_by = [name.strip() for name in args.group_by.split(',')] if args.group_by else []
+    best = table.top(by, args.top, group_by, args.ascending)
+
+    if args.columns:
+        names = [name.strip() for name in args.columns.split(',')]
+    else:
+        metrics = list(by) if isinstance(by, dict) else [by]
+        names = list(dict.fromkeys(group_by + ['Expert', 'Symbol', 'Period', 'Model', 'From', 'To'] + metrics + ['score', 'Source File']))
+        names = [name for name in names if name in best.columns]
+    print(f'{len(table)} matching results')
+    print(format_table(best.rows(names), names))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+'''
+This module remembers which rows of the Settings file have been tested, so that a run which was stopped can be resumed.
+Rows are identified by a fingerprint of their values, which stays the same when rows are reordered in the Settings file.
+
+The state file is a JSON object of fingerprint to {"status": "done" or "cancelled", "time": [timestamp], "expert": [Expert]}.
+'''
+
+import hashlib
+import json
+from os import path, replace
+from threading import Lock
+from time import time
+from components.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+RUN_STATE_FILE = 'run_state.json'
+DERIVED_KEYS = ('Variant', 'Optimizer')  # Keys which are added to the settings during a run and are not part of the row
+
+def fingerprint(settings):
+    """
+    Returns a fingerprint of the values of a row of the Settings file.
+    """
+    values = {key: value for key, value in settings.items() if key not in DERIVED_KEYS}
+    text = json.dumps(values, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+class RunState:
+    def __init__(self, state_path=RUN_STATE_FILE):
+        self.state_path = state_path
+        self.jobs = {}  # Fingerprint to the recorded status of the row
+        self.lock = Lock()
+        self.load()
+
+    def load(self):
+        """
+        Loads the state of previous runs from `self.state_path`, if it exists.
+        """
+        try:
+            if path.exists(self.state_path):
+                with open(self.state_path) as file:
+                    self.jobs = json.load(file)
+        except Exception as e:
+            logger.error(f"Failed to load the run state from {self.state_path}: {e}")
+
+    def save(self):
+        """
+        Writes the state atomically, so that a run which is killed never leaves a partial file.
+        """
+        try:
+            with self.lock:
+                jobs = dict(self.jobs)
+            temporary_path = self.state_path + '.tmp'
+            with open(temporary_path, 'w') as file:
+                json.dump(jobs, file, indent=2)
+            replace(temporary_path, self.state_path)
+        except Exception as e:
+            logger.error(f"Failed to save the run state to {self.state_path}: {e}")
+
+    def mark(self, settings, status):
+        """
+        Records the `status` ('done' or 'cancelled') of the row `settings` and saves the state.
+        """
+        with self.lock:
+            self.jobs[fingerprint(settings)] = {'status': status, 'time': time(), 'expert': settings.get('Expert')}
+        self.save()
+
+    def status(self, settings):
+        """
+        Returns the recorded status of the row `settings`, or None if it has not been tested.
+        """
+        with self.lock:
+            job = self.jobs.get(fingerprint(settings))
+        return job['status'] if job else None
+
+    def is_done(self, settings):
+        return self.status(settings) == 'done'
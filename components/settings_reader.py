@@ -1,5 +1,6 @@
 from openpyxl import load_workbook
 from components.logger import setup_logger
+from components.records import TestJob
 
 logger = setup_logger(__name__)
 
@@ -51,3 +52,17 @@ class SettingsReader:
             self.logger.error(f"An unexpected error occurred: {e}")
             raise
 
+    def read_jobs(self):
+        """
+        Reads the Excel file and parses each row into a TestJob. Rows with invalid values are logged and left out.
+
+        Returns:
+            list of TestJob: The tests of the rows, in the order of the Excel sheet.
+        """
+        jobs = []
+        for settings in self.read_settings():
+            try:
+                jobs.append(TestJob.from_row(settings))
+            except ValueError as ve:
+                self.logger.error(f"Skipping the row of '{settings.get('Expert')}' in the Settings file: {ve}")
+        return jobs
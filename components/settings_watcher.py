@@ -0,0 +1,90 @@
+'''
+This module watches the Settings file during a run, so that rows can be added, edited or deleted without restarting.
+
+The file is read again when its modification time or size changes. Each row is identified by the fingerprint of its
+values (see `run_state.fingerprint`), so rows can be moved around freely:
+- a row whose fingerprint is new was added, and its tests are appended to the run,
+- a row whose fingerprint is gone was deleted, and its tests which have not run yet are cancelled.
+An edited row is both, so its tests which have not run yet are replaced by the tests of its new values. Rows which are
+the same as before keep their TestJob, so the tests planned from them are recognized by their `row`.
+'''
+
+from dataclasses import dataclass, field
+from os import stat
+from components.logger import setup_logger
+from components.run_state import fingerprint
+from components.settings_reader import SettingsReader
+
+logger = setup_logger(__name__)
+
+@dataclass
+class SettingsChanges:
+    added: list = field(default_factory=list)  # TestJob of each new row
+    removed: list = field(default_factory=list)  # TestJob of each row which was deleted or edited
+
+    @property
+    def removed_rows(self):
+        """
+        Returns the id of the row of each removed test, which the tests planned from it share, to the row. Holding the
+        rows keeps their ids from being reused.
+        """
+        return {id(job.row): job.row for job in self.removed}
+
+    def __bool__(self):
+        return bool(self.added or self.removed)
+
+class SettingsWatcher:
+    def __init__(self, settings_excel_path):
+        self.settings_reader = SettingsReader(settings_excel_path)
+        self.settings_excel_path = settings_excel_path
+        self.signature = None  # Modification time and size of the file when it was read
+        self.jobs = []  # TestJob of each row of the file as it was last read
+
+    def file_signature(self):
+        status = stat(self.settings_excel_path)
+        return status.st_mtime, status.st_size
+
+    def read(self):
+        """
+        Reads the rows of the Settings file like `SettingsReader.read_jobs`, and remembers them to compare later reads with.
+
+        Returns:
+            list of TestJob: The tests of the rows.
+        """
+        self.signature = self.file_signature()
+        self.jobs = self.settings_reader.read_jobs()
+        return list(self.jobs)
+
+    def poll(self):
+        """
+        Reads the Settings file again if it has changed since it was last read.
+
+        Returns:
+            SettingsChanges: The rows which were added and removed, which is empty if nothing changed.
+        """
+        try:
+            signature = self.file_signature()
+            if signature == self.signature:
+                return SettingsChanges()
+            jobs = self.settings_reader.read_jobs()
+        except Exception as e:  # E.g. while Excel is saving the file. It is read again at the next poll
+            logger.error(f"Failed to read the changed Settings file {self.settings_excel_path}: {e}")
+            return SettingsChanges()
+
+        known = {}  # Fingerprint to the rows read before, one for each copy of a row
+        for job in self.jobs:
+            known.setdefault(fingerprint(job.row), []).append(job)
+        current, changes = [], SettingsChanges()
+        for job in jobs:
+            same = known.get(fingerprint(job.row))
+            if same:
+                current.append(same.pop(0))
+            else:
+                current.append(job)
+                changes.added.append(job)
+        changes.removed = [job for same in known.values() for job in same]
+
+        self.signature, self.jobs = signature, current
+        if changes:
+            logger.info(f"The Settings file changed: {len(changes.added)} rows added and {len(changes.removed)} removed")
+        return changes
@@ -0,0 +1,94 @@
+'''
+This module keeps the handles of the controls of the Strategy Tester window so that they don't have to be looked up
+with a cross-process enumeration of the window's children every time one of them is used.
+'''
+
+from dataclasses import dataclass, field, fields
+from pywinauto.handleprops import iswindow
+from components.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+PERIOD_TEXTS = ('M1', 'M5', 'M15', 'M30', 'H1', 'H4', 'Daily', 'Weekly', 'Monthly')
+MODEL_TEXTS = ('Every tick', 'Control points', 'Open prices')
+
+@dataclass
+class TesterControls:
+    '''The controls of the Strategy Tester. A control which was not found is None.'''
+    tester: object = None
+    expert_combo: object = None
+    symbol_combo: object = None
+    period_combo: object = None
+    model_combo: object = None
+    from_date: object = None
+    to_date: object = None
+    use_date: object = None
+    visual_mode: object = None
+    start: object = None
+    handles: list = field(default_factory=list)  # Handles of the tester and all of the controls that were found
+
+    @classmethod
+    def resolve(cls, tester):
+        """
+        Finds the controls of the Strategy Tester by enumerating its children once.
+
+        Args:
+            tester (HwndWrapper): The Strategy Tester window.
+
+        Returns:
+            TesterControls: The controls that were found.
+        """
+        controls = cls(tester=tester)
+        dates = []
+
+        for child in tester.children():
+            class_name = child.class_name()
+            text = child.window_text()
+
+            if class_name == 'ComboBox':
+                if 'ex4' in text:
+                    controls.expert_combo = child
+                elif 'vs' in text or 'NOKSEK' in text:
+                    controls.symbol_combo = child
+                elif any(model in text for model in MODEL_TEXTS):
+                    controls.model_combo = child
+                elif any(period in text for period in PERIOD_TEXTS):
+                    controls.period_combo = child
+            elif class_name == 'SysDateTimePick32':
+                dates.append(child)
+            elif class_name == 'Button':
+                if text == 'Use date':
+                    controls.use_date = child
+                elif text == 'Visual mode':
+                    controls.visual_mode = child
+                elif text in ('Start', 'Stop'):
+                    controls.start = child
+
+        if len(dates) >= 2:
+            controls.from_date, controls.to_date = dates[0], dates[1]
+
+        controls.handles = [control.handle for control in (getattr(controls, f.name) for f in fields(cls) if f.name != 'handles') if control is not None]
+        logger.info(f"Resolved the controls of the Strategy Tester: {controls.found()}")
+        return controls
+
+    def found(self):
+        """
+        Returns the names of the controls that were found.
+        """
+        return [f.name for f in fields(self) if f.name not in ('tester', 'handles') and getattr(self, f.name) is not None]
+
+    def is_stale(self, tester_handle=None):
+        """
+        Checks if the controls can no longer be used because a window was destroyed or the Strategy Tester was recreated.
+
+        Args:
+            tester_handle (int): The handle of the current Strategy Tester window, if it is known.
+
+        Returns:
+            bool: True if the controls have to be resolved again, False otherwise.
+        """
+        if self.tester is None:
+            return True
+        if tester_handle is not None and tester_handle != self.tester.handle:
+            return True
+        return not all(iswindow(handle) for handle in self.handles)
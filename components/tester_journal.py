@@ -0,0 +1,122 @@
+'''
+This module follows the journal of the Strategy Tester, which MT4 writes to [data folder]\\tester\\logs\\[yyyymmdd].log.
+It is used to find out when a back test has finished and which errors the Expert Advisor printed while it ran.
+'''
+
+import codecs
+import re
+from os import path, listdir
+from components.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# A line matching any of these is written when a test ends
+FINISH_PATTERNS = [
+    re.compile(r'tick events .*processed (?:in|within)', re.IGNORECASE),
+    re.compile(r'\btest(?:ing)? (?:stopped|finished)\b', re.IGNORECASE),
+]
+
+# A line matching any of these is an error printed by the EA or the tester
+ERROR_PATTERNS = [
+    re.compile(r'\berror\b', re.IGNORECASE),
+    re.compile(r'\bcannot\b', re.IGNORECASE),
+    re.compile(r'\bcritical\b', re.IGNORECASE),
+    re.compile(r'zero divide', re.IGNORECASE),
+    re.compile(r'array out of range', re.IGNORECASE),
+]
+
+class TesterJournal:
+    def __init__(self, data_folder):
+        self.logs_folder = path.join(data_folder, 'tester', 'logs')
+        self.file_path = None
+        self.offset = 0
+        self.decoder = None
+        self.partial_line = ''
+        self.finished = False
+        self.errors = []
+
+    def latest_log(self):
+        """
+        Returns the path of the newest journal file, or None if there is none.
+        """
+        logs = [f for f in listdir(self.logs_folder) if f.endswith('.log')]
+        return path.join(self.logs_folder, max(logs)) if logs else None  # Journal files are named by date
+
+    def start(self):
+        """
+        Starts following the journal from its current end, so that only the lines of the next test are read.
+
+        Returns:
+            bool: True if the journal can be followed, False otherwise.
+        """
+        try:
+            self.finished = False
+            self.errors = []
+            self.partial_line = ''
+            self.file_path = self.latest_log()
+            self.offset = path.getsize(self.file_path) if self.file_path else 0
+            self.decoder = None
+            return True
+        except Exception as e:
+            logger.error(f"Failed to start following the tester journal in {self.logs_folder}: {e}")
+            return False
+
+    def open_decoder(self, file):
+        """
+        Creates an incremental decoder for the encoding of the journal file, which is UTF-16 in newer MT4 builds and ANSI in older ones.
+        """
+        file.seek(0)
+        head = file.read(2)
+        encoding = 'utf-16-le' if head == b'\xff\xfe' else 'cp1252'
+        if self.offset == 0 and head == b'\xff\xfe':
+            self.offset = 2  # Skip the byte order mark
+        self.decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+
+    def read_new_lines(self):
+        """
+        Reads the lines that were appended to the journal since the last call.
+
+        Returns:
+            list of str: The new complete lines.
+        """
+        latest = self.latest_log()
+        if latest != self.file_path:  # A new journal file is started every day
+            self.file_path, self.offset, self.decoder, self.partial_line = latest, 0, None, ''
+        if not self.file_path or path.getsize(self.file_path) <= self.offset:
+            return []
+
+        with open(self.file_path, 'rb') as file:
+            if self.decoder is None:
+                self.open_decoder(file)
+            file.seek(self.offset)
+            data = file.read()
+        self.offset += len(data)
+
+        text = self.partial_line + self.decoder.decode(data)
+        lines = text.split('\n')
+        self.partial_line = lines.pop()  # The last line may not have been fully written yet
+        return [line.rstrip('\r') for line in lines]
+
+    def poll(self, monitor=None):
+        """
+        Reads the new lines of the journal, collects the errors in them and checks if the test has finished.
+
+        Args:
+            monitor (abort_rules.TestMonitor): Receives every new line to check the abort rules of the test.
+
+        Returns:
+            bool: True if the journal shows that the test has finished, False otherwise.
+        """
+        try:
+            for line in self.read_new_lines():
+                if monitor:
+                    monitor.feed(line)
+                if any(pattern.search(line) for pattern in ERROR_PATTERNS):
+                    self.errors.append(line.strip())
+                    logger.warning(f"Tester journal: {line.strip()}")
+                if any(pattern.search(line) for pattern in FINISH_PATTERNS):
+                    logger.info(f"Tester journal reports that the test has finished: {line.strip()}")
+                    self.finished = True
+        except Exception as e:
+            logger.error(f"Failed to read the tester journal {self.file_path}: {e}")
+        return self.finished
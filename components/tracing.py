@@ -0,0 +1,194 @@
+'''
+This module measures how long every stage of a back test takes.
+Each measured stage (a span) is written as one JSON line to a trace file, which can be exported in the Chrome trace event
+format and opened in chrome://tracing or https://ui.perfetto.dev.
+
+Tracing is off unless `tracer.enable` is called, the BACKTEST_TRACE environment variable is set to the path of a trace file,
+or a listener (like the metrics) is added. While it is off, a traced function costs one attribute check.
+
+Usage to export a trace:
+    python -m components.tracing [trace file] [output file]
+'''
+
+import json
+import sys
+from functools import wraps
+from os import getenv, getpid
+from threading import Lock, get_ident
+from time import perf_counter, time
+from components.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+class Tracer:
+    def __init__(self):
+        self.file = None
+        self.lock = Lock()
+        self.enabled = False
+        self.listeners = []  # Functions called with the name, duration in seconds and args of every finished span
+        # Difference between the wall clock and `perf_counter`, so that spans get precise absolute timestamps
+        self.clock_offset = time() - perf_counter()
+
+    def enable(self, trace_path):
+        """
+        Starts appending spans to the trace file at `trace_path`.
+        """
+        with self.lock:
+            if self.file:
+                self.file.close()
+            self.file = open(trace_path, 'a', buffering=1)
+            self.enabled = True
+        logger.info(f"Tracing to {trace_path}")
+
+    def disable(self):
+        """
+        Stops tracing and closes the trace file.
+        """
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+            self.enabled = bool(self.listeners)
+
+    def add_listener(self, listener):
+        """
+        Calls `listener` with the name, duration in seconds and args of every finished span, even if no trace file is written.
+        """
+        with self.lock:
+            self.listeners.append(listener)
+            self.enabled = True
+
+    def remove_listener(self, listener):
+        with self.lock:
+            if listener in self.listeners:
+                self.listeners.remove(listener)
+            self.enabled = bool(self.listeners) or self.file is not None
+
+    def write(self, name, start, end, args):
+        """
+        Writes a finished span to the trace file and passes it to the listeners.
+
+        Args:
+            name (str): The name of the stage.
+            start (float): The `perf_counter` value when the stage started.
+            end (float): The `perf_counter` value when the stage ended.
+            args (dict): Extra information about the span.
+        """
+        for listener in self.listeners:
+            listener(name, end - start, args)
+        if self.file is None:
+            return
+
+        record = {
+            'name': name,
+            'ts': round((start + self.clock_offset) * 1e6),  # Microseconds since the epoch
+            'dur': round((end - start) * 1e6),
+            'pid': getpid(),
+            'tid': get_ident(),
+            'args': args,
+        }
+        line = json.dumps(record, default=str)
+        with self.lock:
+            if self.file:
+                self.file.write(line + '\n')
+
+tracer = Tracer()
+
+class Span:
+    '''Measures the time between entering and exiting a `with` block.'''
+    __slots__ = ('name', 'args', 'start')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args['error'] = repr(exc)
+        tracer.write(self.name, self.start, perf_counter(), self.args)
+        return False
+
+class NullSpan:
+    '''Used instead of a Span while tracing is off.'''
+    __slots__ = ('args',)
+
+    def __init__(self):
+        self.args = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+NULL_SPAN = NullSpan()
+
+def span(name, **args):
+    """
+    Returns a context manager which records the time spent in its `with` block as the stage `name`.
+
+    Args:
+        name (str): The name of the stage.
+        **args: Extra information to store with the span.
+    """
+    if not tracer.enabled:
+        return NULL_SPAN
+    return Span(name, args)
+
+def traced(func):
+    """
+    Decorator which records every call of `func` as a span named after its qualified name.
+    The return value is stored with the span because the functions of this application return whether they succeeded.
+    """
+    name = func.__qualname__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not tracer.enabled:
+            return func(*args, **kwargs)
+        with Span(name, {}) as current:
+            result = func(*args, **kwargs)
+            if isinstance(result, bool):
+                current.args['result'] = result
+            return result
+
+    return wrapper
+
+def export_chrome_trace(trace_path, output_path):
+    """
+    Converts a JSON-lines trace file into the Chrome trace event format.
+
+    Args:
+        trace_path (str): The path of the trace file written by `tracer`.
+        output_path (str): The path of the JSON file to write.
+
+    Returns:
+        int: The number of exported spans.
+    """
+    events = []
+    with open(trace_path) as file:
+        for line in file:
+            if line.strip():
+                record = json.loads(line)
+                record['ph'] = 'X'  # Complete event, which has a start and a duration
+                record['cat'] = record['name'].split('.')[0]
+                events.append(record)
+
+    with open(output_path, 'w') as file:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+    return len(events)
+
+if getenv('BACKTEST_TRACE'):
+    tracer.enable(getenv('BACKTEST_TRACE'))
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print('Usage: python -m components.tracing [trace file] [output file]')
+        sys.exit(1)
+    count = export_chrome_trace(sys.argv[1], sys.argv[2])
+    print(f'Exported {count} spans to {sys.argv[2]}')
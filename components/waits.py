@@ -0,0 +1,143 @@
+'''
+This module waits for conditions in the MT4 user interface instead of sleeping for fixed amounts of time.
+A condition is polled at short intervals which grow exponentially. The time that every step took is recorded so that
+the timeout of a step adapts to how fast the user interface has been on this machine.
+
+If a `cancel_event` is given, every wait returns False as soon as it is set instead of running until its timeout.
+'''
+
+import json
+from collections import deque
+from os import path
+from threading import Lock
+from time import monotonic, sleep
+from components.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+FIRST_INTERVAL = 0.02  # Seconds before the condition is checked again for the first time
+MAX_INTERVAL = 0.5  # Upper bound of the time between two checks
+BACKOFF = 1.5  # Factor by which the interval grows after each unsuccessful check
+MIN_TIMEOUT = 0.25
+TIMEOUT_FACTOR = 3  # The adaptive timeout of a step is this many times its 95th percentile latency
+SAMPLES_KEPT = 50  # Number of latencies kept per step
+LATENCIES_FILE = 'wait_latencies.json'
+
+class AdaptiveWaiter:
+    def __init__(self, latencies_file=LATENCIES_FILE, cancel_event=None):
+        self.latencies_file = latencies_file
+        self.cancel_event = cancel_event  # threading.Event which cancels the waits when it is set
+        self.latencies = {}  # Step name to a deque of the latest latencies of that step in seconds
+        self.lock = Lock()
+        self.load()
+
+    def load(self):
+        """
+        Loads the latencies recorded in previous runs from `self.latencies_file`, if it exists.
+        """
+        try:
+            if path.exists(self.latencies_file):
+                with open(self.latencies_file) as file:
+                    for step, samples in json.load(file).items():
+                        self.latencies[step] = deque(samples, maxlen=SAMPLES_KEPT)
+        except Exception as e:
+            logger.error(f"Failed to load the wait latencies from {self.latencies_file}: {e}")
+
+    def save(self):
+        """
+        Saves the recorded latencies to `self.latencies_file` so that the next run starts with adapted timeouts.
+        """
+        try:
+            with self.lock:
+                latencies = {step: list(samples) for step, samples in self.latencies.items()}
+            with open(self.latencies_file, 'w') as file:
+                json.dump(latencies, file)
+        except Exception as e:
+            logger.error(f"Failed to save the wait latencies to {self.latencies_file}: {e}")
+
+    def record(self, step, latency):
+        """
+        Records how long `step` took in seconds.
+        """
+        with self.lock:
+            self.latencies.setdefault(step, deque(maxlen=SAMPLES_KEPT)).append(round(latency, 4))
+
+    def latency_for(self, step, default=None):
+        """
+        Returns the 95th percentile latency of `step`, or `default` if it has not been recorded yet.
+        """
+        with self.lock:
+            samples = sorted(self.latencies.get(step, ()))
+        if not samples:
+            return default
+        return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+    def timeout_for(self, step, max_timeout, min_timeout=MIN_TIMEOUT):
+        """
+        Returns the timeout of `step`, which is a multiple of its 95th percentile latency bounded by `min_timeout` and `max_timeout`.
+        `max_timeout` is used for steps which have not been recorded yet.
+        """
+        p95 = self.latency_for(step)
+        if p95 is None:
+            return max_timeout
+        return min(max_timeout, max(min_timeout, p95 * TIMEOUT_FACTOR))
+
+    def is_cancelled(self):
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    def pause(self, seconds):
+        """
+        Sleeps for `seconds`, or less if the waits are cancelled in the meantime.
+
+        Returns:
+            bool: True if the waits were cancelled, False otherwise.
+        """
+        if self.cancel_event is None:
+            sleep(seconds)
+            return False
+        return self.cancel_event.wait(seconds)
+
+    def wait_until(self, step, condition, max_timeout, min_timeout=MIN_TIMEOUT, record_timeout=True):
+        """
+        Polls `condition` with exponential backoff until it returns a truthy value, the adaptive timeout of `step` runs out
+        or the waits are cancelled.
+        Exceptions raised by `condition` count as the condition not being met yet.
+
+        Args:
+            step (str): The name under which the latency of this wait is recorded.
+            condition (callable): A function without arguments which returns a truthy value once the wait is over.
+            max_timeout (float): The longest time to wait in seconds.
+            min_timeout (float): The shortest time to wait in seconds.
+            record_timeout (bool): Whether a timeout makes the next timeout of `step` longer. This should be False for
+                waits which are expected to time out, like detecting the end of a list.
+
+        Returns:
+            bool: True if the condition was met, False if the wait timed out or was cancelled.
+        """
+        timeout = self.timeout_for(step, max_timeout, min_timeout)
+        start = monotonic()
+        interval = FIRST_INTERVAL
+
+        while not self.is_cancelled():
+            try:
+                if condition():
+                    self.record(step, monotonic() - start)
+                    return True
+            except Exception:
+                pass
+
+            elapsed = monotonic() - start
+            if elapsed >= timeout:
+                break
+            if self.pause(min(interval, timeout - elapsed)):
+                break
+            interval = min(interval * BACKOFF, MAX_INTERVAL)
+
+        if self.is_cancelled():
+            logger.info(f"Cancelled the wait for step '{step}'")
+            return False
+
+        if record_timeout:  # Record the timeout itself so that the next timeout of this step becomes longer, up to `max_timeout`
+            self.record(step, timeout)
+        logger.info(f"Timed out after {timeout:.2f}s waiting for step '{step}'")
+        return False
@@ -3,10 +3,12 @@ import tkinter as tk
 from tkinter import messagebox, filedialog
 from re import sub
 from os import listdir, path as os_path
-from main import main as run_main
+from components.progress import ProgressReporter, ProgressState
 from datetime import datetime
 import threading
 
+PROGRESS_POLL_MS = 250  # How often the GUI applies the progress events published by the worker thread
+
 def resource_path(relative_path):
     try:
         base_path = sys._MEIPASS
@@ -17,6 +19,12 @@ def resource_path(relative_path):
 
 # Global variable to signal the stopping of the thread
 stop_event = threading.Event()
+# Global variable to signal stopping immediately, in the middle of a test
+abort_event = threading.Event()
+
+# Progress events of the worker thread. Only the Tk main loop reads them and updates the widgets
+progress = ProgressReporter()
+progress_state = ProgressState()
 
 def clean_path(input_path: str):
     """Strip whitespaces and remove single/double quotes."""
@@ -57,36 +65,66 @@ def select_exe_file(entry):
     entry.delete(0, tk.END)
     entry.insert(0, file_path)
 
-def run_main_thread(report_data_excel_path, settings_excel_path, html_reports_path, mt4_exe_path, me_exe_path, chrome_profile_path):
+def run_main_thread(report_data_excel_path, settings_excel_path, html_reports_path, mt4_exe_path, me_exe_path, chrome_profile_path, resume):
     """
-    Runs the main function in a separate thread and updates the GUI with the completion status.
-
-    Raises:
-        Exception: If an error occurs during the execution of the main function.
+    Runs the main function in a separate thread. The GUI is only updated through the progress events, because Tk widgets
+    and variables must not be touched from this thread, so `resume` is read from its checkbox before the thread starts.
     """
-    global stop_event, finished_label, html_report_label
-    
+    global stop_event, abort_event, progress
+
     try:
+        from main import main as run_main  # Imported here so that the window opens without waiting for the heavy imports
+
         # Run main function from main.py
-        run_main(stop_event, report_data_excel_path, settings_excel_path, html_reports_path, mt4_exe_path, me_exe_path, chrome_profile_path)
-        
-        if not stop_event.is_set():
+        run_main(stop_event, report_data_excel_path, settings_excel_path, html_reports_path, mt4_exe_path, me_exe_path, chrome_profile_path,
+                 progress=progress, abort_event=abort_event, resume=resume)
+    except Exception as e:
+        progress.error(f"An error occurred: {e}", fatal=True)
+
+def format_duration(seconds):
+    """Formats a number of seconds as e.g. '2h 05m'."""
+    minutes = int(seconds // 60)
+    return f"{minutes // 60}h {minutes % 60:02d}m"
+
+def update_html_report_label():
+    """Shows the number of HTML reports counted by `progress_state`."""
+    reports_folder = clean_path(reports_folder_path_entry.get())
+    html_report_label.config(text=f'Total HTML Reports currently in "{os_path.basename(reports_folder)}": {progress_state.report_count}')
+
+def poll_progress():
+    """
+    Applies the progress events published by the worker thread and updates the progress panel. This runs on the Tk main
+    loop every `PROGRESS_POLL_MS` milliseconds.
+    """
+    events = progress.drain()
+    for event in events:
+        progress_state.apply(event)
+        if event['kind'] == 'error' and event['fatal']:
+            messagebox.showerror("Error", event['message'])
+        elif event['kind'] == 'run_finished' and not event['stopped']:
             # Show "Finished at [time of completion]" message
-            completion_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            completion_time = datetime.fromtimestamp(event['time']).strftime("%Y-%m-%d %H:%M:%S")
             finished_label.config(text=f"Finished at {completion_time}")
             finished_label.grid(row=9, columnspan=2, pady=10)
-    except Exception as e:
-        messagebox.showerror("Error", f"An error occurred: {e}")
-    finally:
-        # Update HTML report count
-        post_execution_report_count = get_html_report_count()
-        reports_folder = clean_path(reports_folder_path_entry.get())
-        html_report_label.config(text=f'Total HTML Reports currently in "{os_path.basename(reports_folder)}": {post_execution_report_count}')
+
+    if events:
+        rate = progress_state.tests_per_hour()
+        eta = progress_state.eta_seconds()
+        current_job_label.config(text=f"Current job: {progress_state.current_job or '-'}")
+        done_label.config(text=f"Done: {progress_state.done}/{progress_state.total} (failed: {progress_state.failed}, skipped: {progress_state.skipped})")
+        rate_label.config(text=f"Tests per hour: {rate:.1f}" if rate else "Tests per hour: -")
+        eta_label.config(text=f"ETA: {format_duration(eta)}" if eta is not None else "ETA: -")
+        last_error_label.config(text=f"Last error: {progress_state.last_error or '-'}")
+        update_html_report_label()
+
+    root.after(PROGRESS_POLL_MS, poll_progress)
 
 def start_app():
-    global stop_event
+    global stop_event, abort_event
     stop_event.clear()
+    abort_event.clear()
     finished_label.grid_forget()
+    progress_state.report_count = get_html_report_count()  # Counted once per run, then updated from the progress events
     
     # Fetch path values from entries, clean them
     html_reports_path = clean_path(reports_folder_path_entry.get())
@@ -129,7 +167,8 @@ def start_app():
             html_reports_path, 
             mt4_exe_path, 
             me_exe_path, 
-            chrome_profile_path
+            chrome_profile_path,
+            resume_var.get()
         )
     ).start()
 
@@ -143,11 +182,16 @@ def stop_app():
     # Update the finished label
     finished_label.config(text="Execution stopped by user.")
     finished_label.grid(row=9, columnspan=2, pady=10)
-    
-    # Update HTML report count
-    post_execution_report_count = get_html_report_count()
-    reports_folder = clean_path(reports_folder_path_entry.get())
-    html_report_label.config(text=f'Total HTML Reports currently in "{os_path.basename(reports_folder)}": {post_execution_report_count}')
+    update_html_report_label()
+
+def stop_now_app():
+    """
+    Stops the application immediately. The running test is stopped and recorded as cancelled, so that it is run again
+    when the run is resumed.
+    """
+    global abort_event
+    abort_event.set()  # Signal the thread to abort the current test
+    stop_app()
 
 # Create the main window
 root = tk.Tk()
@@ -202,8 +246,8 @@ chrome_profile_path_entry.grid(row=6, column=1, padx=10, pady=5)
 chrome_profile_path_entry.insert(0, r"C:\Users\user\AppData\Local\Google\Chrome\User Data\Profile 2")
 
 # Add a label to show the total number of HTML reports
-html_report_count = get_html_report_count()
-html_report_label = tk.Label(root, text=f'Total reports currently in HTML Reports Folder: {html_report_count}')
+progress_state.report_count = get_html_report_count()
+html_report_label = tk.Label(root, text=f'Total reports currently in HTML Reports Folder: {progress_state.report_count}')
 html_report_label.grid(row=7, columnspan=3, padx=10, pady=5)
 
 # Add a Start button
@@ -214,8 +258,30 @@ start_button.grid(row=8, column=0, pady=10)
 stop_button = tk.Button(root, text="Stop", command=stop_app)
 stop_button.grid(row=8, column=1, pady=10)
 
+# Add a Stop now button, which also aborts the running test
+stop_now_button = tk.Button(root, text="Stop now", command=stop_now_app)
+stop_now_button.grid(row=8, column=2, pady=10)
+
 # Add a label to display the completion message
 finished_label = tk.Label(root, text="", font=("Arial", 16))
 
+# Add a panel to show the progress of the run
+progress_frame = tk.LabelFrame(root, text="Progress")
+progress_frame.grid(row=10, columnspan=3, padx=10, pady=5, sticky="we")
+current_job_label = tk.Label(progress_frame, text="Current job: -", anchor="w")
+done_label = tk.Label(progress_frame, text="Done: 0/0", anchor="w")
+rate_label = tk.Label(progress_frame, text="Tests per hour: -", anchor="w")
+eta_label = tk.Label(progress_frame, text="ETA: -", anchor="w")
+last_error_label = tk.Label(progress_frame, text="Last error: -", anchor="w", wraplength=500, justify="left")
+for row, label in enumerate((current_job_label, done_label, rate_label, eta_label, last_error_label)):
+    label.grid(row=row, column=0, padx=5, sticky="w")
+
+# Add a checkbox to skip the rows which were tested in previous runs
+resume_var = tk.BooleanVar(value=False)
+tk.Checkbutton(root, text="Resume (skip rows already tested)", variable=resume_var).grid(row=11, columnspan=3, padx=10, pady=5)
+
+# Apply the progress events of the worker thread on the Tk main loop
+root.after(PROGRESS_POLL_MS, poll_progress)
+
 # Start the main event loop
 root.mainloop()
\ No newline at end of file
@@ -1,21 +1,32 @@
+'''
+Heavy dependencies (openpyxl, pywinauto, psutil, selenium) are imported inside `main` when they are first needed, so that
+importing this module, e.g. from the GUI, is fast.
+'''
+
 import os
-from components.settings_reader import SettingsReader
-from components.mt4_controller import MT4Controller, StrategyTester
+from threading import Lock
+from time import monotonic
 from components.logger import setup_logger
-from components.excel_utils import ExcelUtil
 from components.reports_processor import process_html_file, titles_and_selectors
-from components.browser import ChromeBrowser
-from util import clean_log, keep_log_light
+from components.browser import LazyBrowser
+from components.tracing import span
+from components.metrics import metrics, MetricsServer
+from components.progress import ProgressReporter
+from components.run_state import RunState, RUN_STATE_FILE
+from components.pipeline import IngestStage
+from components.planner import RunHistory, RUN_HISTORY_FILE
+from util import clean_log
 
 logger = setup_logger(__name__)
 
-def process_existing_reports(browser, excel_util, html_reports_path):
+def process_existing_reports(browser, excel_util, html_reports_path, abort_event=None):
     """
     Processes all existing HTML reports in `html_reports_path` before running new tests.
 
     Args:
-        browser (ChromeBrowser): An instance of ChromeBrowser used for processing HTML reports.
+        browser (LazyBrowser): The browser used for processing HTML reports. It is started by the first report.
         excel_util (ExcelUtil): An instance of ExcelUtil used to add data to the Excel file.
+        abort_event (threading.Event): Event to signal stopping immediately. The remaining reports are not processed.
 
     Raises:
         Exception: If an error occurs while processing existing reports.
@@ -23,13 +34,99 @@ def process_existing_reports(browser, excel_util, html_reports_path):
     try:
         html_files = [f for f in os.listdir(html_reports_path) if f.endswith('.html') or f.endswith('.htm')]
         for html_file in html_files:
+            if abort_event is not None and abort_event.is_set():
+                logger.info("Stopped processing existing reports.")
+                return
             report_path = os.path.join(html_reports_path, html_file)
             process_html_file(report_path, browser, excel_util.add_data_to_excel)
+            metrics.report_ingested()
             logger.info(f"Processed existing report: {html_file}")
     except Exception as e:
         logger.error(f"Exception occurred while processing existing reports: {e}")
 
-def main(stop_event, report_data_excel_path, settings_excel_path, html_reports_path, mt4_exe_path, me_exe_path, chrome_profile_path):
+def start_metrics_server(metrics_port, metrics_snapshot_path):
+    """
+    Starts serving the metrics of the run if a port or a snapshot file is given, either as an argument or with the
+    BACKTEST_METRICS_PORT and BACKTEST_METRICS_SNAPSHOT environment variables.
+
+    Returns:
+        MetricsServer: The started server, or None if the metrics are not exposed.
+    """
+    if metrics_port is None and os.getenv('BACKTEST_METRICS_PORT'):
+        metrics_port = int(os.getenv('BACKTEST_METRICS_PORT'))
+    metrics_snapshot_path = metrics_snapshot_path or os.getenv('BACKTEST_METRICS_SNAPSHOT')
+    if metrics_port is None and not metrics_snapshot_path:
+        return None
+    return MetricsServer(metrics_port, metrics_snapshot_path).start()
+
+def plan_jobs(settings_list, report_data_excel_path, optimizer, optimizer_budget, optimizer_metric, workbook_lock):
+    """
+    Turns the rows of the Settings file into the first tests to run. Rows with sweeps in their Expert properties are
+    expanded into every combination, or searched by an Optimizer if `optimizer` is set, in which case the first batch
+    of the search is planned. The tests of a search have the Optimizer in their `optimizer`. Back Test Data is read
+    while holding `workbook_lock` (see `next_optimizer_batch`).
+
+    Returns:
+        list of TestJob: The tests to run.
+    """
+    from components.optimizer import Optimizer, has_sweep, expand_grid
+
+    jobs = []
+    for settings in settings_list:
+        if settings.expert is None or not has_sweep(settings):
+            jobs.append(settings)
+        elif optimizer:
+            search = Optimizer(settings, optimizer, budget=optimizer_budget, metric=optimizer_metric)
+            jobs += next_optimizer_batch(search, report_data_excel_path, workbook_lock)
+        else:
+            jobs += expand_grid(settings)
+    return jobs
+
+def next_optimizer_batch(search, report_data_excel_path, workbook_lock):
+    """
+    Observes the results of a search in Back Test Data and returns its next tests, or an empty list if the search is over.
+    The workbook is read while holding `workbook_lock`, which the ingest thread holds while it saves the workbook.
+    """
+    from components.results_query import load_results
+
+    try:
+        with workbook_lock:
+            results = load_results(report_data_excel_path)
+        search.observe(results)
+        batch = search.next_batch()
+        for job in batch:
+            job.optimizer = search
+        return batch
+    except Exception as e:
+        logger.error(f"Exception occurred while proposing the next tests of {search}: {e}")
+        return []
+
+def check_history(jobs, data_folder, mode, progress):
+    """
+    Checks the history data of the tests before MT4 is used (see `history_preflight`).
+
+    Returns:
+        list of TestJob: The tests to run.
+    """
+    from components.history_preflight import preflight
+
+    if not jobs:
+        return jobs
+    try:
+        kept, flagged = preflight(jobs, data_folder, mode)
+    except Exception as e:
+        logger.error(f"Exception occurred while checking the history data: {e}")
+        return jobs
+    if flagged:
+        action = 'skipped' if mode == 'skip' else 'run anyway'
+        progress.error(f"{len(flagged)} tests don't have enough history data and are {action}, e.g. {flagged[0][1]}")
+        for _ in range(len(jobs) - len(kept)):
+            metrics.test_finished('skipped')
+    return kept
+
+def main(stop_event, report_data_excel_path, settings_excel_path, html_reports_path, mt4_exe_path, me_exe_path, chrome_profile_path,
+         metrics_port=None, metrics_snapshot_path=None, progress=None, abort_event=None, resume=False, run_state_path=None,
+         optimizer=None, optimizer_budget=None, optimizer_metric=None, preflight=None, run_history_path=None, watch_settings=None):
     """
     The main function that orchestrates the backtesting automation.
 
@@ -41,63 +138,205 @@ def main(stop_event, report_data_excel_path, settings_excel_path, html_reports_p
         mt4_exe_path (str): Path to the MT4 executable.
         me_exe_path (str): Path to the MetaEditor executable.
         chrome_profile_path (str): Path to the Chrome profile directory.
+        metrics_port (int): Port of the local metrics endpoint. It is not started if this is None.
+        metrics_snapshot_path (str): Path of the metrics snapshot file. It is not written if this is None.
+        progress (ProgressReporter): Receives the progress of the run, e.g. for the GUI.
+        abort_event (threading.Event): Event to signal stopping immediately. A running test is stopped with the Stop button
+            of the Strategy Tester and recorded as cancelled. `stop_event` should be set along with it.
+        resume (bool): Whether to skip the rows which were tested successfully in previous runs.
+        run_state_path (str): Path of the file in which the tested rows are recorded. Defaults to the BACKTEST_RUN_STATE
+            environment variable or 'run_state.json'.
+        optimizer (str): 'genetic' or 'bayesian' to search the sweeps in Expert properties instead of testing every
+            combination. Defaults to the BACKTEST_OPTIMIZER environment variable.
+        optimizer_budget (int): The largest number of tests of each search. Defaults to BACKTEST_OPTIMIZER_BUDGET or 64.
+        optimizer_metric (str): The column of Back Test Data which a search maximizes (see `optimizer.Optimizer`).
+            Defaults to BACKTEST_OPTIMIZER_METRIC or 'Total net profit'.
+        preflight (str): What to do with the tests whose history data is missing or has gaps: 'off' (not checked),
+            'warn' (log them and run them anyway) or 'skip'. Defaults to the BACKTEST_PREFLIGHT environment variable or 'warn'.
+        run_history_path (str): Path of the file in which the time of every test is recorded for the estimates of
+            `planner`. Defaults to the BACKTEST_RUN_HISTORY environment variable or 'run_history.jsonl'.
+        watch_settings (bool): Whether to apply the rows which are added, edited or deleted in the Settings file during
+            the run (see `settings_watcher`). Defaults to True unless the BACKTEST_WATCH_SETTINGS environment variable is '0'.
 
     Returns:
         None
     """
+    metrics_server = None
+    ingest = None
+    progress = progress or ProgressReporter(enabled=False)
+    metrics.reset()
     try:
+        metrics_server = start_metrics_server(metrics_port, metrics_snapshot_path)
+
+        from components.excel_utils import ExcelUtil
+        from components.settings_watcher import SettingsWatcher
+
         # Set up Excel utility
         excel_util = ExcelUtil(report_data_excel_path)
+        excel_util.setup_excel_file(list(titles_and_selectors) + ['Aborted'])  # Add the columns of new stats to older workbooks
 
-        # Initialize Chrome browser with the specified profile
-        browser = ChromeBrowser(keep_open=True, headless=True, chrome_profile_path=chrome_profile_path)
+        # Chrome browser with the specified profile, which is only started when a report is processed
+        browser = LazyBrowser(keep_open=True, headless=True, chrome_profile_path=chrome_profile_path)
         
         # Process existing reports
-        process_existing_reports(browser, excel_util, html_reports_path)
+        process_existing_reports(browser, excel_util, html_reports_path, abort_event)
         
-        # Read settings
-        settings_reader = SettingsReader(settings_excel_path)
-        settings_list = settings_reader.read_settings()
+        settings_watcher = SettingsWatcher(settings_excel_path)
+        if watch_settings is None:
+            watch_settings = os.getenv('BACKTEST_WATCH_SETTINGS', '1') != '0'
+
+        from components.mt4_controller import MT4Controller, StrategyTester
+        from components.ea_compiler import EAVariantFarm
 
-        mt4 = MT4Controller(mt4_exe_path, me_exe_path, reports_folder_path=html_reports_path)
+        mt4 = MT4Controller(mt4_exe_path, me_exe_path, reports_folder_path=html_reports_path, cancel_event=abort_event)
         strategy_tester = StrategyTester(mt4)
+        run_state = RunState(run_state_path or os.getenv('BACKTEST_RUN_STATE') or RUN_STATE_FILE)
+        run_history = RunHistory(run_history_path or os.getenv('BACKTEST_RUN_HISTORY') or RUN_HISTORY_FILE)
+
+        optimizer = optimizer or os.getenv('BACKTEST_OPTIMIZER')
+        optimizer_budget = int(optimizer_budget or os.getenv('BACKTEST_OPTIMIZER_BUDGET') or 64)
+        optimizer_metric = optimizer_metric or os.getenv('BACKTEST_OPTIMIZER_METRIC') or 'Total net profit'
+        preflight = preflight or os.getenv('BACKTEST_PREFLIGHT') or 'warn'
+        data_folder = mt4.data_folder()
 
-        settings_list = settings_reader.read_settings()  # Read settings from the Excel file
+        settings_list = settings_watcher.read()  # Read and parse the settings from the Excel file
+        workbook_lock = Lock()  # Held while Back Test Data is written by the ingest thread or read by the optimizers
+        settings_list = plan_jobs(settings_list, report_data_excel_path, optimizer, optimizer_budget, optimizer_metric, workbook_lock)
+        settings_list = check_history(settings_list, data_folder, preflight, progress)
+        variant_farm = EAVariantFarm(mt4)
+        variant_farm.prepare(settings_list)  # Compile the EA variants needed by the tests ahead of time
         count = mt4.greatest_count(html_reports_path)  # Get the current greatest HTML report file number
+        progress.run_started(len(settings_list))
+
+        # The reports are scraped and written to Back Test Data while the next test runs
+        ingest = IngestStage(browser, excel_util, workbook_lock=workbook_lock).start()
+
+        removed_rows = {}  # Ids of the rows which were deleted or edited in the Settings file during the run
 
-        for settings in settings_list:
+        def finish(settings, outcome, error):
+            """
+            Records the outcome of a test. Tests whose report was saved are finished once the report has been ingested.
+            """
+            if outcome == 'cancelled':
+                run_state.mark(settings, 'cancelled')
+            elif outcome in ('completed', 'aborted'):
+                run_state.mark(settings, 'done')
+            metrics.test_finished(outcome)
+            if error:
+                progress.error(error)
+            progress.job_finished(outcome)
+
+            search = settings.optimizer
+            if search and search.job_finished() and not stop_event.is_set() and id(search.settings.row) not in removed_rows:
+                batch = next_optimizer_batch(search, report_data_excel_path, workbook_lock)  # The results of the batch are ingested by now
+                # The tests of a search share their history data, so a batch is skipped whole, which ends its search
+                batch = check_history(batch, data_folder, preflight, progress)
+                variant_farm.prepare(batch)
+                settings_list.extend(batch)
+                progress.total_changed(len(settings_list))
+
+        def reload_settings():
+            """
+            Applies the rows which were added, edited or deleted in the Settings file to the tests which have not started yet.
+            """
+            changes = settings_watcher.poll()
+            if not changes:
+                return
+            removed_rows.update(changes.removed_rows)
+            pending = [job for job in settings_list[i:] if id(job.row) not in removed_rows]
+            cancelled = len(settings_list) - i - len(pending)
+            added = plan_jobs(changes.added, report_data_excel_path, optimizer, optimizer_budget, optimizer_metric, workbook_lock)
+            added = check_history(added, data_folder, preflight, progress)
+            variant_farm.prepare(added)
+            settings_list[i:] = pending + added
+            progress.total_changed(len(settings_list))
+            logger.info(f"Added {len(added)} tests from the Settings file and cancelled {cancelled} tests of removed rows.")
+
+        # The batches proposed by the optimizers and the rows added to the Settings file are appended to `settings_list`
+        # while it is iterated
+        i = 0
+        while True:
+            for result in ingest.drain():
+                finish(*result)
+            if watch_settings:
+                reload_settings()
+            if i == len(settings_list):
+                if not ingest.pending:
+                    break
+                for result in ingest.drain(wait=True):  # The last reports may make the optimizers propose more tests
+                    finish(*result)
+                continue
+
+            settings = settings_list[i]
+            metrics.queue_depth.set(len(settings_list) - i)
             if stop_event.is_set():
                 logger.info("Stopping execution...")
                 break
 
-            keep_log_light()  # Keep the log file size small by removing old logs
-
+            outcome, error = 'failed', None
+            progress.job_started(i, settings.label)
+            i += 1
             try:
-                if settings['Expert'] is None:
+                if settings.expert is None:
                     logger.info("Skipping row with missing 'Expert' value.")
+                    outcome = 'skipped'
                     continue
 
-                if not strategy_tester.configure_tester(settings):
-                    logger.error(f"Failed to configure the strategy tester for settings: {settings}. Continuing.")
+                if resume and run_state.is_done(settings):
+                    logger.info("Skipping row which was tested in a previous run.")
+                    outcome = 'skipped'
                     continue
 
-                if not strategy_tester.run_test():
-                    logger.error(f"Failed to run the test for settings: {settings}. Continuing.")
-                    continue
+                started = monotonic()
+                with span('backtest', expert=settings.expert, symbol=settings.symbol, period=settings.period and settings.period.label):
+                    if not strategy_tester.configure_tester(settings):
+                        error = f"Failed to configure the strategy tester for settings: {settings}."
+                        logger.error(f"{error} Continuing.")
+                        continue
+
+                    if not strategy_tester.run_test(settings.rules):
+                        error = f"Failed to run the test for settings: {settings}."
+                        logger.error(f"{error} Continuing.")
+                        continue
+                    if strategy_tester.journal_errors:  # The test still counts, but the EA may not have traded as intended
+                        progress.error(f"{settings.label}: {strategy_tester.journal_error_summary()}")
                 
-                count += 1  # Increase the file number count so that the next file that gets saved will be unique
+                    count += 1  # Increase the file number count so that the next file that gets saved will be unique
 
-                if not strategy_tester.download_report(settings['Expert'], count):
-                    logger.error(f"Failed to save the report for settings: {settings}. Continuing.")
-                    continue
+                    if not strategy_tester.download_report(settings.expert, count):
+                        error = f"Failed to save the report for settings: {settings}."
+                        logger.error(f"{error} Continuing.")
+                        continue
+                    run_history.record(settings, monotonic() - started, 'aborted' if strategy_tester.aborted else 'completed')
 
-                # Process the newly downloaded HTML report
-                report_path = os.path.join(html_reports_path, f"{mt4.ea_base_name(settings['Expert'])}{count}.html")
-                process_html_file(report_path, browser, excel_util.add_data_to_excel)
+                    # Hand the newly downloaded HTML report to the ingest stage and move on to the next test
+                    report_path = mt4.report_path(settings.expert, count)
+                    progress.report_saved(report_path)
+                    ingest.submit(settings, report_path, strategy_tester.aborted)
+                    outcome = None  # The test is finished by the ingest stage
             except Exception as e:
-                logger.error(f"Exception occurred while configuring the Strategy Tester: {e}")
+                error = f"Exception occurred while configuring the Strategy Tester: {e}"
+                logger.error(error)
                 logger.info('Continuing...')
                 continue
+            finally:
+                if outcome == 'failed' and mt4.is_cancelled():
+                    logger.info("The test was cancelled.")
+                    outcome, error = 'cancelled', None
+                if outcome is not None:
+                    finish(settings, outcome, error)
+
+        for result in ingest.drain(wait=True):  # Ingest the reports which were saved before the run stopped
+            finish(*result)
+        metrics.queue_depth.set(0)
+        mt4.waiter.save()  # Keep the observed UI latencies so that the next run starts with adapted timeouts
     except Exception as e:
         logger.error(f"Exception occurred: {e}")
+        progress.error(f"Exception occurred: {e}")
+    finally:
+        if ingest:
+            ingest.close()
+        progress.run_finished(stop_event.is_set())
+        if metrics_server:
+            metrics_server.stop()
 
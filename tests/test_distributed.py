@@ -0,0 +1,50 @@
+import openpyxl
+from openpyxl import Workbook
+from components import distributed, records
+from components.reports_processor import titles_and_selectors
+
+def read_rows(file_path):
+    wb = openpyxl.load_workbook(file_path, read_only=True)
+    try:
+        headers, *rows = wb.worksheets[0].iter_rows(values_only=True)
+    finally:
+        wb.close()
+    return [dict(zip(headers, row)) for row in rows]
+
+def test_result_writer_adds_the_headers_and_writes_the_row(tmp_path):
+    workbook_path = str(tmp_path / 'Backtest Report Data.xlsx')
+    Workbook().save(workbook_path)
+    values = {title: '' for title in titles_and_selectors}
+    values.update({'Expert': 'MyEA', 'Symbol': 'EURUSD (Euro vs US Dollar)', 'Period': 'Daily (D1)', 'Model': 'Every tick',
+                   'Parameters': 'Lots=0.1; ', 'Total net profit': '123.45'})
+    result = records.TestResult('D:\\HTML Reports\\worker1_MyEA1.htm', values, aborted='Max drawdown')
+
+    writer = distributed.ResultWriter(workbook_path, str(tmp_path))
+    writer.put({'settings': {'Expert': 'MyEA'}}, {'outcome': 'aborted', 'worker': 'worker1', 'data': result.to_row()})
+    writer.close()
+
+    rows = read_rows(workbook_path)
+    assert len(rows) == 1
+    assert rows[0]['Source File'] == 'D:\\HTML Reports\\worker1_MyEA1.htm'
+    assert (rows[0]['Expert'], rows[0]['Period'], rows[0]['Total net profit'], rows[0]['Aborted']) == ('MyEA', 'Daily (D1)', '123.45', 'Max drawdown')
+
+def test_worker_retries_the_upload_of_a_result(monkeypatch):
+    answers = [OSError('Connection refused'), (503, {}), (200, {'ok': True})]
+    def post(url, body, timeout=30, token=None):
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+    monkeypatch.setattr(distributed, 'post', post)
+
+    worker = distributed.Worker('http://127.0.0.1:1', runner=None, name='worker1', idle_interval=0.01)
+    assert worker.upload({'job_id': 3, 'outcome': 'completed'})
+    assert answers == []
+
+def test_worker_stops_uploading_when_the_lease_is_lost(monkeypatch):
+    answers = [(409, {}), (200, {'ok': True})]
+    monkeypatch.setattr(distributed, 'post', lambda url, body, timeout=30, token=None: answers.pop(0))
+
+    worker = distributed.Worker('http://127.0.0.1:1', runner=None, name='worker1', idle_interval=0.01)
+    assert not worker.upload({'job_id': 3, 'outcome': 'completed'})
+    assert len(answers) == 1
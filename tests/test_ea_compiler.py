@@ -0,0 +1,60 @@
+import os
+import pytest
+from components.ea_compiler import EAVariantFarm, base_name, is_variant_of
+
+class FakeMT4:
+    me_exe_path = 'metaeditor.exe'
+
+    def __init__(self, experts_folder):
+        self.folder = experts_folder
+
+    def experts_folder(self):
+        return self.folder
+
+def write_variant(folder, name, modified):
+    for extension in ('.mq4', '.ex4'):
+        file_path = os.path.join(folder, name + extension)
+        with open(file_path, 'w') as file:
+            file.write('')
+        os.utime(file_path, (modified, modified))
+    return os.path.join(folder, name + '.mq4')
+
+def test_prune_keeps_the_most_recently_used_variants(tmp_path):
+    farm = EAVariantFarm(FakeMT4(str(tmp_path)), max_variants=2)
+    folder = farm.variants_folder()
+    os.makedirs(folder)
+    names = [f'MyEA_v{digit * 10}' for digit in '0123456']
+    paths = [write_variant(folder, name, modified=1000 + i) for i, name in enumerate(names)]
+    farm.used_variants.add(paths[0])  # The oldest, but used by this run
+    with open(os.path.join(folder, 'Other.mq4'), 'w') as file:
+        file.write('')  # Not a variant
+
+    farm.prune()
+
+    assert sorted(os.listdir(folder)) == sorted(['Other.mq4'] + [name + extension for name in (names[0], names[5], names[6])
+                                                                for extension in ('.mq4', '.ex4')])
+
+def test_touch_marks_a_variant_as_used_without_making_it_stale(tmp_path):
+    farm = EAVariantFarm(FakeMT4(str(tmp_path)))
+    mq4_path = write_variant(str(tmp_path), 'MyEA_v0123456789', modified=1000)
+    farm.touch(mq4_path)
+    assert os.path.getmtime(mq4_path[:-4] + '.ex4') > 1000
+    assert farm.is_compiled(mq4_path)
+
+@pytest.mark.parametrize('expert, ea_name, expected', [
+    ('MyEA', 'Folder\\MyEA.ex4', True),
+    ('MyEA_v0123456789', 'MyEA.ex4', True),
+    ('MyEA_v0123456789', 'Folder\\MyEA', True),
+    ('MyEA_volatility', 'MyEA.ex4', False),
+    ('MyEA_v01234', 'MyEA.ex4', False),
+    ('MyEA2', 'MyEA.ex4', False),
+    ('My.EA_v0123456789', 'MyEA.ex4', False),
+])
+def test_is_variant_of(expert, ea_name, expected):
+    assert is_variant_of(expert, ea_name) == expected
+
+def test_variant_names_are_variants_of_their_ea(tmp_path):
+    farm = EAVariantFarm(FakeMT4(str(tmp_path)))
+    variant = farm.variant_name('Folder\\MyEA.ex4', '0123456789')
+    assert variant == '_variants\\MyEA_v0123456789.ex4'
+    assert is_variant_of(base_name(variant), 'Folder\\MyEA.ex4')
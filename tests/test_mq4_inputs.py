@@ -0,0 +1,87 @@
+import pytest
+from components.mq4_inputs import InputIndex, format_value, rewrite_inputs, split_declarators
+
+SOURCE = '''\
+#property strict
+input double Lots = 0.1; // Lot size
+extern int TakeProfit=50;
+sinput string Note = "a;b // not a comment"; // Note
+input color Color = C'255,0,0';
+input int A = 1, B = 2; // Both
+input string Pairs = "x,y", Other = "z";
+input bool Enabled;
+input const int Fixed = 3;
+// input int Commented = 1;
+/* input int Blocked = 2;
+   input int AlsoBlocked = 3; */
+string text = "input int InString = 4;";
+int OnInit() { return 0; }
+'''
+
+@pytest.fixture
+def index():
+    return InputIndex(SOURCE)
+
+def test_finds_every_declaration(index):
+    assert [(d.keyword, d.type, d.name, d.default) for d in index.declarations] == [
+        ('input', 'double', 'Lots', '0.1'),
+        ('extern', 'int', 'TakeProfit', '50'),
+        ('sinput', 'string', 'Note', '"a;b // not a comment"'),
+        ('input', 'color', 'Color', "C'255,0,0'"),
+        ('input', 'int', 'A', '1'),
+        ('input', 'int', 'B', '2'),
+        ('input', 'string', 'Pairs', '"x,y"'),
+        ('input', 'string', 'Other', '"z"'),
+        ('input', 'bool', 'Enabled', None),
+        ('input', 'int', 'Fixed', '3'),
+    ]
+
+def test_skips_comments_and_strings(index):
+    for name in ('Commented', 'Blocked', 'AlsoBlocked', 'InString'):
+        assert index.find(name) is None
+
+def test_finds_inputs_by_comment(index):
+    assert index.find('Lot size').name == 'Lots'
+    assert index.find('Note').name == 'Note'
+    assert index.find('Both') is None  # The comment of a statement with several inputs doesn't name either of them
+
+def test_rewrites_inputs():
+    code, skipped = rewrite_inputs(SOURCE, {'Lot size': 0.2, 'TakeProfit': '75', 'Note': 'c"d', 'A': 5, 'B': 7,
+                                            'Pairs': 'u,v', 'Enabled': 1, 'Color': 'clrRed'})
+    assert skipped == {}
+    assert 'input double Lots = 0.2; // Lot size\n' in code
+    assert 'extern int TakeProfit=75;\n' in code
+    assert 'sinput string Note = "c\\"d"; // Note\n' in code
+    assert 'input int A = 5, B = 7; // Both\n' in code
+    assert 'input string Pairs = "u,v", Other = "z";\n' in code
+    assert 'input bool Enabled = true;\n' in code
+    assert 'input color Color = clrRed;\n' in code
+    assert code.count('\n') == SOURCE.count('\n')
+
+def test_rewrite_reports_the_inputs_it_skips():
+    code, skipped = rewrite_inputs(SOURCE, {'Commented': 2, 'TakeProfit': 'abc', 'Lots': '1;2'})
+    assert code == SOURCE
+    assert set(skipped) == {'Commented', 'TakeProfit', 'Lots'}
+
+def test_split_declarators():
+    assert split_declarators('A = 1, B = "x,y", C = f(1, 2)') == [(0, 'A = 1'), (6, ' B = "x,y"'), (17, ' C = f(1, 2)')]
+
+@pytest.mark.parametrize('input_type, value, expected', [
+    ('int', '50', '50'),
+    ('int', 50.0, '50'),
+    ('uint', '0x1F', '0x1F'),
+    ('double', '0.25', '0.25'),
+    ('bool', 'FALSE', 'false'),
+    ('string', 'EURUSD', '"EURUSD"'),
+    ('string', '"quoted"', '"quoted"'),
+    ('datetime', '2020.01.31', "D'2020.01.31'"),
+    ('ENUM_TIMEFRAMES', 'PERIOD_H1', 'PERIOD_H1'),
+])
+def test_format_value(input_type, value, expected):
+    assert format_value(input_type, value) == expected
+
+@pytest.mark.parametrize('input_type, value', [('int', '1.5'), ('uint', '-1'), ('double', 'x'), ('bool', 'maybe'),
+                                               ('datetime', 'today'), ('color', 'a b'), ('int', '')])
+def test_format_value_rejects_invalid_values(input_type, value):
+    with pytest.raises(ValueError):
+        format_value(input_type, value)
@@ -0,0 +1,96 @@
+import pytest
+from components.optimizer import Optimizer, expand_grid, has_sweep, parse_search_space, sweep_values
+from components import records
+from components.results_query import ResultTable
+
+def settings_row(properties='Lots=0.1, TakeProfit=[50:70:10]', **cells):
+    return {'Expert': 'MyEA.ex4', 'Symbol': 'eurusd', 'Period': 'Daily', 'Model': 'Open prices', 'From': '2020.01.01',
+            'To': '2020.12.31', 'Expert properties': properties, **cells}
+
+@pytest.mark.parametrize('text, expected', [
+    ('[10:50:10]', ['10', '20', '30', '40', '50']),
+    ('[0.1:0.3:0.1]', ['0.1', '0.2', '0.3']),
+    ('[1:2]', ['1', '2']),
+    ('[10:45:10]', ['10', '20', '30', '40']),
+    ('[5:1:1]', []),
+    ('[a|b| c ]', ['a', 'b', 'c']),
+    ('[true|false]', ['true', 'false']),
+    (' [7] ', ['7']),
+    ('10', None),
+    ('[10', None),
+])
+def test_sweep_values(text, expected):
+    assert sweep_values(text) == expected
+
+def test_sweep_step_must_be_positive():
+    with pytest.raises(ValueError):
+        sweep_values('[1:10:0]')
+
+def test_parse_search_space():
+    fixed, parameters = parse_search_space('Lots=0.1, TakeProfit=[50:70:10], Mode=[fast|slow], Comment=none')
+    assert fixed == {'Lots': '0.1', 'Comment': 'none'}
+    assert [(parameter.name, parameter.values) for parameter in parameters] == [('TakeProfit', ['50', '60', '70']),
+                                                                             ('Mode', ['fast', 'slow'])]
+    assert parameters[0].index_of('60.0') == 1
+    assert parameters[1].index_of('slow') == 1
+    assert parameters[1].index_of('medium') is None
+
+def test_has_sweep():
+    assert has_sweep(settings_row())
+    assert not has_sweep(settings_row('Lots=0.1, TakeProfit=50'))
+    assert not has_sweep(settings_row(None))
+
+def test_expand_grid():
+    jobs = expand_grid(records.TestJob.from_row(settings_row('Lots=0.1, TakeProfit=[50:60:10], Mode=[fast|slow]')))
+    assert [job.properties for job in jobs] == [
+        'Lots=0.1, TakeProfit=50, Mode=fast', 'Lots=0.1, TakeProfit=50, Mode=slow',
+        'Lots=0.1, TakeProfit=60, Mode=fast', 'Lots=0.1, TakeProfit=60, Mode=slow',
+    ]
+    assert all(job.fixed is jobs[0].fixed for job in jobs)
+
+def result_row(profit, take_profit, expert='MyEA', symbol='EURUSD (Euro vs US Dollar)', period='Daily (D1)',
+               model='Open prices only (fastest method to analyze the bar just completed)', dates='2020.01.01 - 2020.12.31',
+               lots='0.1'):
+    return {'Source File': f'D:\\HTML Reports\\{expert}.htm', 'Expert': expert, 'Symbol': symbol,
+            'Period': f'{period} 2020.01.02 00:00 - 2020.12.30 00:00 ({dates})', 'Model': model,
+            'Parameters': f'Lots={lots}; TakeProfit={take_profit}; ', 'Total net profit': str(profit)}
+
+def test_observe_matches_the_results_of_the_search_space():
+    optimizer = Optimizer(records.TestJob.from_row(settings_row()), seed=0)
+    table = ResultTable.from_rows([
+        result_row(100, 50),
+        result_row(200, 60, expert='MyEA_v1a2b3c4d5e'),  # A prebuilt variant of the EA
+        result_row(-1, 60, expert='MyEA_volatility'),
+        result_row(-1, 60, expert='MyEA_v1a2b3c4d'),
+        result_row(300, 70, symbol='eurusd'),
+        result_row(400, 70),  # Averaged with the result above
+        result_row(-1, 50, expert='OtherEA'),
+        result_row(-1, 50, symbol='GBPUSD'),
+        result_row(-1, 50, period='1 Hour (H1)'),
+        result_row(-1, 50, model='Every tick (the most precise method based on all available least timeframes)'),
+        result_row(-1, 50, dates='2019.01.01 - 2020.12.31'),
+        result_row(-1, 50, lots='0.2'),
+        result_row(-1, 80),  # Not a value of the sweep
+    ])
+    optimizer.observe(table)
+    assert optimizer.observations == {(0,): 100, (1,): 200, (2,): 350}
+    assert optimizer.best() == ('Lots=0.1, TakeProfit=70', 350)
+
+def test_observe_minimizes_a_metric_with_a_minus_sign():
+    optimizer = Optimizer(records.TestJob.from_row(settings_row()), metric='-Total net profit', seed=0)
+    optimizer.observe(ResultTable.from_rows([result_row(100, 50), result_row(200, 60)]))
+    assert optimizer.best()[0] == 'Lots=0.1, TakeProfit=50'
+
+def test_next_batch_proposes_new_points():
+    optimizer = Optimizer(records.TestJob.from_row(settings_row('Lots=0.1, TakeProfit=[10:200:10]')), method='genetic',
+                          budget=12, batch_size=4, seed=0)
+    proposed = set()
+    for _ in range(3):
+        batch = optimizer.next_batch()
+        properties = {job.properties for job in batch}
+        assert len(properties) == len(batch) == 4
+        assert not properties & proposed
+        proposed |= properties
+        for _ in batch:
+            optimizer.job_finished()
+    assert optimizer.done
@@ -0,0 +1,34 @@
+from threading import Lock
+from components import pipeline
+
+class RecordingExcelUtil:
+    def __init__(self):
+        self.rows = []
+
+    def add_data_to_excel(self, data):
+        self.rows.append(data)
+
+def test_ingest_waits_for_readers_of_the_workbook(monkeypatch):
+    monkeypatch.setattr(pipeline, 'process_html_file', lambda report_path, browser, add_data: add_data({'Source File': report_path}))
+    excel_util, workbook_lock = RecordingExcelUtil(), Lock()
+    ingest = pipeline.IngestStage(None, excel_util, workbook_lock=workbook_lock).start()
+    try:
+        with workbook_lock:  # E.g. the optimizer reading Back Test Data
+            ingest.submit('job', 'MyEA1.htm', aborted='Max drawdown')
+            assert ingest.finished.empty() and excel_util.rows == []
+        assert ingest.drain(wait=True) == [('job', 'aborted', None)]
+        assert excel_util.rows == [{'Source File': 'MyEA1.htm', 'Aborted': 'Max drawdown'}]
+    finally:
+        ingest.close()
+
+def test_a_failed_report_only_fails_its_test(monkeypatch):
+    def process_html_file(report_path, browser, add_data):
+        raise ValueError('no such file')
+    monkeypatch.setattr(pipeline, 'process_html_file', process_html_file)
+    ingest = pipeline.IngestStage(None, RecordingExcelUtil()).start()
+    try:
+        ingest.submit('job', 'MyEA1.htm')
+        [(job, outcome, error)] = ingest.drain(wait=True)
+        assert (job, outcome) == ('job', 'failed') and 'no such file' in error
+    finally:
+        ingest.close()
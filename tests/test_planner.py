@@ -0,0 +1,47 @@
+import math
+from datetime import datetime
+from components import records
+from components.planner import DEFAULT_SECONDS, DurationModel, Plan, plan
+
+def job(symbol='EURUSD', days=30, row=None):
+    return records.TestJob(row=row if row is not None else {}, expert='MyEA', symbol=symbol, period=records.Period.H1,
+                           model=records.Model.EVERY_TICK, from_date=datetime(2020, 1, 1), to_date=datetime(2020, 1, days))
+
+def history(symbol, rates):
+    return [{'expert': 'MyEA', 'symbol': symbol, 'period': 'H1', 'model': 'Every tick', 'days': 10, 'seconds': rate * 10}
+            for rate in rates]
+
+def test_estimates_scale_with_the_days_tested():
+    model = DurationModel(history('EURUSD', [1.0, 1.1, 0.9, 1.0]))
+    estimate = model.estimate(job(days=30))
+    assert estimate.seconds == 30
+    assert estimate.low < 30 < estimate.high
+    assert estimate.samples == 4
+
+def test_tests_without_history_get_the_default():
+    estimate = DurationModel([]).estimate(job())
+    assert estimate.seconds == DEFAULT_SECONDS
+    assert math.isclose(estimate.low, DEFAULT_SECONDS / 4) and math.isclose(estimate.high, DEFAULT_SECONDS * 4)
+
+def test_total_range_of_one_group_is_its_range():
+    model = DurationModel(history('EURUSD', [1.0, 1.2, 0.8]))
+    low, high = plan([job(row={'n': i}) for i in range(5)], model).total_range()
+    one = model.estimate(job())
+    assert math.isclose(low, 5 * one.low) and math.isclose(high, 5 * one.high)
+
+def test_total_range_of_independent_groups_is_narrower_than_the_sum_of_the_ranges():
+    model = DurationModel(history('EURUSD', [1.0, 1.5, 0.6]) + history('GBPUSD', [2.0, 2.2, 1.5]) +
+                          history('USDJPY', [0.5, 0.9, 0.4]))
+    result = plan([job(symbol) for symbol in ('EURUSD', 'GBPUSD', 'USDJPY')], model, workers=2)
+    low, high = result.total_range()
+    assert sum(estimate.low for estimate in result.estimates) < low < result.total_seconds
+    assert result.total_seconds < high < sum(estimate.high for estimate in result.estimates)
+
+def test_empty_plan():
+    assert Plan([], [[]]).total_range() == (0.0, 0.0)
+
+def test_schedule_balances_the_workers():
+    model = DurationModel(history('EURUSD', [1.0, 1.0, 1.0]))
+    result = plan([job(days=days) for days in (30, 20, 10, 10)], model, workers=2)
+    assert sorted(result.loads) == [30, 40]
+    assert result.makespan == 40
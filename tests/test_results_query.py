@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+from components.results_query import ResultTable, describe, normalize
+
+def report_row(period='1 Hour (H1) 2020.01.02 00:00 - 2020.12.30 23:00 (2020.01.01 - 2020.12.31)',
+               model='Every tick (the most precise method based on all available least timeframes)',
+               symbol='EURUSD (Euro vs US Dollar)', parameters='Lots=0.1; TakeProfit=50; Mode=fast; ', profit='100'):
+    return {'Source File': 'D:\\HTML Reports\\MyEA1.htm', 'Expert': 'MyEA', 'Symbol': symbol, 'Period': period,
+            'Model': model, 'Parameters': parameters, 'Total net profit': profit}
+
+@pytest.mark.parametrize('name, value, expected', [
+    ('Period', 'Daily', 'D1'),
+    ('Period', 'D1', 'D1'),
+    ('Period', '1 Hour (H1) 2020.01.02 00:00 - 2020.12.30 23:00', 'H1'),
+    ('Model', 'Open prices only (fastest method to analyze the bar just completed)', 'Open prices'),
+    ('Model', 'every tick', 'Every tick'),
+    ('Period', ' unknown ', 'unknown'),
+    ('Symbol', ' EURUSD ', 'EURUSD'),
+])
+def test_normalize(name, value, expected):
+    assert normalize(name, value) == expected
+
+def test_describe_splits_the_report_cells():
+    values = describe(report_row())
+    assert values == {
+        'Expert': 'MyEA', 'Symbol': 'EURUSD', 'Period': 'H1', 'Model': 'Every tick', 'From': '2020-01-01',
+        'To': '2020-12-31', 'input.Lots': '0.1', 'input.TakeProfit': '50', 'input.Mode': 'fast',
+    }
+
+def test_describe_reads_daily_reports_as_d1():
+    values = describe(report_row(period='Daily (D1) 2020.01.02 00:00 - 2020.12.30 00:00 (2020.01.01 - 2020.12.31)'))
+    assert values['Period'] == 'D1'
+
+def test_describe_without_dates():
+    values = describe(report_row(period='H4'))
+    assert (values['Period'], values['From'], values['To']) == ('H4', 'NaT', 'NaT')
+
+@pytest.fixture
+def table():
+    return ResultTable.from_rows([
+        report_row(profit='100'),
+        report_row(period='Daily (D1) 2020.01.02 00:00 - 2020.12.30 00:00 (2020.01.01 - 2020.12.31)', profit='200',
+                   parameters='Lots=0.2; TakeProfit=60; Mode=slow; '),
+        report_row(model='Open prices only (fastest method to analyze the bar just completed)', symbol='GBPUSD',
+                   profit='-50', parameters='Lots=0.1; TakeProfit=70; Mode=fast; '),
+    ])
+
+def test_matches_categorical_columns(table):
+    assert table.matches('Period', 'D1').tolist() == [False, True, False]
+    assert table.matches('Model', ['Every tick', 'Open prices']).tolist() == [True, True, True]
+    assert table.matches('input.Mode', 'fast').tolist() == [True, False, True]
+    assert table.matches('Symbol', 'USDJPY').tolist() == [False, False, False]
+
+def test_matches_numeric_columns(table):
+    assert table.matches('input.Lots', 0.1).tolist() == [True, False, True]
+    assert table.matches('input.TakeProfit', ['50', '70']).tolist() == [True, False, True]
+    assert table.matches('input.TakeProfit', (55, None)).tolist() == [False, True, True]
+    assert table.matches('Total net profit', (None, 100)).tolist() == [True, False, True]
+
+def test_filter_accepts_the_text_of_the_settings_file(table):
+    assert table.filter(period='Daily').rows(['Total net profit']) == [{'Total net profit': 200.0}]
+    assert len(table.filter(model='Open prices only (fastest method ...)')) == 1
+    assert len(table.filter(period=['H1', 'Daily'], model='Every tick')) == 2
+
+def test_dates_are_datetime_columns(table):
+    assert table.column('From').dtype == np.dtype('datetime64[D]')
+    assert table.condition('To>=2020.12.31').tolist() == [True, True, True]
+
+@pytest.fixture
+def ranked():
+    rows = []
+    for i, (symbol, period, profit, drawdown) in enumerate([('EURUSD', 'H1', '300', '10'), ('EURUSD', 'H1', '100', '5'),
+                                                           ('EURUSD', 'D1', '200', '20'), ('GBPUSD', 'H1', '50', ''),
+                                                           ('GBPUSD', 'H1', '', '1')]):
+        row = report_row(symbol=symbol, period=f'{period} 2020.01.02 00:00 - 2020.12.30 00:00 (2020.01.{i + 1:02d} - 2020.12.31)',
+                         profit=profit)
+        row.update({'Source File': f'MyEA{i}.htm', 'Relative drawdown': drawdown})
+        rows.append(row)
+    return ResultTable.from_rows(rows)
+
+def test_top_ranks_rows_without_a_value_last(ranked):
+    assert [row['Total net profit'] for row in ranked.top('Total net profit').rows(['Total net profit'])][:4] == [300, 200, 100, 50]
+    ascending = ranked.top('Total net profit', ascending=True).rows(['Total net profit'])
+    assert [row['Total net profit'] for row in ascending][:4] == [50, 100, 200, 300]
+    assert np.isnan(ascending[-1]['Total net profit'])
+
+def test_top_ranks_rows_without_a_composite_score_last(ranked):
+    by = {'Total net profit': 1, 'Relative drawdown': -0.5}
+    for ascending in (False, True):
+        sources = [row['Source File'] for row in ranked.top(by, ascending=ascending).rows(['Source File'])]
+        assert sorted(sources[-2:]) == ['MyEA3.htm', 'MyEA4.htm']
+
+def test_top_groups_by_text_and_date_columns(ranked):
+    best = ranked.top('Total net profit', k=1, group_by=['Symbol', 'From']).rows(['Source File'])
+    assert sorted(row['Source File'] for row in best) == [f'MyEA{i}.htm' for i in range(5)]
+    best = ranked.top('Total net profit', k=1, group_by=['Symbol', 'Period', 'To']).rows(['Source File', 'score'])
+    assert [(row['Source File'], row['score']) for row in best][:2] == [('MyEA2.htm', 200), ('MyEA0.htm', 300)]
@@ -38,20 +38,29 @@ def clean_log():
         logger.error(f"Failed to clean up the log file 'app_log.log': {e}")
         raise
 
-def keep_log_light():
+def read_text(file_path):
     """
-    To keep the log file lightweight, keep only the last 500 lines.
+    Reads a text file written by MT4 or MetaEditor, which may be UTF-16, UTF-8 or ANSI encoded.
+
+    Args:
+        file_path (str): The path of the file.
+
+    Returns:
+        tuple: The text of the file and the encoding that was used to decode it.
     """
-    try:
-        log_file_path = 'app_log.log'
-        with open(log_file_path, 'r+') as file:
-            lines = file.readlines()
-            if len(lines) > 500:
-                file.seek(0)  # Go to the start of the file
-                file.writelines(lines[-500:])  # Write the last 500 lines
-                file.truncate()  # Remove the rest of the content
-
-        logger.info("Log file 'app_log.log' has been truncated to the last 500 lines.")
-    except Exception as e:
-        logger.error(f"Failed to truncate the log file 'app_log.html': {e}")
-        raise
\ No newline at end of file
+    with open(file_path, 'rb') as file:
+        raw = file.read()
+
+    if raw.startswith(b'\xff\xfe') or raw.startswith(b'\xfe\xff'):
+        encoding = 'utf-16'
+    elif raw.startswith(b'\xef\xbb\xbf'):
+        encoding = 'utf-8-sig'
+    elif b'\x00' in raw[:200]:  # UTF-16 without a BOM
+        encoding = 'utf-16-le'
+    else:
+        try:
+            return raw.decode('utf-8'), 'utf-8'
+        except UnicodeDecodeError:
+            encoding = 'cp1252'
+
+    return raw.decode(encoding, errors='replace'), encoding